@@ -0,0 +1,33 @@
+"""Benchmark the columnar engine against the row-at-a-time rules on generated rows, for steps 2-12 as run by read_sheets.
+The columnar time includes building the columns from the rows, 'reduce only' starts from the columns.
+Requires pandas.
+
+Run from the repository root:
+    python -m benchmarks.bench_columnar 10000 100000 1000000 5000000
+"""
+from forbered_afskrivining_af_foraeldede_sagsomkostninger import columnar
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.excel_process import reduce_rows
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.tests.synthetic import HEADER, generate_rows
+from benchmarks.timing import best_of, size_arguments
+
+
+def main():
+    """Time both engines on generated rows and print a table."""
+    args = size_arguments(__doc__, [10_000, 100_000, 1_000_000])
+
+    print(f"{'rows':>10} {'python (s)':>11} {'columnar (s)':>13} {'reduce only (s)':>16} {'speedup':>8}")
+    for size in args.sizes:
+        rows = generate_rows(size)
+        if columnar.reduce_rows(HEADER, rows) != reduce_rows(HEADER, rows):
+            raise AssertionError(f"Output differs from the row-at-a-time rules at {size} rows.")
+
+        python = best_of(args.repeat, reduce_rows, HEADER, rows)
+        vectorised = best_of(args.repeat, columnar.reduce_rows, HEADER, rows)
+        columns = columnar.to_columns(HEADER, rows)
+        reduce_only = best_of(args.repeat, columnar.reduce_columns, columns)
+        print(f"{size:>10} {python:>11.3f} {vectorised:>13.3f} {reduce_only:>16.3f} {python / vectorised:>7.1f}x")
+        del rows, columns
+
+
+if __name__ == '__main__':
+    main()
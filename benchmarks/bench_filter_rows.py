@@ -0,0 +1,28 @@
+"""Benchmark the Alteryx rule engine against the original implementation of read_sheets.
+
+Run from the repository root:
+    python -m benchmarks.bench_filter_rows 10000 100000
+"""
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.excel_process import filter_rows
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.tests.legacy_excel_process import legacy_filter_rows
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.tests.synthetic import HEADER, generate_rows
+from benchmarks.timing import best_of, size_arguments
+
+
+def main():
+    """Time both implementations on generated rows and print a table."""
+    args = size_arguments(__doc__, [10_000, 100_000, 300_000])
+
+    print(f"{'rows':>10} {'legacy (s)':>12} {'compiled (s)':>14} {'speedup':>8}")
+    for size in args.sizes:
+        rows = generate_rows(size)
+        if filter_rows(HEADER, rows) != legacy_filter_rows(HEADER, rows):
+            raise AssertionError(f"Output differs from the original implementation at {size} rows.")
+
+        legacy = best_of(args.repeat, legacy_filter_rows, HEADER, rows)
+        compiled = best_of(args.repeat, filter_rows, HEADER, rows)
+        print(f"{size:>10} {legacy:>12.3f} {compiled:>14.3f} {legacy / compiled:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
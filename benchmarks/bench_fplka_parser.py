@@ -0,0 +1,83 @@
+"""Benchmark the streaming FPLKA parser against the original one on a generated rykkerspærre export.
+The original reads the whole file into a string and looks aftaler up in lists.
+Step 4 is timed as one lookup per restance row.
+
+Run from the repository root:
+    python -m benchmarks.bench_fplka_parser 1000000 3000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.auxiliary import read_fp_and_aftale_file
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.tests.legacy_auxiliary import legacy_get_fp_and_aftale_from_file
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.tests.synthetic import write_fplka_export
+
+# Lines per ForretnPartner in the generated export: header, column header, aftaler and an empty line.
+_AFTALER_PER_PARTNER = 20
+_LINES_PER_PARTNER = _AFTALER_PER_PARTNER + 3
+
+
+def _legacy_parse(path: str) -> dict:
+    with open(path, encoding='cp1252') as file:
+        return legacy_get_fp_and_aftale_from_file(file.read())
+
+
+def _lookups(fp_aftale: dict, queries: list[tuple[str, str]]) -> int:
+    return sum(1 for fp, aftale in queries if fp in fp_aftale and aftale not in fp_aftale[fp])
+
+
+def _measure(parse, path: str, queries: list[tuple[str, str]]) -> tuple[float, float, float, int]:
+    """Return (parse seconds, lookup seconds, peak MiB, lookup result)."""
+    start = time.perf_counter()
+    fp_aftale = parse(path)
+    parse_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = _lookups(fp_aftale, queries)
+    lookup_time = time.perf_counter() - start
+    del fp_aftale
+
+    tracemalloc.start()
+    parse(path)
+    peak = tracemalloc.get_traced_memory()[1] / 1024**2
+    tracemalloc.stop()
+
+    return parse_time, lookup_time, peak, result
+
+
+def main():
+    """Time both parsers on generated exports and print a table."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('lines', nargs='*', type=int, default=[1_000_000, 3_000_000])
+    parser.add_argument('--queries', type=int, default=200_000, help="The number of restance rows to look up.")
+    args = parser.parse_args()
+
+    print(f"{'lines':>10} {'parser':>10} {'parse (s)':>10} {'lookup (s)':>11} {'peak (MiB)':>11}")
+    with tempfile.TemporaryDirectory() as directory:
+        for lines in args.lines:
+            partner_count = max(lines // _LINES_PER_PARTNER, 1)
+            path = os.path.join(directory, f"fplka_{lines}.txt")
+            write_fplka_export(path, partner_count, _AFTALER_PER_PARTNER)
+
+            rng = random.Random(0)
+            queries = []
+            for _ in range(args.queries):
+                fp = 10_000_000 + rng.randrange(partner_count)
+                queries.append((str(fp), str(2_000_000 + fp % 1000 * 3 + rng.randrange(4))))
+
+            results = set()
+            for name, parse in (('legacy', _legacy_parse), ('streaming', read_fp_and_aftale_file)):
+                parse_time, lookup_time, peak, result = _measure(parse, path, queries)
+                results.add(result)
+                print(f"{lines:>10} {name:>10} {parse_time:>10.2f} {lookup_time:>11.3f} {peak:>11.1f}")
+
+            if len(results) != 1:
+                raise AssertionError(f"The parsers disagree at {lines} lines.")
+
+
+if __name__ == '__main__':
+    main()
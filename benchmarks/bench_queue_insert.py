@@ -0,0 +1,43 @@
+"""Benchmark inserting queue elements with different chunk sizes against an in-memory OrchestratorConnection.
+Every queue call sleeps for the given latency, like the round trip to the database.
+
+Run from the repository root:
+    python -m benchmarks.bench_queue_insert --rows 20000 --latency 0.02 100 1000 5000
+"""
+import argparse
+import datetime
+import time
+
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.queue_insert import insert_queue_elements
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.tests.stub_orchestrator import StubOrchestratorConnection
+
+
+def main():
+    """Time the insertion for each chunk size, and a retry where everything is already inserted, and print a table."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('chunk_sizes', nargs='*', type=int, default=[100, 1000, 5000])
+    parser.add_argument('--rows', type=int, default=20_000)
+    parser.add_argument('--latency', type=float, default=0.02, help="Seconds per queue call.")
+    args = parser.parse_args()
+
+    rows = [(str(2_000_000 + i), str(100_000_000_000 + i), str(10_000_000 + i % 5000)) for i in range(args.rows)]
+    since = datetime.datetime.now() - datetime.timedelta(hours=1)
+
+    print(f"{'chunk size':>10} {'insert (s)':>11} {'rows/s':>10} {'retry (s)':>10}")
+    for chunk_size in args.chunk_sizes:
+        connection = StubOrchestratorConnection(call_latency=args.latency)
+
+        start = time.perf_counter()
+        insert_queue_elements(connection, "Benchmark", rows, since, chunk_size=chunk_size)
+        insert_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        if insert_queue_elements(connection, "Benchmark", rows, since, chunk_size=chunk_size) != 0:
+            raise AssertionError("The retry inserted duplicates.")
+        retry_time = time.perf_counter() - start
+
+        print(f"{chunk_size:>10} {insert_time:>11.2f} {args.rows / insert_time:>10.0f} {retry_time:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
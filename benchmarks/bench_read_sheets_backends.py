@@ -0,0 +1,39 @@
+"""Time read_sheets with the openpyxl and the XML backend.
+
+Run from the repository root:
+    python -m benchmarks.bench_read_sheets_backends 10000 50000
+"""
+import argparse
+import time
+
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.excel_process import BACKENDS, read_sheets
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.tests.synthetic import generate_rows, write_workbook
+
+
+def main():
+    """Time each backend on generated workbooks and print a table."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('sizes', nargs='*', type=int, default=[10_000, 50_000])
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} " + " ".join(f"{backend + ' (s)':>14}" for backend in BACKENDS))
+    for size in args.sizes:
+        file = write_workbook(generate_rows(size))
+        timings = []
+        expected = None
+        for backend in BACKENDS:
+            file.seek(0)
+            start = time.perf_counter()
+            result = read_sheets([file], backend=backend)
+            timings.append(time.perf_counter() - start)
+
+            if expected is None:
+                expected = result
+            elif result != expected:
+                raise AssertionError(f"Output of the {backend} backend differs at {size} rows.")
+
+        print(f"{size:>10} " + " ".join(f"{timing:>14.2f}" for timing in timings))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""Measure peak memory of read_sheets with tracemalloc, against reading every row into memory first.
+
+Run from the repository root:
+    python -m benchmarks.bench_read_sheets_memory 10000 20000 50000
+"""
+import argparse
+import tracemalloc
+
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.excel_process import read_sheets
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.tests.legacy_excel_process import legacy_read_sheets
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.tests.synthetic import generate_rows, write_workbook
+
+
+def _peak_memory(func, files) -> tuple[float, list]:
+    """Run func on the files and return the peak traced memory in MiB and the result."""
+    for file in files:
+        file.seek(0)
+
+    tracemalloc.start()
+    result = func(files)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 2**20, result
+
+
+def main():
+    """Measure both implementations on generated workbooks and print a table."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('sizes', nargs='*', type=int, default=[10_000, 20_000, 50_000])
+    parser.add_argument('--files', type=int, default=3, help="The number of workbooks the rows are split into.")
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'files':>6} {'legacy (MiB)':>13} {'streaming (MiB)':>16}")
+    for size in args.sizes:
+        rows = generate_rows(size)
+        chunk = -(-size // args.files)
+        files = [write_workbook(rows[i:i + chunk]) for i in range(0, size, chunk)]
+        del rows
+
+        legacy, expected = _peak_memory(legacy_read_sheets, files)
+        streaming, result = _peak_memory(read_sheets, files)
+        if result != expected:
+            raise AssertionError(f"Output differs from the original implementation at {size} rows.")
+
+        print(f"{size:>10} {len(files):>6} {legacy:>13.1f} {streaming:>16.1f}")
+
+
+if __name__ == '__main__':
+    main()
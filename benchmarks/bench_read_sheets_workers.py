@@ -0,0 +1,49 @@
+"""Time read_sheets with a different number of worker processes.
+
+Run from the repository root:
+    python -m benchmarks.bench_read_sheets_workers --rows 20000 --files 8 1 2 4 8
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.excel_process import read_sheets
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.tests.synthetic import generate_rows, write_workbook
+
+
+def main():
+    """Write generated workbooks to disk and time read_sheets on them for each worker count."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('workers', nargs='*', type=int, default=[1, 2, 4, 8])
+    parser.add_argument('--rows', type=int, default=20_000, help="The number of rows in each file.")
+    parser.add_argument('--files', type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for number in range(args.files):
+            path = os.path.join(directory, f"restanceliste_{number}.xlsx")
+            with open(path, 'wb') as file:
+                file.write(write_workbook(generate_rows(args.rows, seed=number)).getvalue())
+            paths.append(path)
+
+        print(f"{args.files} files of {args.rows} rows, {os.cpu_count()} CPUs")
+        print(f"{'workers':>8} {'time (s)':>9} {'speedup':>8}")
+        baseline = None
+        expected = None
+        for workers in args.workers:
+            start = time.perf_counter()
+            result = read_sheets(paths, workers=workers)
+            duration = time.perf_counter() - start
+
+            if expected is None:
+                expected, baseline = result, duration
+            elif result != expected:
+                raise AssertionError(f"Output with {workers} workers differs from {args.workers[0]} workers.")
+
+            print(f"{workers:>8} {duration:>9.2f} {baseline / duration:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""Replay the whole process on a synthetic restanceliste against local stand-ins for Graph, SAP and OpenOrchestrator,
+and print the metrics of each stage. Needs the robot's dependencies, since the real process module is run.
+
+Run from the repository root:
+    python -m benchmarks.bench_replay --rows 50000 --files 3 --sap-seconds 5
+    python -m benchmarks.bench_replay --rows 50000 --files 3 --batches 3 --download-delay 1
+"""
+import argparse
+import datetime
+import time
+
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.tests.replay import replay
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.tests.synthetic import generate_fixture
+
+
+def main():
+    """Replay one run and print a table of the stages in the order they ended."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=50_000)
+    parser.add_argument('--files', type=int, default=3, help="The number of attachments the rows are split into.")
+    parser.add_argument('--sap-seconds', type=float, default=5, help="How long SAP takes to write the FPLKA export.")
+    parser.add_argument('--download-delay', type=float, default=0, help="Seconds before each attachment download starts.")
+    parser.add_argument('--batches', type=int, default=1, help="The number of weekly restancelister in the mailbox. "
+                        "Each week has the rows of the week before and 10%% more.")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    fixture = generate_fixture(args.rows, seed=args.seed)
+    today = datetime.date.today()
+    earlier_batches = [(generate_fixture(round(args.rows / 1.1**weeks), seed=args.seed), today - datetime.timedelta(weeks=weeks), args.files)
+                       for weeks in range(1, args.batches)]
+    rows = args.rows + sum(len(earlier_fixture.rows) for earlier_fixture, _, _ in earlier_batches)
+
+    start = time.perf_counter()
+    result = replay(fixture, today, file_count=args.files, earlier_batches=earlier_batches, sap_write_seconds=args.sap_seconds,
+                    download_delay=args.download_delay)
+    total = time.perf_counter() - start
+
+    if sorted(result.queued_rows()) != sorted(fixture.expected):
+        raise AssertionError("The queued rows differ from the expected rows of the fixture.")
+
+    print(f"{'stage':<45} {'wall (s)':>9} {'cpu (s)':>8} {'rows in':>9} {'rows out':>9}")
+    for stage in result.metrics['stages']:
+        print(f"{stage['name'][:45]:<45} {stage['wall_seconds']:>9.2f} {stage['cpu_seconds']:>8.2f} "
+              f"{stage['rows_in'] if stage['rows_in'] is not None else '':>9} {stage['rows_out'] if stage['rows_out'] is not None else '':>9}")
+    print(f"{rows} rows in {args.batches} batches in {total:.2f} s ({rows / total:.0f} rows/s), peak RSS {result.metrics['peak_rss_mb']} MB, "
+          f"{len(fixture.expected)} queued.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Measure the memory held by the result of steps 2-12, against a tuple per row with every cell value as read.
+
+The size is the deep size of the result after reading a synthetic workbook with the XML backend, so every value
+is a new object as in a real run. It is counted with sys.getsizeof rather than tracemalloc, which slows the reader
+down too much for large sheets.
+
+Run from the repository root:
+    python -m benchmarks.bench_row_memory 100000 500000
+"""
+import argparse
+import sys
+import time
+
+from forbered_afskrivining_af_foraeldede_sagsomkostninger import excel_process, xlsx_reader
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.excel_process import REQUIRED_COLUMNS, SPECIAL_INDHOLDSART, Candidates
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.tests.synthetic import generate_rows, write_workbook
+
+
+def _tuple_reduce_rows(header_row: tuple[str, ...], rows) -> tuple[set, list, list]:
+    """Steps 2-12 with the earlier representation: lists with a tuple per row, keeping every value as read."""
+    rules = excel_process.CompiledRules(header_row)
+    hovedstole_keys, not_special, special = set(), [], []
+    for row in rows:
+        if rules.delete(row):
+            continue
+        if not rules.is_sagsomkostning(row):
+            hovedstole_keys.add(rules.key(row))
+            continue
+        if rules.delete_sagsomkostning(row):
+            continue
+        (special if rules.indholdsart(row) in SPECIAL_INDHOLDSART else not_special).append(rules.output(row))
+    return hovedstole_keys, not_special, special
+
+
+def deep_size(obj, seen: set | None = None) -> int:
+    """The size in bytes of obj and every object it refers to, counting each object once."""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (tuple, list, set)):
+        size += sum(deep_size(item, seen) for item in obj)
+    elif isinstance(obj, Candidates):
+        size += sum(deep_size(getattr(obj, name), seen) for name in Candidates.__slots__)
+    elif isinstance(obj, excel_process.FilterResult):
+        size += sum(deep_size(value, seen) for value in vars(obj).values())
+    return size
+
+
+def _measure(func, file) -> tuple[float, float, object]:
+    """Read the file with the XML backend, reduce it with func and return the size in MiB, the seconds and the result."""
+    file.seek(0)
+    start = time.perf_counter()
+    _, rows = xlsx_reader.read_columns(file, REQUIRED_COLUMNS)
+    result = func(REQUIRED_COLUMNS, rows)
+    seconds = time.perf_counter() - start
+    return deep_size(result) / 2**20, seconds, result
+
+
+def main():
+    """Measure both representations on generated workbooks and print a table."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('sizes', nargs='*', type=int, default=[100_000, 500_000])
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'kept':>8} {'tuples (MiB)':>13} {'compact (MiB)':>14} {'saved':>6} {'tuples (s)':>11} {'compact (s)':>12}")
+    for size in args.sizes:
+        file = write_workbook(generate_rows(size))
+
+        tuples, tuples_seconds, (hovedstole_keys, not_special, special) = _measure(_tuple_reduce_rows, file)
+        compact, compact_seconds, result = _measure(excel_process.reduce_rows, file)
+        if (result.hovedstole_keys, list(result.not_special_content_type_rows), list(result.special_content_type_rows)) != \
+                (hovedstole_keys, not_special, special):
+            raise AssertionError(f"The results differ at {size} rows.")
+
+        kept = len(result.hovedstole_keys) + result.candidate_count()
+        print(f"{size:>10} {kept:>8} {tuples:>13.1f} {compact:>14.1f} {1 - compact / tuples:>6.0%} "
+              f"{tuples_seconds:>11.2f} {compact_seconds:>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Track the throughput and memory of each stage of the process with pytest-benchmark, on synthetic fixtures.
+Each benchmark stores rows per second and the peak traced memory in MiB in the extra info of its result,
+so runs saved with --benchmark-autosave can be compared with --benchmark-compare.
+The whole process is replayed as well when the robot's dependencies are installed.
+
+Needs the 'benchmark' extra. Run from the repository root:
+    python -m pytest benchmarks/stages_benchmark.py --benchmark-autosave
+Set BENCHMARK_ROWS to change the number of rows (default 20000).
+"""
+import datetime
+import os
+import tempfile
+import tracemalloc
+from io import BytesIO
+
+import pytest
+
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.auxiliary import read_fp_and_aftale_file
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.excel_process import BACKENDS, read_sheets
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.queue_insert import insert_queue_elements
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.tests import replay
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.tests.stub_orchestrator import StubOrchestratorConnection
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.tests.synthetic import generate_fixture
+
+pytest.importorskip('pytest_benchmark')
+
+ROWS = int(os.environ.get('BENCHMARK_ROWS', 20_000))
+FILES = 3
+
+
+@pytest.fixture(scope='module', name='fixture')
+def fixture_fixture():
+    """A restanceliste of ROWS rows and the FPLKA export that goes with it."""
+    return generate_fixture(ROWS)
+
+
+@pytest.fixture(scope='module', name='workbooks')
+def fixture_workbooks(fixture):
+    """The restanceliste as the bytes of FILES workbooks."""
+    return [workbook.getvalue() for workbook in fixture.workbooks(datetime.date.today(), FILES).values()]
+
+
+def _record(benchmark, rows: int, func, *args) -> None:
+    """Run func once more under tracemalloc and store rows per second and the peak memory of the run."""
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    benchmark.extra_info['rows'] = rows
+    benchmark.extra_info['rows_per_second'] = round(rows / benchmark.stats.stats.mean)
+    benchmark.extra_info['peak_mib'] = round(peak / 2**20, 1)
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_read_sheets(benchmark, workbooks, backend):
+    """Step 2: Read the Excel files and apply the Alteryx rules."""
+    def run():
+        return read_sheets([BytesIO(workbook) for workbook in workbooks], backend=backend)
+
+    benchmark.pedantic(run, rounds=3)
+    _record(benchmark, ROWS, run)
+
+
+def test_parse_fplka(benchmark, fixture):
+    """Step 3: Parse the FPLKA export written by SAP."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "fplka.txt")
+        fixture.write_fplka_export(path)
+
+        benchmark(read_fp_and_aftale_file, path)
+        _record(benchmark, sum(len(aftaler) for aftaler in fixture.fplka.values()), read_fp_and_aftale_file, path)
+
+
+def test_insert_queue_elements(benchmark, fixture):
+    """Step 5: Insert the rows in the job queue, in chunks."""
+    rows = sorted(fixture.expected)
+    since = datetime.datetime.now() - datetime.timedelta(hours=1)
+
+    def run():
+        insert_queue_elements(StubOrchestratorConnection(), "Benchmark", rows, since)
+
+    benchmark(run)
+    _record(benchmark, len(rows), run)
+
+
+def test_replay(benchmark, fixture):
+    """The whole process against local stand-ins. The metrics of each stage of the last run are stored as extra info."""
+    pytest.importorskip('pythoncom')
+
+    result = benchmark.pedantic(replay.replay, args=(fixture,), kwargs={'file_count': FILES}, rounds=1)
+
+    benchmark.extra_info['rows'] = ROWS
+    benchmark.extra_info['rows_per_second'] = round(ROWS / benchmark.stats.stats.mean)
+    benchmark.extra_info['peak_rss_mb'] = result.metrics['peak_rss_mb']
+    benchmark.extra_info['stages'] = {stage['name']: {key: stage[key] for key in ('wall_seconds', 'cpu_seconds', 'rows_in', 'rows_out')}
+                                      for stage in result.metrics['stages']}
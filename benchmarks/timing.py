@@ -0,0 +1,26 @@
+"""Helpers shared by the benchmarks that time functions on generated rows."""
+import argparse
+import time
+
+
+def best_of(repeat: int, func, *args) -> float:
+    """Call func with args repeat times and return the fastest wall-clock time in seconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def size_arguments(description: str, sizes: list[int]) -> argparse.Namespace:
+    """Parse the numbers of rows to time, and the number of times to repeat each timing.
+
+    Args:
+        description: The docstring of the benchmark, shown by --help.
+        sizes: The numbers of rows when none are given.
+    """
+    parser = argparse.ArgumentParser(description=description, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('sizes', nargs='*', type=int, default=sizes)
+    parser.add_argument('--repeat', type=int, default=3)
+    return parser.parse_args()
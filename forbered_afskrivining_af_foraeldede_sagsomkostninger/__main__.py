@@ -1,3 +1,6 @@
 """Entry point for framework"""
 from forbered_afskrivining_af_foraeldede_sagsomkostninger.framework import main
-main()
+
+# Guard the entry point, so worker processes spawned by excel_process don't start the framework again.
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,10 @@
 import tempfile
 import os
 import atexit
+import time
+from typing import Iterable
+
+from forbered_afskrivining_af_foraeldede_sagsomkostninger import metrics
 
 
 class TemporaryFile:
@@ -21,27 +25,100 @@ class TemporaryFile:
         return self.file.name
 
 
-def get_fp_and_aftale_from_file(data: str) -> dict[str, list]:
-    """Given a text file from FPLKA in SAP, this method will create a dictionary with ForretnPartner as key,
-    and a list of aftaler as value.
+def wait_for_file(path: str, timeout: float, stable_seconds: float = 2, initial_delay: float = 0.1, max_delay: float = 5) -> None:
+    """Wait until another program is done writing a file.
+    The file is considered done when it isn't empty, and its size and modification time haven't changed for stable_seconds.
+    The file is polled with exponential backoff.
+
+    Args:
+        path: Path to the file. It doesn't need to exist yet.
+        timeout: The maximum time to wait in seconds.
+        stable_seconds (optional): How long the file must be unchanged.
+        initial_delay (optional): The time between the first polls. It doubles after each poll.
+        max_delay (optional): The maximum time between polls.
+
+    Raises:
+        TimeoutError: If the file isn't done within the timeout.
+    """
+    start = time.monotonic()
+    deadline = start + timeout
+    delay = initial_delay
+    last_signature = None
+    last_change = start
+
+    while True:
+        now = time.monotonic()
+        try:
+            stat = os.stat(path)
+            signature = (stat.st_size, stat.st_mtime_ns)
+        except FileNotFoundError:
+            signature = None
+
+        if signature != last_signature:
+            last_signature = signature
+            last_change = now
+        elif signature is not None and signature[0] > 0 and now - last_change >= stable_seconds:
+            return
+
+        if now >= deadline:
+            raise TimeoutError(f"The file '{path}' was not done after {timeout} s. Last size: {None if signature is None else signature[0]} bytes.")
+
+        time.sleep(min(delay, max(deadline - now, 0)))
+        delay = min(delay * 2, max_delay)
+
+
+def read_fp_and_aftale(lines: Iterable[str]) -> dict[str, frozenset[str]]:
+    """Given the lines of a text file from FPLKA in SAP, this method will create a dictionary with ForretnPartner as key,
+    and a set of aftaler as value.
     The file expected to be exported as "regneark" and saved as a text file.
+    The lines are consumed one at a time, so the file doesn't need to be read into memory first.
+    Lines that are neither a ForretnPartner nor an aftale, e.g. empty lines or headers, are skipped.
 
     Args:
-        data: A string of all the data in the file.
+        lines: The lines of the file.
 
     Returns: Dictionary of ForretnPartner and aftaler.
     """
 
-    fp = ""
+    fp = None
     fp_aftale = {}
 
-    for line in data.split('\n'):
+    for line in lines:
 
         if line.startswith("\tForretnPartner:"):
             # set active fp "key"
-            fp = line.split("\t")[-1]
-            fp_aftale[fp] = []
-        elif len(line) > 0 and line[1].isdigit():
-            fp_aftale[fp].append(line.split("\t")[1].lstrip('0')[:-12])
+            fp = line.rstrip('\r\n').split("\t")[-1]
+            fp_aftale.setdefault(fp, set())
+        elif fp is not None and len(line) > 1 and line[1].isdigit():
+            fields = line.split("\t", 2)
+            if len(fields) > 1:
+                fp_aftale[fp].add(fields[1].rstrip('\r\n').lstrip('0')[:-12])
+
+    return {fp: frozenset(aftaler) for fp, aftaler in fp_aftale.items()}
+
 
-    return fp_aftale
+@metrics.measure("Parse rykkerspærre")
+def read_fp_and_aftale_file(path: str, encoding: str = 'cp1252') -> dict[str, frozenset[str]]:
+    """Read a text file from FPLKA in SAP in chunks and create a dictionary with ForretnPartner as key,
+    and a set of aftaler as value. See read_fp_and_aftale.
+
+    Args:
+        path: Path to the file.
+        encoding (optional): The encoding of the file. SAP exports as cp1252.
+
+    Returns: Dictionary of ForretnPartner and aftaler.
+    """
+    with open(path, encoding=encoding, buffering=1024 * 1024) as file:
+        return read_fp_and_aftale(file)
+
+
+def get_fp_and_aftale_from_file(data: str) -> dict[str, frozenset[str]]:
+    """Given a text file from FPLKA in SAP, this method will create a dictionary with ForretnPartner as key,
+    and a set of aftaler as value. See read_fp_and_aftale.
+
+    Args:
+        data: A string of all the data in the file.
+
+    Returns: Dictionary of ForretnPartner and aftaler.
+    """
+    return read_fp_and_aftale(data.split('\n'))
@@ -0,0 +1,109 @@
+"""The "Alteryx" filtering steps as boolean masks over the columns of a whole sheet, using NumPy and pandas.
+This is an optional engine for large restancelister. It gives the same result as the row-at-a-time rules in
+excel_process, which are the reference: the masks below must be kept in step with DELETE_RULES,
+SAGSOMKOSTNING_RULES and SAGSOMKOSTNING_DELETE_RULES.
+
+Only steps 2-12 are done here. Steps 13 and 14 are done by FilterResult.combine on the merged result of all files,
+as with the row engine, since a set lookup per sagsomkostning is faster than joining the columns in pandas.
+
+Columns are kept as object arrays, so the output holds the cell values exactly as they were read.
+Requires pandas, which is installed with the 'columnar' extra.
+"""
+import datetime
+from operator import itemgetter
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.excel_process import (
+    REMOVE_INDHOLDSART, REQUIRED_COLUMNS, SPECIAL_INDHOLDSART, Candidates, FilterResult, _check_header, _expiry_date_passed
+)
+
+
+def to_columns(header_row: tuple[str, ...], rows: Iterable[tuple]) -> dict[str, np.ndarray]:
+    """Collect the required columns of the rows as object arrays.
+
+    Raises:
+        ValueError: If the header row is missing any of the required columns.
+    """
+    _check_header(header_row)
+
+    column_index = {}
+    for index, name in enumerate(header_row):
+        column_index.setdefault(name, index)
+
+    getter = itemgetter(*(column_index[name] for name in REQUIRED_COLUMNS))
+    values = list(zip(*map(getter, rows))) or [()] * len(REQUIRED_COLUMNS)
+    return {name: np.fromiter(column, dtype=object, count=len(column)) for name, column in zip(REQUIRED_COLUMNS, values)}
+
+
+def _isin(column: np.ndarray, values: Iterable) -> np.ndarray:
+    return pd.Series(column, copy=False).isin(values).to_numpy()
+
+
+def _expiry_date_passed_mask(dates: np.ndarray, today: datetime.datetime) -> np.ndarray:
+    """Step 11 for a whole column. Each distinct date is only checked once, and missing dates are never passed."""
+    codes, uniques = pd.factorize(dates)
+    # Missing values get the code -1, which picks the last element.
+    passed = np.array([_expiry_date_passed(value, today) for value in uniques] + [False], dtype=bool)
+    return passed[codes]
+
+
+def _split(columns: dict[str, np.ndarray], today: datetime.datetime) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Apply steps 2-12.
+
+    Returns:
+        The row positions of the hovedstole, and of the sagsomkostninger without and with special Indholdsart.
+    """
+    rim_aftale = columns['RIM Aftale']
+    rim_aftalestatus = columns['RIM aftalestatus']
+
+    # Steps 2-5: Delete rows
+    delete = (
+        pd.notna(columns['Medhæfter'])
+        | ((rim_aftale == 'MO') & (rim_aftalestatus == '28'))
+        | _isin(columns['Indholdsart'], REMOVE_INDHOLDSART)
+        | pd.notna(columns['Aftale type'])
+    )
+
+    # Steps 7-8: Sagsomkostninger. Step 9: The rest are hovedstole.
+    is_sagsomkostning = _isin(columns['Hovedtransakt.'], ('ZGBY', 'ZREN')) | (columns['Ratespecifikation'] == 'LRT')
+    hovedstole = np.flatnonzero(~delete & ~is_sagsomkostning)
+    sagsomkostninger = np.flatnonzero(~delete & is_sagsomkostning)
+
+    # Steps 10, 11 and 15, only on the sagsomkostninger
+    rim_aftale = rim_aftale[sagsomkostninger]
+    rim_aftalestatus = rim_aftalestatus[sagsomkostninger]
+    delete = (
+        (columns['RykkespærÅrsag'][sagsomkostninger] == 'N')
+        | ~_expiry_date_passed_mask(columns['Forældelsesdato'][sagsomkostninger], today)
+        | ((rim_aftale == 'IN') & (rim_aftalestatus == '21'))
+    )
+    sagsomkostninger = sagsomkostninger[~delete]
+
+    # Step 12: Split on special Indholdsart
+    special = _isin(columns['Indholdsart'][sagsomkostninger], SPECIAL_INDHOLDSART)
+    return hovedstole, sagsomkostninger[~special], sagsomkostninger[special]
+
+
+def _candidates(columns: dict[str, np.ndarray], positions: np.ndarray) -> Candidates:
+    """Reduce rows to (Aftale, Bilagsnummer, FP)."""
+    return Candidates(columns['Aftale'][positions].tolist(), columns['Bilagsnummer'][positions].tolist(),
+                      columns['ForretnPartner'][positions].tolist())
+
+
+def reduce_columns(columns: dict[str, np.ndarray]) -> FilterResult:
+    """Apply steps 2-12 to columns made by to_columns. The result is equal to that of excel_process.reduce_rows."""
+    hovedstole, not_special, special = _split(columns, datetime.datetime.today())
+    return FilterResult(
+        hovedstole_keys=set(zip(columns['ForretnPartner'][hovedstole].tolist(), columns['Aftale'][hovedstole].tolist())),
+        not_special_content_type_rows=_candidates(columns, not_special),
+        special_content_type_rows=_candidates(columns, special),
+        rows_read=len(columns['Aftale']),
+    )
+
+
+def reduce_rows(header_row: tuple[str, ...], rows: Iterable[tuple]) -> FilterResult:
+    """Apply steps 2-12 to the rows. See excel_process.reduce_rows."""
+    return reduce_columns(to_columns(header_row, rows))
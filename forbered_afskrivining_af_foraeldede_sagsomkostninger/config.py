@@ -1,10 +1,58 @@
 """Framework specific setup"""
+import os
+import tempfile
+
 SMTP_SERVER = "smtp.aarhuskommune.local"
 SMTP_PORT = 25
 SCREENSHOT_SENDER = "robot@friend.dk"
+SMTP_STARTTLS = True
+# Error reports wait in a bounded queue for the background sender, and are sent when the run ends, within the timeout in seconds.
+ERROR_REPORT_QUEUE_SIZE = 5
+ERROR_REPORT_TIMEOUT = 60
+# Screenshots are downscaled to this width in pixels and compressed as JPEG to at most this many bytes.
+SCREENSHOT_MAX_WIDTH = 1920
+SCREENSHOT_MAX_BYTES = 500 * 1024
 MAX_RETRY_COUNT = 3
 #Configuration for the process, where runtime parameters are defined.
 QUEUE_NAME = 'Afskrivning-af-foraeldede-sagsomkostninger'
 SAP_CREDENTIALS = "SAP FOSA"
 GRAPH_CREDENTIALS = "graph api"
 ERROR_EMAIL = "Error Email"
+# Number of worker processes reading the Excel attachments. 1 reads them one at a time in the robot process.
+EXCEL_WORKERS = 1
+# How the Excel attachments are read. 'openpyxl' or 'xml', which only reads the columns used by the Alteryx rules.
+EXCEL_BACKEND = 'openpyxl'
+# How the Alteryx rules are applied. 'python' or 'columnar', which needs pandas from the 'columnar' extra.
+EXCEL_ENGINE = 'python'
+# Cache of the reduced Excel attachments, so a retry doesn't read the same files again. None disables the cache.
+EXCEL_CACHE_DIR = os.path.join(tempfile.gettempdir(), "forbered_afskrivning_excel_cache")
+EXCEL_CACHE_MAX_BYTES = 200 * 1024 * 1024
+EXCEL_CACHE_MAX_AGE_DAYS = 7
+# Number of simultaneous attachment downloads, and whether attachments are written to temporary files instead of kept in memory.
+ATTACHMENT_DOWNLOAD_WORKERS = 4
+ATTACHMENT_SPOOL_TO_DISK = False
+# Seconds to wait for the SAP export of rykkerspærrer, which runs while the Excel attachments are read.
+SAP_EXPORT_TIMEOUT = 30 * 60
+# Seconds to wait for the SAP export when a try fails before it is needed. A still running export is then stopped by closing SAP.
+SAP_STOP_TIMEOUT = 10
+# Seconds to wait for SAP to write the export file, and how long the file must be unchanged to be considered done.
+SAP_FILE_TIMEOUT = 10 * 60
+SAP_FILE_STABLE_SECONDS = 2
+# The usual duration of a SAP login in seconds. Used to log the time saved when SAP isn't needed.
+SAP_LOGIN_SECONDS = 30
+# Queue elements are inserted in chunks. Elements already in the queue, created within the window, or in the checkpoint file are skipped on a retry.
+QUEUE_CHUNK_SIZE = 1000
+QUEUE_DUPLICATE_WINDOW_HOURS = 24
+QUEUE_CHECKPOINT_FILE = os.path.join(tempfile.gettempdir(), "forbered_afskrivning_queue_checkpoint.txt")
+# The key in the data of each queue element holding the file date of the restanceliste the row came from, e.g. '20231024'.
+FILE_DATE_TAG = 'file_date'
+# Rows queued by earlier runs are kept in this index, and only new rows are queued. None queues every row on every run.
+# Rows not seen for the retention period are forgotten, and queued again if they come back.
+INCREMENTAL_INDEX_FILE = os.path.join(tempfile.gettempdir(), "forbered_afskrivning_incremental_index.sqlite3")
+INCREMENTAL_INDEX_RETENTION_DAYS = 90
+# Queue every row, also the ones queued by earlier runs. Also forced by starting the process with this process argument.
+FORCE_FULL_RUN = False
+FULL_RUN_ARGUMENT = "full"
+# Profile each run with cProfile. The slowest functions are logged, and the full profile is saved to PROFILE_FILE.
+PROFILE = False
+PROFILE_FILE = os.path.join(tempfile.gettempdir(), "forbered_afskrivning.prof")
@@ -1,51 +1,235 @@
-"""Sends an email with an error report, including a screenshot, when an exception occurs."""
+"""Sends an email with an error report, including a screenshot, when an exception occurs.
+Reports are sent by an ErrorReporter on a background thread, so sending them doesn't delay the next try of the process.
+The screenshot is taken when the error is reported, and sent as a downscaled JPEG attachment shown in the HTML body.
+"""
+from dataclasses import dataclass
+import html
+from io import BytesIO
+import queue
 import smtplib
-import base64
+import threading
+import time
 import traceback
 from email.message import EmailMessage
-from io import BytesIO
-from PIL import ImageGrab
+from email.utils import make_msgid
+from typing import TYPE_CHECKING, Any, Callable
 from forbered_afskrivining_af_foraeldede_sagsomkostninger import config
 
+if TYPE_CHECKING:
+    from OpenOrchestrator.orchestrator_connection.connection import OrchestratorConnection
 
-def send_error_screenshot(to_address: str | list[str], exception: Exception, process_name: str):
-    """Sends an email with an error report, including a screenshot, when an exception occurs.
-    Configuration details such as SMTP server, port, sender email, etc., should be set in 'config' module.
+
+def grab_screenshot():
+    """Take a screenshot of all screens. PIL is only imported when there is an error to report."""
+    from PIL import ImageGrab  # pylint: disable=(import-outside-toplevel)
+    return ImageGrab.grab(all_screens=True)
+
+
+def compress_screenshot(screenshot, max_width: int = config.SCREENSHOT_MAX_WIDTH, max_bytes: int = config.SCREENSHOT_MAX_BYTES) -> bytes:
+    """Downscale a screenshot to max_width and compress it as JPEG. The quality, and then the size, is lowered until
+    it is no larger than max_bytes.
 
     Args:
-        to_address (str or list[str]): Email address or list of addresses to send the error report.
-        exception (Exception): The exception that triggered the error.
-        process_name (str): Name of the process from OpenOrchestrator.
+        screenshot: The screenshot as a PIL image.
+        max_width (optional): The maximum width in pixels.
+        max_bytes (optional): The maximum size of the JPEG.
+
+    Returns:
+        The JPEG.
     """
+    image = screenshot.convert('RGB')
+    if image.width > max_width:
+        image = image.resize((max_width, round(image.height * max_width / image.width)))
+
+    while True:
+        for quality in (85, 70, 50, 30):
+            buffer = BytesIO()
+            image.save(buffer, format='JPEG', quality=quality, optimize=True)
+            if buffer.tell() <= max_bytes:
+                return buffer.getvalue()
+        if image.width <= 100:
+            return buffer.getvalue()
+        image = image.resize((image.width * 3 // 4, image.height * 3 // 4))
+
+
+@dataclass
+class _Report:
+    error_type: str
+    error_message: str
+    trace: str
+    screenshot: Any
+
 
-    # Create message
+def create_message(to_address: str | list[str], process_name: str, report: _Report, screenshot: bytes | None) -> EmailMessage:
+    """Create an error report with the screenshot as a JPEG attachment referenced from the HTML body."""
+    error_type, error_message, trace = report.error_type, report.error_message, report.trace
     msg = EmailMessage()
     msg['to'] = to_address
     msg['from'] = config.SCREENSHOT_SENDER
     msg['subject'] = f"Error screenshot: {process_name}"
 
-    # Take screenshot
-    screenshot = ImageGrab.grab()
-    buffered = BytesIO()
-    screenshot.save(buffered, format='PNG')
-    screenshot_base64 = base64.b64encode(buffered.getvalue()).decode('utf-8')
+    msg.set_content(f"Error type: {error_type}\nError message: {error_message}\n\n{trace}")
 
-    # Create an HTML message with the embedded image
+    image_id = make_msgid()
+    image = f'<img src="cid:{image_id[1:-1]}" alt="Screenshot">' if screenshot else "<p>No screenshot.</p>"
     html_message = f"""
     <html>
     <body>
-    <p>Error type: {type(exception).__name__}</p>
-    <p>Error message: {exception}</p>
-    <p>{traceback.format_exc()}</p>
-    <img src="data:image/png;base64,{screenshot_base64}" alt="Screenshot">
+    <p>Error type: {html.escape(error_type)}</p>
+    <p>Error message: {html.escape(error_message)}</p>
+    <pre>{html.escape(trace)}</pre>
+    {image}
     </body>
     </html>
     """
-
-    msg.set_content("Please enable HTML to view this message.")
     msg.add_alternative(html_message, subtype='html')
+    if screenshot:
+        msg.get_payload()[1].add_related(screenshot, 'image', 'jpeg', cid=image_id, filename="screenshot.jpg")
+    return msg
+
+
+class ErrorReporter:  # pylint: disable=(too-many-instance-attributes)
+    """Send error reports by email on a background thread, over one SMTP connection.
+    Reports wait in a bounded queue, and reports beyond its size are dropped. An error with the same type and message
+    as one already reported by the reporter isn't reported again.
+    Use as a context manager, or call close when done, to send the waiting reports.
+    """
+    # pylint: disable-next=(too-many-arguments)
+    def __init__(self, to_address: str | list[str], process_name: str, orchestrator_connection: 'OrchestratorConnection | None' = None, *,
+                 queue_size: int = config.ERROR_REPORT_QUEUE_SIZE, grab: Callable[[], Any] | None = grab_screenshot,
+                 smtp_server: str = config.SMTP_SERVER, smtp_port: int = config.SMTP_PORT, starttls: bool = config.SMTP_STARTTLS):
+        """
+        Args:
+            to_address: Email address or list of addresses to send the error reports to.
+            process_name: Name of the process from OpenOrchestrator.
+            orchestrator_connection (optional): Where errors sending the reports are logged.
+            queue_size (optional): The maximum number of reports waiting to be sent.
+            grab (optional): Take a screenshot as a PIL image. None sends reports without screenshots.
+            smtp_server (optional): The SMTP server.
+            smtp_port (optional): The port of the SMTP server.
+            starttls (optional): Whether to encrypt the connection with STARTTLS.
+        """
+        self.to_address = to_address
+        self.process_name = process_name
+        self.orchestrator_connection = orchestrator_connection
+        self.grab = grab
+        self.smtp_server = smtp_server
+        self.smtp_port = smtp_port
+        self.starttls = starttls
+        self.sent = 0
+        self.duplicates = 0
+        self.dropped = 0
+        self._reported = set()
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._smtp = None
+        self._thread = threading.Thread(target=self._work, name="Error reports", daemon=True)
+        self._thread.start()
+
+    def report(self, exception: BaseException) -> bool:
+        """Take a screenshot and queue a report of an error. Returns right away.
 
-    # Send message
-    with smtplib.SMTP(config.SMTP_SERVER, config.SMTP_PORT) as smtp:
-        smtp.starttls()
-        smtp.send_message(msg)
+        Returns:
+            True if the report was queued, False if it was a duplicate or the queue was full.
+        """
+        key = (type(exception).__name__, str(exception))
+        if key in self._reported:
+            self.duplicates += 1
+            return False
+        self._reported.add(key)
+
+        screenshot = None
+        if self.grab:
+            try:
+                screenshot = self.grab()
+            except Exception as error:  # pylint: disable=(broad-exception-caught)
+                self._log_error(f"Could not take a screenshot for the error report. {type(error).__name__}: {error}")
+
+        trace = "".join(traceback.format_exception(exception))
+        try:
+            self._queue.put_nowait(_Report(*key, trace, screenshot))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def close(self, timeout: float | None = config.ERROR_REPORT_TIMEOUT) -> None:
+        """Send the waiting reports and close the SMTP connection. Waits at most the timeout in total.
+        After the timeout the remaining reports are abandoned with the background thread.
+        """
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(None if deadline is None else max(deadline - time.perf_counter(), 0))
+
+    def __enter__(self) -> 'ErrorReporter':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _work(self) -> None:
+        while (report := self._queue.get()) is not None:
+            try:
+                self._send(report)
+                self.sent += 1
+            except Exception as error:  # pylint: disable=(broad-exception-caught)
+                self._log_error(f"Could not send the error report. {type(error).__name__}: {error}")
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except smtplib.SMTPException:
+                pass
+
+    def _send(self, report: _Report) -> None:
+        screenshot = compress_screenshot(report.screenshot) if report.screenshot is not None else None
+        msg = create_message(self.to_address, self.process_name, report, screenshot)
+        try:
+            try:
+                self._connection().send_message(msg)
+            except smtplib.SMTPServerDisconnected:
+                # The server closes idle connections, so connect again once.
+                self._disconnect()
+                self._connection().send_message(msg)
+        except Exception:
+            # The connection may be left in the middle of a command, so the next report connects again.
+            self._disconnect()
+            raise
+
+    def _connection(self) -> smtplib.SMTP:
+        """The open SMTP connection, or a new one."""
+        if self._smtp is None:
+            smtp = smtplib.SMTP(self.smtp_server, self.smtp_port)
+            if self.starttls:
+                try:
+                    smtp.starttls()
+                except Exception:
+                    smtp.close()
+                    raise
+            self._smtp = smtp
+        return self._smtp
+
+    def _disconnect(self) -> None:
+        """Close the SMTP connection without saying goodbye to the server."""
+        if self._smtp is not None:
+            self._smtp.close()
+            self._smtp = None
+
+    def _log_error(self, message: str) -> None:
+        if self.orchestrator_connection is not None:
+            self.orchestrator_connection.log_error(message)
+
+
+def send_error_screenshot(to_address: str | list[str], exception: Exception, process_name: str):
+    """Sends an email with an error report, including a screenshot, when an exception occurs.
+    Configuration details such as SMTP server, port, sender email, etc., should be set in 'config' module.
+    Waits until the report is sent. Use ErrorReporter to send reports in the background.
+
+    Args:
+        to_address (str or list[str]): Email address or list of addresses to send the error report.
+        exception (Exception): The exception that triggered the error.
+        process_name (str): Name of the process from OpenOrchestrator.
+    """
+    with ErrorReporter(to_address, process_name) as reporter:
+        reporter.report(exception)
@@ -1,129 +1,462 @@
 """Read Excel files and extract cases for the SAP process."""
+from concurrent.futures import ProcessPoolExecutor
 import datetime
+from dataclasses import dataclass, field, fields
+from functools import partial
+import hashlib
 from io import BytesIO
+from operator import itemgetter
+from typing import Callable, Iterable, Iterator, NamedTuple
 import warnings
 import openpyxl
+from openpyxl.utils.datetime import from_excel
+from forbered_afskrivining_af_foraeldede_sagsomkostninger import metrics, xlsx_reader
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.result_cache import ResultCache
 
 REMOVE_INDHOLDSART = ("BØVO", "EJEN", "BYGS", "BYGB", "MERE", "MERU", "BUMR" ,"PLAL", "PLFL", "KAAL","KAFL")
+SPECIAL_INDHOLDSART = ('DAGI', 'DAG2', 'SFO2')
 
-# suppress warnings from openpyxl. E.g. "Cell R13023 is marked as a date but the serial value -693596 is outside the limits for dates. The cell will be treated as an error."
-warnings.filterwarnings("ignore", category=UserWarning)
+# The ways of reading the Excel files. 'openpyxl' reads every cell with openpyxl, 'xml' reads only the used columns with xlsx_reader.
+BACKENDS = ('openpyxl', 'xml')
 
-def _load_excel_files(path):
-    wb = openpyxl.load_workbook(path, read_only=True)
-    print(f"loaded {path}")
-    ws = wb.active
-    rows = ws.values
-    header_row = next(rows)
-    rows = list(rows)  # convert to list, because generator cannot be pickled
+# The ways of applying the rules. 'python' filters one row at a time, 'columnar' filters whole columns with pandas.
+ENGINES = ('python', 'columnar')
 
-    return {'rows': rows, 'header': header_row}
+# suppress warnings from openpyxl about dates outside the limits for dates. E.g. "Cell R13023 is marked as a date but the serial value -693596 is outside the limits for dates. The cell will be treated as an error."
+# These dates are treated as empty in step 11.
+warnings.filterwarnings("ignore", message="Cell .* is marked as a date but the serial value", category=UserWarning, module="openpyxl")
 
-# pylint: disable=(too-many-branches)
-def read_sheets(paths: list[str] | list[BytesIO]) -> list[tuple[str, str, str]]:
-    """This method reads all Excel files and applies the "Alteryx" filtering steps described in the PDD section 5.2.
-    The KMD restanceliste from KMD, is reduced to a list of (Aftale, Bilagsnummer, FP)
+
+class Rule(NamedTuple):
+    """A single Alteryx step.
+    The test is called with the positions of the columns in the row, the arguments and a function that binds a value
+    to a name, once per header row, and returns a Python expression of 'row', which is true if the row matches.
+    """
+    step: int
+    columns: tuple[str, ...]
+    test: Callable[[tuple[int, ...], tuple, Callable[[object], str]], str]
+    arguments: tuple = ()
+
+
+def _as_datetime(value) -> datetime.datetime | None:
+    """Convert a date cell to a datetime.
+    openpyxl gives a datetime, or the error '#VALUE!' if the serial value is outside the limits for dates.
+    The XML reader gives the serial value itself, which is only converted here, when a row reaches step 11.
+    Serial values outside the limits for dates, and errors, are treated as empty.
+    """
+    if isinstance(value, datetime.datetime):
+        return value
+
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        try:
+            value = from_excel(value)
+        except (OverflowError, ValueError):
+            return None
+        if isinstance(value, datetime.datetime):
+            return value
+
+    return None
+
+
+def _expiry_date_passed(date, today: datetime.datetime) -> bool:
+    date = _as_datetime(date)
+    if date is None:
+        return False
+
+    if date > today:
+        return False
+
+    return True
+
+
+def _not_empty(positions: tuple[int, ...], _arguments: tuple, _bind: Callable[[object], str]) -> str:
+    """The column has a value."""
+    (index,) = positions
+    return f"row[{index}] is not None"
+
+
+def _equal(positions: tuple[int, ...], values: tuple, bind: Callable[[object], str]) -> str:
+    """Each column is equal to its value in the arguments."""
+    return " and ".join(f"row[{index}] == {bind(value)}" for index, value in zip(positions, values, strict=True))
+
+
+def _one_of(positions: tuple[int, ...], values: tuple, bind: Callable[[object], str]) -> str:
+    """The column is one of the values in the arguments."""
+    (index,) = positions
+    return f"row[{index}] in {bind(frozenset(values))}"
+
+
+def _expiry_date_not_passed(positions: tuple[int, ...], _arguments: tuple, bind: Callable[[object], str]) -> str:
+    """The date in the column is missing, or hasn't passed today."""
+    (index,) = positions
+    return f"not {bind(_expiry_date_passed)}(row[{index}], {bind(datetime.datetime.today())})"
+
+
+# Steps 2-5: Delete rows matching any of these rules.
+DELETE_RULES = (
+    Rule(2, ('Medhæfter',), _not_empty),
+    Rule(3, ('RIM Aftale', 'RIM aftalestatus'), _equal, ('MO', '28')),
+    Rule(4, ('Indholdsart',), _one_of, REMOVE_INDHOLDSART),
+    Rule(5, ('Aftale type',), _not_empty),
+)
+
+# Steps 7-8: Move rows matching any of these rules to sagsomkostninger.
+# Step 9: All remaining rows are hovedstole.
+SAGSOMKOSTNING_RULES = (
+    Rule(7, ('Hovedtransakt.',), _one_of, ('ZGBY', 'ZREN')),
+    Rule(8, ('Ratespecifikation',), _equal, ('LRT',)),
+)
+
+# Steps 10, 11 and 15: Delete sagsomkostninger matching any of these rules.
+# The rules only look at the row itself, so they are applied before the hovedstole match in step 13.
+SAGSOMKOSTNING_DELETE_RULES = (
+    Rule(10, ('RykkespærÅrsag',), _equal, ('N',)),
+    Rule(11, ('Forældelsesdato',), _expiry_date_not_passed),
+    Rule(15, ('RIM Aftale', 'RIM aftalestatus'), _equal, ('IN', '21')),
+)
+
+# Other columns used by steps 12-14 and the output.
+KEY_COLUMNS = ('Indholdsart', 'ForretnPartner', 'Aftale', 'Bilagsnummer')
+
+
+def rule_columns(rules: Iterable[Rule]) -> set[str]:
+    """Get the names of all columns used by the rules."""
+    return {column for rule in rules for column in rule.columns}
+
+
+# All columns used by the rules and the output.
+REQUIRED_COLUMNS = tuple(sorted(rule_columns(DELETE_RULES + SAGSOMKOSTNING_RULES + SAGSOMKOSTNING_DELETE_RULES).union(KEY_COLUMNS)))
+
+
+def _check_header(header_row: tuple) -> None:
+    """Raise a ValueError if the header row is missing any of the required columns."""
+    missing = sorted(set(REQUIRED_COLUMNS).difference(header_row))
+    if missing:
+        raise ValueError(f"The header row is missing the columns: {missing}")
+
+
+def _match_any(rules: Iterable[Rule], column_index: dict[str, int]) -> Callable[[tuple], bool]:
+    """Make a single predicate, which is true if any of the rules match a row. The rules are tried in order.
+    The expressions of the rules are compiled into one function, with the column positions as constants and the values
+    as globals of the function, so a row is tested without calling a function per rule.
+    """
+    constants = {}
+
+    def bind(value) -> str:
+        name = f"_{len(constants)}"
+        constants[name] = value
+        return name
+
+    expressions = [rule.test(tuple(column_index[name] for name in rule.columns), rule.arguments, bind) for rule in rules]
+    source = " or ".join(f"({expression})" for expression in expressions) or "False"
+    # The expressions are made by the tests above from column positions and names of bound values only.
+    return eval(f"lambda row: {source}", constants)  # pylint: disable=(eval-used)
+
+
+# pylint: disable-next=(too-few-public-methods)
+class CompiledRules:
+    """The Alteryx rules bound to a header row.
+    Column names are resolved to positions once, and each group of rules is compiled into a single predicate.
+    """
+    def __init__(self, header_row: tuple[str, ...]):
+        _check_header(header_row)
+
+        column_index = {}
+        for index, name in enumerate(header_row):
+            column_index.setdefault(name, index)
+
+        self.delete = _match_any(DELETE_RULES, column_index)
+        self.is_sagsomkostning = _match_any(SAGSOMKOSTNING_RULES, column_index)
+        self.delete_sagsomkostning = _match_any(SAGSOMKOSTNING_DELETE_RULES, column_index)
+        self.indholdsart = itemgetter(column_index['Indholdsart'])
+        self.key = itemgetter(column_index['ForretnPartner'], column_index['Aftale'])
+        self.output = itemgetter(column_index['Aftale'], column_index['Bilagsnummer'], column_index['ForretnPartner'])
+
+
+class Candidates:
+    """Sagsomkostninger reduced to (Aftale, Bilagsnummer, FP), kept as three parallel lists.
+    Besides the values themselves, this takes a third of the memory of a list of tuples. Iterating gives the rows as tuples.
+    """
+    __slots__ = ('aftale', 'bilagsnummer', 'fp')
+
+    def __init__(self, aftale: list | None = None, bilagsnummer: list | None = None, fp: list | None = None):
+        self.aftale = aftale if aftale is not None else []
+        self.bilagsnummer = bilagsnummer if bilagsnummer is not None else []
+        self.fp = fp if fp is not None else []
+
+    def append(self, aftale, bilagsnummer, fp) -> None:
+        """Add a row."""
+        self.aftale.append(aftale)
+        self.bilagsnummer.append(bilagsnummer)
+        self.fp.append(fp)
+
+    def extend(self, other: 'Candidates') -> None:
+        """Add the rows of another instance."""
+        self.aftale.extend(other.aftale)
+        self.bilagsnummer.extend(other.bilagsnummer)
+        self.fp.extend(other.fp)
+
+    def __len__(self) -> int:
+        return len(self.aftale)
+
+    def __iter__(self) -> Iterator[tuple]:
+        return zip(self.aftale, self.bilagsnummer, self.fp)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Candidates):
+            return NotImplemented
+        return (self.aftale, self.bilagsnummer, self.fp) == (other.aftale, other.bilagsnummer, other.fp)
+
+    def __repr__(self) -> str:
+        return f"Candidates({list(self)!r})"
+
+
+@dataclass
+class FilterResult:
+    """The sagsomkostninger that passed steps 2-12, reduced to (Aftale, Bilagsnummer, FP),
+    and the set of (FP, Aftale) from hovedstole, which is all that is needed to finish steps 13 and 14.
+    rows_read is the number of rows before step 2.
+    """
+    hovedstole_keys: set[tuple] = field(default_factory=set)
+    not_special_content_type_rows: Candidates = field(default_factory=Candidates)
+    special_content_type_rows: Candidates = field(default_factory=Candidates)
+    rows_read: int = 0
+
+    def candidate_count(self) -> int:
+        """The number of sagsomkostninger going into step 13."""
+        return len(self.not_special_content_type_rows) + len(self.special_content_type_rows)
+
+    def combine(self) -> list[tuple[str, str, str]]:
+        """Apply steps 13 and 14 and return the final list of (Aftale, Bilagsnummer, FP)."""
+        # Step 13: remove rows from sagsomkostninger that do not have matching (FP, aftale) i hovedstole.
+        rows = [row for row in self.not_special_content_type_rows if (row[2], row[0]) not in self.hovedstole_keys]
+
+        # Step 14: Combine lists
+        rows.extend(self.special_content_type_rows)
+        return rows
+
+    def merge(self, other: 'FilterResult') -> None:
+        """Add the result of another file. Results must be merged in the order of the files."""
+        self.hovedstole_keys.update(other.hovedstole_keys)
+        self.not_special_content_type_rows.extend(other.not_special_content_type_rows)
+        self.special_content_type_rows.extend(other.special_content_type_rows)
+        self.rows_read += other.rows_read
+
+
+def reduce_rows(header_row: tuple[str, ...], rows: Iterable[tuple], result: FilterResult | None = None) -> FilterResult:
+    """Apply the "Alteryx" filtering steps 2-12 to the rows in a single pass.
+    The rows are consumed one at a time, so they can be streamed directly from the Excel file.
 
     Args:
-        paths: path to all Excel file
+        header_row: The header row of the restanceliste.
+        rows: The rows of the restanceliste, without the header.
+        result (optional): A result to add the rows to, e.g. from a previous file.
 
     Returns:
-        Filtered rows from the Excel files.
+        The reduced result of the rows.
     """
+    rules = CompiledRules(header_row)
 
-    # Step 1: Merge files to one list of rows
-    sheets = []
-    for path in paths:
-        sheets.append(_load_excel_files(path))
+    if result is None:
+        result = FilterResult()
 
-    header_row = sheets[0]['header']
-    rows = []
-    for sheet in sheets:
-        rows.extend(sheet['rows'])
-    del sheets
+    hovedstole_keys = result.hovedstole_keys
+    special_content_type_rows = result.special_content_type_rows
+    not_special_content_type_rows = result.not_special_content_type_rows
 
-    hovedstole = []
-    sagsomkostninger = []
+    # FP and Aftale repeat across the rows of a partner, but each cell is read as a new object.
+    # Keeping one object per value roughly halves the memory of the strings in the result.
+    values = {}
+    share = values.setdefault
 
-    for row in rows:
-        # Step 2: Delete rows where Medhæfter is not empty
-        if row[header_row.index('Medhæfter')] is not None:
+    rows_read = 0
+    for rows_read, row in enumerate(rows, start=1):
+        # Steps 2-5
+        if rules.delete(row):
             continue
 
-        # Step 3: Delete row if RIM Aftale is MO and RIM aftalestatus is 28
-        if row[header_row.index('RIM Aftale')] == 'MO' and row[header_row.index('RIM aftalestatus')] == '28':
+        # Step 9: Rows that are not sagsomkostninger are hovedstole. Only (FP, Aftale) is used from these.
+        if not rules.is_sagsomkostning(row):  # Steps 7-8
+            fp, aftale = rules.key(row)
+            hovedstole_keys.add((share(fp, fp), share(aftale, aftale)))
             continue
 
-        # Step 4: delete rows where indholdsart is on the list (e.g. BØVO.)
-        if row[header_row.index('Indholdsart')] in REMOVE_INDHOLDSART:
+        # Steps 10, 11 and 15
+        if rules.delete_sagsomkostning(row):
             continue
 
-        # Step 5: Delete rows where Aftale type is not empty
-        if row[header_row.index('Aftale type')] is not None:
-            continue
+        # Step 12: Split rows with "Indholdsart" ['DAGI', 'DAG2', 'SFO2'] to special_content_type_rows and not_special[...]
+        # and reduce to three columns: Aftale, Bilagsnummer, FP
+        aftale, bilagsnummer, fp = rules.output(row)
+        if rules.indholdsart(row) in SPECIAL_INDHOLDSART:
+            special_content_type_rows.append(share(aftale, aftale), bilagsnummer, share(fp, fp))
+        else:
+            not_special_content_type_rows.append(share(aftale, aftale), bilagsnummer, share(fp, fp))
 
-        # Step 6: Skip.
+    result.rows_read += rows_read
+    return result
 
-        # Step 7: Move rows with ZGBY or ZREN to sagsomkostninger
-        if row[header_row.index('Hovedtransakt.')] in ('ZGBY', 'ZREN'):
-            sagsomkostninger.append(row)
-            continue
 
-        # Step 8: Move rows with Ratespecifikation LRT to sagsomkostnigner.
-        if row[header_row.index('Ratespecifikation')] == 'LRT':
-            sagsomkostninger.append(row)
-        else:  # Step 9: remaining rows, I.E. all, where Ratespecifikation is not LRT goes to hovedstole.
-            hovedstole.append(row)
+def filter_rows(header_row: tuple[str, ...], rows: Iterable[tuple]) -> list[tuple[str, str, str]]:
+    """Apply the "Alteryx" filtering steps 2-15 to the rows.
+
+    Args:
+        header_row: The header row of the restanceliste.
+        rows: The rows of the restanceliste, without the header.
+
+    Returns:
+        Filtered rows reduced to (Aftale, Bilagsnummer, FP).
+    """
+    return reduce_rows(header_row, rows).combine()
 
-        # exit loop
 
-    # Step 10: Delete row from sagsomkostninger if "RykkespærÅrsag" is 'N'.
-    sagsomkostninger = [row for row in sagsomkostninger if row[header_row.index('RykkespærÅrsag')] != 'N']
+def _iter_rows(path: str | BytesIO) -> Iterator[tuple]:
+    """Yield the rows of the active sheet, header first, as openpyxl reads them."""
+    wb = openpyxl.load_workbook(path, read_only=True)
+    try:
+        yield from wb.active.values
+    finally:
+        wb.close()
+
+
+def _reduce_file(path: str | BytesIO, backend: str = 'openpyxl', engine: str = 'python') -> tuple[tuple | None, FilterResult]:
+    """Read a single Excel file and apply steps 2-12.
+    This runs in a worker process when read_sheets uses more than one worker, so both arguments
+    and results must be picklable.
+
+    Returns:
+        The header row, or None if the file is empty, and the reduced result of the file.
+    """
+    if backend == 'xml':
+        header_row, rows = xlsx_reader.read_columns(path, REQUIRED_COLUMNS)
+        if not header_row:
+            return None, FilterResult()
 
-    # Step 11: Delete row from sagsomkostninger if Forældelse is None or later than today.
-    def _expirey_date_passed(row):
-        date = row[header_row.index('Forældelsesdato')]
-        if date is None:
-            return False
+        _check_header(header_row)
+        # The rows only have the required columns.
+        rules_header_row = REQUIRED_COLUMNS
+    else:
+        rows = _iter_rows(path)
+        header_row = next(rows, None)
 
-        if date > datetime.datetime.today():
-            return False
+        if header_row is None:
+            return None, FilterResult()
+        rules_header_row = header_row
 
-        return True
+    if engine == 'columnar':
+        # pandas is optional, so it is only imported when the columnar engine is used.
+        from forbered_afskrivining_af_foraeldede_sagsomkostninger import columnar  # pylint: disable=(import-outside-toplevel)
+        return header_row, columnar.reduce_rows(rules_header_row, rows)
 
-    sagsomkostninger = [row for row in sagsomkostninger if _expirey_date_passed(row)]
+    return header_row, reduce_rows(rules_header_row, rows)
 
-    # Step 12: Split rows with "Indholdsart" ['DAGI', 'DAG2', 'SFO2'] to special_content_type_rows and not_special[...]
-    special_content_type_rows = []
-    not_special_content_type_rows = []
 
-    for row in sagsomkostninger:
-        if row[header_row.index('Indholdsart')] in ['DAGI', 'DAG2', 'SFO2']:
-            special_content_type_rows.append(row)
+def rules_version() -> str:
+    """Identify the rules applied by reduce_rows, e.g. for caching the result of a file.
+    The version changes when the rules change, and every day, since step 11 depends on today's date.
+    """
+    # The repr of a function includes its address, so only the name of the test is used.
+    rules = ([(rule.step, rule.columns, rule.test.__name__, rule.arguments) for rule in DELETE_RULES + SAGSOMKOSTNING_RULES + SAGSOMKOSTNING_DELETE_RULES], KEY_COLUMNS,
+             REMOVE_INDHOLDSART, SPECIAL_INDHOLDSART, [(result_field.name, str(result_field.type)) for result_field in fields(FilterResult)])
+    return f"{datetime.date.today().isoformat()}-{hashlib.sha256(repr(rules).encode()).hexdigest()[:16]}"
+
+
+def _cache_key(cache: ResultCache, path: str | BytesIO, version: str) -> str:
+    """The cache key of a file. The file is hashed in chunks, and the position of a BytesIO is kept."""
+    if isinstance(path, BytesIO):
+        position = path.tell()
+        path.seek(0)
+        try:
+            return cache.key(path, version)
+        finally:
+            path.seek(position)
+
+    with open(path, 'rb') as file:
+        return cache.key(file, version)
+
+
+def _check_options(backend: str, engine: str) -> None:
+    """Raise a ValueError if the backend or engine is unknown."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}'. Use one of {BACKENDS}.")
+
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine '{engine}'. Use one of {ENGINES}.")
+
+
+def read_sheets(paths: list[str] | list[BytesIO], workers: int = 1, backend: str = 'openpyxl', cache: ResultCache | None = None,
+                engine: str = 'python') -> list[tuple[str, str, str]]:
+    """This method reads all Excel files and applies the "Alteryx" filtering steps described in the PDD section 5.2.
+    The KMD restanceliste from KMD, is reduced to a list of (Aftale, Bilagsnummer, FP)
+    The rows are filtered while they are read, so only the reduced result is kept in memory.
+
+    Args:
+        paths: path to all Excel file
+        workers (optional): The number of processes used to read the files in parallel.
+            With 1 the files are read one at a time in this process. The result is the same either way.
+        backend (optional): How the files are read, one of BACKENDS. The result is the same either way.
+        cache (optional): A cache of the reduced result of each file. Files found in the cache are not read again.
+        engine (optional): How the rules are applied, one of ENGINES. The result is the same either way.
+            'columnar' requires pandas.
+
+    Returns:
+        Filtered rows from the Excel files.
+
+    Raises:
+        ValueError: If there are no files, a file is empty, the header of a file differs from the first file
+            or the backend or engine is unknown.
+        ImportError: If the engine is 'columnar' and pandas isn't installed.
+    """
+    if not paths:
+        raise ValueError("No Excel files to read.")
+
+    _check_options(backend, engine)
+
+    with metrics.stage("Alteryx steps 1-12") as stage:
+        # Steps 2-12 for each file, using the cached result of files that have been read before.
+        reduced_files = [None] * len(paths)
+        keys = [None] * len(paths)
+        if cache is not None:
+            version = f"{rules_version()}-{backend}"
+            for index, path in enumerate(paths):
+                keys[index] = _cache_key(cache, path, version)
+                reduced_files[index] = cache.get(keys[index])
+
+        missing = [index for index, reduced_file in enumerate(reduced_files) if reduced_file is None]
+        missing_paths = [paths[index] for index in missing]
+        reduce_file = partial(_reduce_file, backend=backend, engine=engine)
+
+        if workers > 1 and len(missing_paths) > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(missing_paths))) as executor:
+                reduced_missing = list(executor.map(reduce_file, missing_paths))
         else:
-            not_special_content_type_rows.append(row)
+            reduced_missing = map(reduce_file, missing_paths)
 
+        for index, reduced_file in zip(missing, reduced_missing):
+            reduced_files[index] = reduced_file
+            if cache is not None:
+                cache.put(keys[index], reduced_file)
 
-    # Step 13: select sagsomkostninger and hovedstole. match FP and Aftale
-    # create set of (FP,aftale) from hovedstole
-    # pylint: disable-next=(consider-using-set-comprehension)
-    unique = set((row[header_row.index('ForretnPartner')], row[header_row.index('Aftale')]) for row in hovedstole)
-    # remove rows from sagsomkostninger that do not have matching (FP, aftale) i hovedstole.
-    not_special_content_type_rows = [row for row in not_special_content_type_rows if
-                        (row[header_row.index('ForretnPartner')], row[header_row.index('Aftale')]) not in unique]
+        # Step 1: Merge files, checking that they all have the same header as the first file.
+        first_header_row = None
+        result = FilterResult()
 
-    # Step 14: Combine lists
-    combined_list = not_special_content_type_rows + special_content_type_rows
+        for number, (header_row, file_result) in enumerate(reduced_files, start=1):
+            if header_row is None:
+                raise ValueError(f"Excel file number {number} is empty.")
 
-    # Step 15: Delete rows where RIM Aftale == 'IN' and RIM aftalestatus == 21
-    _sagsomkostninger = []
-    for row in combined_list:
-        if row[header_row.index('RIM Aftale')] == 'IN' and row[header_row.index('RIM aftalestatus')] == '21':
-            continue
-        _sagsomkostninger.append(row)
+            if first_header_row is None:
+                first_header_row = header_row
+            elif header_row != first_header_row:
+                raise ValueError(f"The header of Excel file number {number} does not match the header of the first file. First file: {first_header_row}, file {number}: {header_row}")
+
+            result.merge(file_result)
 
-    combined_list = _sagsomkostninger
+        stage.rows_in = result.rows_read
+        stage.rows_out = len(result.hovedstole_keys) + result.candidate_count()
 
-    # reduce to three columns: Aftale, Bilagsnummer, FP
-    return [(row[header_row.index('Aftale')], row[header_row.index('Bilagsnummer')], row[header_row.index('ForretnPartner')]) for row in
-            combined_list]
+    # Steps 13-14
+    with metrics.stage("Alteryx steps 13-14", rows_in=result.candidate_count()) as stage:
+        rows = result.combine()
+        stage.rows_out = len(rows)
+    return rows
@@ -23,9 +23,12 @@ def main():
 
     orchestrator_connection.log_trace("Getting constants.")
     error_email = orchestrator_connection.get_constant(config.ERROR_EMAIL)
+    error_reporter = error_screenshot.ErrorReporter(error_email.value, orchestrator_connection.process_name, orchestrator_connection)
 
     error_count = 0
+    tries = 0
     for _ in range(config.MAX_RETRY_COUNT):
+        tries += 1
         try:
             orchestrator_connection.log_trace("Resetting.")
             reset.reset(orchestrator_connection)
@@ -43,9 +46,15 @@ def main():
             error_count += 1
             error_type = type(error).__name__
             orchestrator_connection.log_error(f"Error caught during process. Number of errors caught: {error_count}. {error_type}: {error}\nTrace: {traceback.format_exc()}")
-            error_screenshot.send_error_screenshot(error_email.value, error, orchestrator_connection.process_name)
+            error_reporter.report(error)
 
     reset.kill_all()
+    reset.log_time_saved(orchestrator_connection, tries)
+
+    error_reporter.close()
+    if error_reporter.duplicates or error_reporter.dropped:
+        orchestrator_connection.log_info(f"Error reports: {error_reporter.sent} sent, {error_reporter.duplicates} duplicates "
+                                         f"and {error_reporter.dropped} dropped.")
 
 
 def log_exception(orchestrator_connection: OrchestratorConnection) -> callable:
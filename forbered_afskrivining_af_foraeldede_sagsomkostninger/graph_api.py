@@ -0,0 +1,336 @@
+"""Graph calls made directly by the process, where the shared components make one request at a time.
+Listing is filtered on the server, and requests per email are grouped with Graph JSON batching.
+Throttled requests (429) are retried with backoff.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+import io
+import time
+from typing import TYPE_CHECKING
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from forbered_afskrivining_af_foraeldede_sagsomkostninger import metrics
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.auxiliary import TemporaryFile
+
+if TYPE_CHECKING:
+    from OpenOrchestrator.orchestrator_connection.connection import OrchestratorConnection
+    from itk_dev_shared_components.graph.authentication import GraphAccess
+
+GRAPH_URL = "https://graph.microsoft.com/v1.0"
+
+# Graph accepts at most 20 requests in a single batch.
+BATCH_SIZE = 20
+
+# Status codes where the request is retried after waiting.
+_RETRY_STATUS = (429, 503, 504)
+
+
+@dataclass
+class Message:
+    """An email as listed by GraphClient.list_messages.
+    It has the fields of mail.Email used by the process, so it can be used in place of one.
+    """
+    user: str
+    id: str = field(repr=False)
+    received_time: str
+    sender: str
+    subject: str
+    has_attachments: bool
+
+
+@dataclass
+class Attachment:
+    """An email attachment, like mail.Attachment."""
+    email: Message = field(repr=False)
+    id: str = field(repr=False)
+    name: str
+    size: int
+
+
+class GraphClient:
+    """A shared HTTP session against Graph, retrying throttled requests."""
+    def __init__(self, graph_access: 'GraphAccess', base_url: str = GRAPH_URL, max_retries: int = 5, backoff: float = 1, pool_size: int = 4):
+        """
+        Args:
+            graph_access: The GraphAccess object used to authenticate.
+            base_url (optional): The Graph endpoint.
+            max_retries (optional): The number of times a throttled request is retried.
+            backoff (optional): The wait in seconds before the first retry, when Graph doesn't say how long to wait.
+                It doubles on each retry.
+            pool_size (optional): The maximum number of simultaneous connections.
+        """
+        self.graph_access = graph_access
+        self.base_url = base_url
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def close(self) -> None:
+        """Close the HTTP session."""
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _wait(self, attempt: int, retry_after: str | None) -> None:
+        if retry_after is not None and retry_after.isdigit():
+            time.sleep(int(retry_after))
+        else:
+            time.sleep(self.backoff * 2**attempt)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Send a request, retrying when Graph throttles it.
+
+        Args:
+            method: The HTTP method.
+            url: The absolute url, or the path below base_url.
+            kwargs: Passed on to requests.
+
+        Returns:
+            The response.
+
+        Raises:
+            HTTPError: If the request fails, or is still throttled after max_retries.
+        """
+        if not url.startswith('http'):
+            url = self.base_url + url
+
+        headers = {"Authorization": f"Bearer {self.graph_access.get_access_token()}"}
+        headers.update(kwargs.pop('headers', {}))
+        kwargs.setdefault('timeout', 30)
+
+        for attempt in range(self.max_retries + 1):
+            response = self.session.request(method, url, headers=headers, **kwargs)
+            if response.status_code not in _RETRY_STATUS or attempt == self.max_retries:
+                break
+            response.close()
+            self._wait(attempt, response.headers.get('Retry-After'))
+
+        response.raise_for_status()
+        return response
+
+    def batch(self, batch_requests: list[dict]) -> list[dict]:
+        """Send requests with JSON batching, at most BATCH_SIZE per call.
+        Throttled requests in a batch are sent again in the next batch.
+
+        Args:
+            batch_requests: Requests as {'method': ..., 'url': ...} with an optional 'body'. Urls are relative to base_url.
+
+        Returns:
+            The responses as {'status': ..., 'headers': ..., 'body': ...} in the same order as the requests.
+
+        Raises:
+            HTTPError: If any request fails, or is still throttled after max_retries.
+        """
+        responses = [None] * len(batch_requests)
+        pending = list(range(len(batch_requests)))
+
+        for attempt in range(self.max_retries + 1):
+            throttled = []
+            retry_after = None
+
+            for start in range(0, len(pending), BATCH_SIZE):
+                chunk = pending[start:start + BATCH_SIZE]
+                body = {'requests': [self._batch_request(index, batch_requests[index]) for index in chunk]}
+                for response in self.request('POST', '/$batch', json=body).json()['responses']:
+                    index = int(response['id'])
+                    if response['status'] in _RETRY_STATUS and attempt < self.max_retries:
+                        throttled.append(index)
+                        retry_after = response.get('headers', {}).get('Retry-After', retry_after)
+                    else:
+                        responses[index] = response
+
+            if not throttled:
+                break
+            pending = sorted(throttled)
+            self._wait(attempt, retry_after)
+
+        failed = [(batch_requests[index]['url'], response['status']) for index, response in enumerate(responses) if response['status'] >= 400]
+        if failed:
+            raise requests.HTTPError(f"{len(failed)} of {len(batch_requests)} batched requests failed: {failed}")
+
+        return responses
+
+    @staticmethod
+    def _batch_request(index: int, request: dict) -> dict:
+        batch_request = {'id': str(index), 'method': request['method'], 'url': request['url']}
+        if 'body' in request:
+            batch_request['body'] = request['body']
+            batch_request['headers'] = {'Content-Type': 'application/json'}
+        return batch_request
+
+    def list_messages(self, user: str, folder_id: str, sender: str, subject_prefix: str) -> list[Message]:
+        """List the emails with attachments in a folder from the sender, where the subject starts with the prefix.
+        The filter is applied by Graph, and only the fields of Message are fetched.
+
+        Args:
+            user: The user who owns the folder.
+            folder_id: The id of the folder, e.g. from mail.get_folder_id_from_path.
+            sender: The address of the sender.
+            subject_prefix: The start of the subject.
+
+        Returns:
+            The matching emails.
+        """
+        params = {
+            '$filter': f"from/emailAddress/address eq {_quote(sender)} and hasAttachments eq true and startswith(subject, {_quote(subject_prefix)})",
+            '$select': 'id,receivedDateTime,from,subject,hasAttachments',
+            '$top': '100',
+        }
+
+        messages = []
+        url = f"/users/{user}/mailFolders/{folder_id}/messages"
+        while url:
+            page = self.request('GET', url, params=params).json()
+            for message in page['value']:
+                messages.append(Message(user, message['id'], message['receivedDateTime'], message['from']['emailAddress']['address'],
+                                        message['subject'], message['hasAttachments']))
+            # The next link already contains the query.
+            url, params = page.get('@odata.nextLink'), None
+        return messages
+
+    def list_attachments(self, messages: list[Message]) -> list[list[Attachment]]:
+        """List the attachments of each email, batched.
+
+        Returns:
+            A list of attachments for each email, in the same order as the emails.
+        """
+        responses = self.batch([{'method': 'GET', 'url': f"/users/{message.user}/messages/{message.id}/attachments?$select=id,name,size"}
+                                for message in messages])
+        return [[Attachment(message, att['id'], att['name'], att['size']) for att in response['body']['value']]
+                for message, response in zip(messages, responses)]
+
+    def move_messages(self, messages: list[Message], destination_id: str) -> None:
+        """Move emails to another folder, batched. The id of each email is updated to its id in the new folder.
+
+        Args:
+            messages: The emails to move.
+            destination_id: The id of the folder, or a well known folder name like 'deleteditems'.
+        """
+        responses = self.batch([{'method': 'POST', 'url': f"/users/{message.user}/messages/{message.id}/move", 'body': {'destinationId': destination_id}}
+                                for message in messages])
+        for message, response in zip(messages, responses):
+            message.id = response['body']['id']
+
+    def delete_messages(self, messages: list[Message], permanent: bool = False) -> None:
+        """Delete emails, batched. Unless permanent they are moved to Deleted Items, like mail.delete_email."""
+        if permanent:
+            self.batch([{'method': 'DELETE', 'url': f"/users/{message.user}/messages/{message.id}"} for message in messages])
+        else:
+            self.move_messages(messages, 'deleteditems')
+
+    def download_attachment(self, attachment: Attachment, spool_to_disk: bool = False) -> tuple[io.BytesIO | str, float]:
+        """Download a single attachment.
+
+        Args:
+            attachment: The attachment to download.
+            spool_to_disk (optional): Write the attachment to a temporary file instead of keeping it in memory.
+                The file is deleted when the process exits.
+
+        Returns:
+            The attachment as a BytesIO or the path to a temporary file, and the time spent in seconds.
+        """
+        start = time.perf_counter()
+        email = attachment.email
+        url = f"/users/{email.user}/messages/{email.id}/attachments/{attachment.id}/$value"
+
+        with metrics.stage(f"Download '{attachment.name}'"), self.request('GET', url, timeout=120, stream=True) as response:
+            if spool_to_disk:
+                temporary_file = TemporaryFile()
+                with open(str(temporary_file), 'wb') as file:
+                    for chunk in response.iter_content(chunk_size=1024 * 1024):
+                        file.write(chunk)
+                data = str(temporary_file)
+            else:
+                data = io.BytesIO(response.content)
+
+        return data, time.perf_counter() - start
+
+
+def _quote(value: str) -> str:
+    """Quote a string for use in an OData filter."""
+    return "'" + value.replace("'", "''") + "'"
+
+
+@dataclass
+class Batch:
+    """The attachments of one restanceliste, which share the file date in their names, sorted by name."""
+    file_date: str
+    attachments: list[Attachment]
+
+    @property
+    def emails(self) -> list[Message]:
+        """The emails the attachments came with."""
+        return list({id(att.email): att.email for att in self.attachments}.values())
+
+    @property
+    def size(self) -> int:
+        """The total size of the attachments in bytes."""
+        return sum(att.size for att in self.attachments)
+
+    def check_count(self) -> None:
+        """Check that the number of attachments is the number embedded in their names.
+
+        Raises:
+            ValueError: When attachments are missing.
+        """
+        embedded_file_count = int(self.attachments[0].name[-7:-5])
+        if len(self.attachments) != embedded_file_count:
+            raise ValueError(f"The number of attachments with date {self.file_date} did not correspond with the number that is embedded in the filename. Embedded: {embedded_file_count}, attachment count: {len(self.attachments)}. List of attached files: {[att.name for att in self.attachments]}")
+
+
+def group_attachments(attachments: list[Attachment]) -> list[Batch]:
+    """Group the attachments by the file date in their names, so every restanceliste KMD has sent is processed.
+    The expected file name format is '20231024RPA03_23_23.XLSX'->(date, name, file count, .XLSX).
+
+    Args:
+        attachments: The attachments of all the KMD emails.
+
+    Returns:
+        A batch for each file date, oldest first. The number of attachments isn't checked, see Batch.check_count.
+    """
+    groups = {}
+    for att in sorted(attachments, key=lambda att: att.name):
+        groups.setdefault(att.name[:8], []).append(att)
+
+    return [Batch(file_date, group) for file_date, group in sorted(groups.items())]
+
+
+def download_attachments(attachments: list[Attachment], client: GraphClient, orchestrator_connection: 'OrchestratorConnection',
+                         workers: int = 4, spool_to_disk: bool = False) -> list[io.BytesIO | str]:
+    """Download attachments concurrently on a bounded thread pool sharing the client's HTTP session.
+    The time spent on each attachment and in total is logged as trace.
+
+    Args:
+        attachments: The attachments to download.
+        client: The Graph client.
+        orchestrator_connection: The connection to OpenOrchestrator.
+        workers (optional): The maximum number of simultaneous downloads.
+        spool_to_disk (optional): Write the attachments to temporary files instead of keeping them in memory.
+            The files are deleted when the process exits.
+
+    Returns:
+        The attachments in the same order as given, as BytesIO or paths to temporary files.
+    """
+    if not attachments:
+        return []
+
+    start = time.perf_counter()
+    download = partial(client.download_attachment, spool_to_disk=spool_to_disk)
+    with ThreadPoolExecutor(max_workers=min(workers, len(attachments))) as executor:
+        downloads = list(executor.map(download, attachments))
+
+    for attachment, (_, duration) in zip(attachments, downloads):
+        orchestrator_connection.log_trace(f"Downloaded '{attachment.name}' ({attachment.size} bytes) in {duration:.2f} s.")
+    orchestrator_connection.log_trace(f"Downloaded {len(attachments)} attachments in {time.perf_counter() - start:.2f} s.")
+
+    return [data for data, _ in downloads]
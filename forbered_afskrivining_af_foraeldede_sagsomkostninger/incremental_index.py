@@ -0,0 +1,120 @@
+"""A local index of the rows queued by earlier runs, so a run only queues the rows that are new since then.
+Most of the restanceliste is the same from week to week, and queuing those rows again only makes work for the robot
+that handles the queue. Rows are identified by the same reference as their queue element, see queue_insert.reference.
+
+The index is a SQLite database with the time each reference was queued (first_seen) and last seen. References are
+stored as the 32 bytes of the hash, about 80 bytes per row on disk.
+A row queued more than the retention period ago is queued again, even if it has stayed on the list, in case the robot
+that handles the queue failed or skipped it. References not seen for the retention period are forgotten.
+"""
+from contextlib import closing
+from dataclasses import dataclass
+import datetime
+import sqlite3
+from typing import Iterable
+
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.queue_insert import reference
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS seen (
+    reference BLOB PRIMARY KEY,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+def _key(row: tuple) -> bytes:
+    return bytes.fromhex(reference(row))
+
+
+@dataclass
+class Delta:
+    """The rows of a run compared with the index.
+    new_rows are the rows to queue, in their original order: the rows not seen before, and the requeued rows,
+    which were queued more than the retention period ago. disappeared is the number of rows
+    seen by the latest earlier run but not by this one.
+    """
+    new_rows: list[tuple]
+    unchanged: int
+    disappeared: int
+    requeued: int = 0
+
+    def report(self) -> str:
+        """A line for the log."""
+        return (f"Compared with earlier runs: {len(self.new_rows) - self.requeued} new, {self.requeued} queued again after the retention period, "
+                f"{self.unchanged} unchanged and {self.disappeared} disappeared rows.")
+
+
+class IncrementalIndex:
+    """The references of the rows seen by earlier runs, in a SQLite database."""
+    def __init__(self, path: str, retention: datetime.timedelta):
+        """
+        Args:
+            path: The database file. It is created if it doesn't exist.
+            retention: Rows queued this long ago are queued again, and references not seen for this long are forgotten.
+        """
+        self.path = path
+        self.retention = retention
+        with closing(self._connect()) as connection:
+            connection.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path)
+
+    @staticmethod
+    def _load_current(connection: sqlite3.Connection, references: Iterable[bytes]) -> None:
+        """Put the references of this run in a temporary table, to be joined with the index."""
+        connection.execute("CREATE TEMP TABLE current (reference BLOB PRIMARY KEY) WITHOUT ROWID")
+        connection.executemany("INSERT OR IGNORE INTO current VALUES (?)", ((ref,) for ref in references))
+
+    def compare(self, rows: list[tuple], run_time: datetime.datetime) -> Delta:
+        """Compare the rows of this run with the index. The index isn't changed.
+
+        Args:
+            rows: The rows as (aftale, bilagsnummer, fp).
+            run_time: The time of the run.
+
+        Returns:
+            The rows to queue and the number of requeued, unchanged and disappeared rows.
+        """
+        references = [_key(row) for row in rows]
+        oldest_allowed = (run_time - self.retention).isoformat(timespec='seconds')
+        with closing(self._connect()) as connection:
+            self._load_current(connection, references)
+            seen, due = set(), set()
+            for ref, first_seen in connection.execute("SELECT reference, first_seen FROM current JOIN seen USING (reference)"):
+                (due if first_seen < oldest_allowed else seen).add(ref)
+            (disappeared,) = connection.execute(
+                "SELECT count(*) FROM seen WHERE last_seen = (SELECT max(last_seen) FROM seen) "
+                "AND reference NOT IN (SELECT reference FROM current)").fetchone()
+
+        new_rows = [row for row, ref in zip(rows, references) if ref not in seen]
+        return Delta(new_rows, len(rows) - len(new_rows), disappeared, len(due))
+
+    def update(self, rows: Iterable[tuple], queued_rows: Iterable[tuple], run_time: datetime.datetime) -> int:
+        """Record the rows as seen by a run and the queued rows as queued by it, and forget the references not seen within
+        the retention period. Call it when the rows are queued, so a failed run doesn't hide its rows from the next one.
+
+        Args:
+            rows: All the rows of the run, both new and unchanged, as (aftale, bilagsnummer, fp).
+            queued_rows: The rows queued by the run.
+            run_time: The time of the run.
+
+        Returns:
+            The number of forgotten references.
+        """
+        now = run_time.isoformat(timespec='seconds')
+        oldest_allowed = (run_time - self.retention).isoformat(timespec='seconds')
+        with closing(self._connect()) as connection:
+            # Commit both changes or neither.
+            with connection:
+                self._load_current(connection, (_key(row) for row in rows))
+                connection.execute("INSERT INTO seen SELECT reference, ?, ? FROM current WHERE true "
+                                   "ON CONFLICT (reference) DO UPDATE SET last_seen = excluded.last_seen", (now, now))
+                connection.executemany("UPDATE seen SET first_seen = ? WHERE reference = ?", ((now, _key(row)) for row in queued_rows))
+                return connection.execute("DELETE FROM seen WHERE last_seen < ?", (oldest_allowed,)).rowcount
+
+    def __len__(self) -> int:
+        with closing(self._connect()) as connection:
+            return connection.execute("SELECT count(*) FROM seen").fetchone()[0]
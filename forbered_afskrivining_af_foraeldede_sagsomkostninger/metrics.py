@@ -0,0 +1,216 @@
+"""Measure the stages of the process: wall time, CPU time, peak memory, and the number of rows in and out.
+A run collects the measurements of every stage within it, and logs them as JSON when it ends.
+Stages measured outside a run are not recorded, so instrumented functions can be used on their own.
+
+CPU time and peak memory are for the whole robot process, so stages running at the same time on
+different threads share them. Peak memory is the high-water mark of the process when the stage ended.
+"""
+import cProfile
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+import ctypes
+from functools import wraps
+import io
+import json
+import pstats
+import sys
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable
+
+if sys.platform == 'win32':
+    from ctypes import wintypes
+else:
+    import resource
+
+if TYPE_CHECKING:
+    from OpenOrchestrator.orchestrator_connection.connection import OrchestratorConnection
+
+# The maximum length of a message in the OpenOrchestrator log.
+MAX_LOG_LENGTH = 8000
+
+
+@dataclass
+class StageRecord:
+    """The measurements of a single stage. rows_in and rows_out are set by the stage itself, when it has rows."""
+    name: str
+    wall_seconds: float = 0
+    cpu_seconds: float = 0
+    peak_rss_mb: float | None = None
+    rows_in: int | None = None
+    rows_out: int | None = None
+    error: str | None = None
+
+
+if sys.platform == 'win32':
+    class _ProcessMemoryCounters(ctypes.Structure):  # pylint: disable=(too-few-public-methods)
+        _fields_ = [
+            ('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+            ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+            ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+            ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t),
+        ]
+
+    def peak_rss_bytes() -> int | None:
+        """Get the peak working set of the process."""
+        kernel32 = ctypes.windll.kernel32
+        psapi = ctypes.windll.psapi
+        kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+        psapi.GetProcessMemoryInfo.argtypes = [wintypes.HANDLE, ctypes.POINTER(_ProcessMemoryCounters), wintypes.DWORD]
+
+        counters = _ProcessMemoryCounters(cb=ctypes.sizeof(_ProcessMemoryCounters))
+        if not psapi.GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+            return None
+        return counters.PeakWorkingSetSize
+else:
+    def peak_rss_bytes() -> int | None:
+        """Get the peak resident set size of the process."""
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes.
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class Run:
+    """The stages measured during one run of the process."""
+    def __init__(self, profile: bool = False):
+        """
+        Args:
+            profile (optional): Profile the run with cProfile. Only the thread that started the run is profiled.
+        """
+        self.records = []
+        self.profiler = cProfile.Profile() if profile else None
+        self._lock = threading.Lock()
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.process_time()
+
+    def add(self, record: StageRecord) -> None:
+        """Add the measurements of a stage. Safe to call from any thread."""
+        with self._lock:
+            self.records.append(record)
+
+    def summary(self) -> dict:
+        """The measurements of the run and all its stages, in the order the stages ended."""
+        peak = peak_rss_bytes()
+        with self._lock:
+            stages = [asdict(record) for record in self.records]
+        return {
+            'wall_seconds': round(time.perf_counter() - self._start_wall, 3),
+            'cpu_seconds': round(time.process_time() - self._start_cpu, 3),
+            'peak_rss_mb': None if peak is None else round(peak / 2**20, 1),
+            'stages': stages,
+        }
+
+    def log(self, orchestrator_connection: 'OrchestratorConnection') -> None:
+        """Log the summary as JSON. A summary too long for a single log message is split by stages,
+        so every message is valid JSON on its own.
+        """
+        summary = self.summary()
+        parts = []
+        stages = []
+        for stage_summary in summary['stages']:
+            candidate = json.dumps(dict(summary, stages=stages + [stage_summary]), separators=(',', ':'))
+            if stages and len(candidate) > MAX_LOG_LENGTH - 50:
+                parts.append(stages)
+                stages = []
+            stages.append(stage_summary)
+        parts.append(stages)
+
+        for number, stages in enumerate(parts, start=1):
+            part = json.dumps(dict(summary, stages=stages), separators=(',', ':'))
+            prefix = "Run metrics: " if len(parts) == 1 else f"Run metrics ({number}/{len(parts)}): "
+            orchestrator_connection.log_info(prefix + part)
+
+    def log_profile(self, orchestrator_connection: 'OrchestratorConnection', path: str | None = None, lines: int = 30) -> None:
+        """Log the functions with the highest cumulative time as trace, and save the full profile to a file.
+
+        Args:
+            orchestrator_connection: The connection to OpenOrchestrator.
+            path (optional): The file to save the profile in, for use with pstats or snakeviz.
+            lines (optional): The number of functions to log.
+        """
+        if self.profiler is None:
+            return
+
+        if path:
+            self.profiler.dump_stats(path)
+            orchestrator_connection.log_trace(f"Profile saved to '{path}'.")
+
+        output = io.StringIO()
+        pstats.Stats(self.profiler, stream=output).sort_stats('cumulative').print_stats(lines)
+        # The functions are sorted with the highest cumulative time first, so the start of the output is kept.
+        orchestrator_connection.log_trace(output.getvalue()[:MAX_LOG_LENGTH])
+
+
+# The runs in progress. Stages are recorded in the latest.
+_runs: list[Run] = []
+
+
+@contextmanager
+def run(orchestrator_connection: 'OrchestratorConnection', profile: bool = False, profile_path: str | None = None):
+    """Measure a run of the process. The summary is logged when the run ends, also when it fails.
+
+    Args:
+        orchestrator_connection: The connection to OpenOrchestrator.
+        profile (optional): Profile the run with cProfile and log the result.
+        profile_path (optional): The file to save the profile in.
+    """
+    current = Run(profile)
+    _runs.append(current)
+    if current.profiler:
+        current.profiler.enable()
+    try:
+        yield current
+    finally:
+        if current.profiler:
+            current.profiler.disable()
+        _runs.remove(current)
+        current.log(orchestrator_connection)
+        current.log_profile(orchestrator_connection, profile_path)
+
+
+@contextmanager
+def stage(name: str, rows_in: int | None = None):
+    """Measure a block as a stage of the current run.
+
+    Args:
+        name: The name of the stage in the summary.
+        rows_in (optional): The number of rows going into the stage.
+
+    Yields:
+        The record of the stage, where the block can set rows_in and rows_out.
+    """
+    record = StageRecord(name, rows_in=rows_in)
+    start_wall = time.perf_counter()
+    start_cpu = time.process_time()
+    try:
+        yield record
+    except BaseException as error:
+        record.error = f"{type(error).__name__}: {error}"[:500]
+        raise
+    finally:
+        record.wall_seconds = round(time.perf_counter() - start_wall, 3)
+        record.cpu_seconds = round(time.process_time() - start_cpu, 3)
+        peak = peak_rss_bytes()
+        record.peak_rss_mb = None if peak is None else round(peak / 2**20, 1)
+        if _runs:
+            _runs[-1].add(record)
+
+
+def measure(name: str, rows_out: Callable[[Any], int] | None = len):
+    """Decorate a function to measure each call as a stage of the current run.
+
+    Args:
+        name: The name of the stage in the summary.
+        rows_out (optional): Get the number of rows from the result of the function. None to not count rows.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name) as record:
+                result = func(*args, **kwargs)
+                if rows_out is not None:
+                    record.rows_out = rows_out(result)
+                return result
+        return wrapper
+    return decorator
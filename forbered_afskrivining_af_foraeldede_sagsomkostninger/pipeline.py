@@ -0,0 +1,156 @@
+"""Run independent stages of the process at the same time, and time each stage.
+A background stage runs on a thread of its own, so everything it calls stays on that thread.
+This is required by SAP GUI scripting, where the COM objects can't be shared between threads.
+"""
+from contextlib import contextmanager
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator
+
+from forbered_afskrivining_af_foraeldede_sagsomkostninger import metrics
+
+if TYPE_CHECKING:
+    from OpenOrchestrator.orchestrator_connection.connection import OrchestratorConnection
+
+
+class StageError(Exception):
+    """A stage failed or timed out. The error of the stage is the cause."""
+    def __init__(self, failures: dict[str, BaseException]):
+        self.failures = failures
+        super().__init__("; ".join(f"Stage '{name}' failed. {type(error).__name__}: {error}" for name, error in failures.items()))
+
+
+class Stage:  # pylint: disable=(too-many-instance-attributes)
+    """A named function run once, keeping its result or error and its wall-clock time.
+    It is measured as a stage of the current run, see metrics.stage.
+    """
+    def __init__(self, name: str, func: Callable[[], Any], initializer: Callable[[], None] | None = None,
+                 finalizer: Callable[[], None] | None = None):
+        """
+        Args:
+            name: The name used in logs and errors.
+            func: The function to run.
+            initializer (optional): Called before func on the same thread, e.g. to initialize COM.
+            finalizer (optional): Called after func on the same thread, also when func fails.
+        """
+        self.name = name
+        self.func = func
+        self.initializer = initializer
+        self.finalizer = finalizer
+        self.result = None
+        self.error = None
+        self.duration = None
+        self._thread = None
+        self._start = None
+
+    def run(self) -> None:
+        """Run the stage on the current thread. Errors are kept instead of raised."""
+        self._start = time.perf_counter()
+        try:
+            with metrics.stage(self.name) as record:
+                if self.initializer:
+                    self.initializer()
+                try:
+                    self.result = self.func()
+                finally:
+                    if self.finalizer:
+                        self.finalizer()
+                if hasattr(self.result, '__len__'):
+                    record.rows_out = len(self.result)
+        except Exception as error:  # pylint: disable=(broad-exception-caught)
+            self.error = error
+        self.duration = time.perf_counter() - self._start
+
+    def start(self) -> None:
+        """Run the stage on a new thread."""
+        self._thread = threading.Thread(target=self.run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def join(self, timeout: float | None = None) -> bool:
+        """Wait for a started stage to finish. A timeout is kept as the error of the stage.
+        The thread can't be stopped, so it keeps running in the background.
+
+        Returns:
+            True if the stage finished within the timeout.
+        """
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            self.error = TimeoutError(f"Not done after {timeout} s.")
+            self.duration = time.perf_counter() - self._start
+            return False
+        return True
+
+
+def log_stage(orchestrator_connection: 'OrchestratorConnection', stage: Stage) -> None:
+    """Log the wall-clock time of a finished or timed out stage as trace, or its error.
+    Each stage is logged on its own, so the error of one stage isn't hidden by another.
+    """
+    if stage.error is None:
+        orchestrator_connection.log_trace(f"Stage '{stage.name}' took {stage.duration:.2f} s.")
+    else:
+        orchestrator_connection.log_error(f"Stage '{stage.name}' failed after {stage.duration:.2f} s. {type(stage.error).__name__}: {stage.error}")
+
+
+def wait(orchestrator_connection: 'OrchestratorConnection', stage: Stage, timeout: float | None = None) -> Any:
+    """Wait for a started stage and return its result. The time or error of the stage is logged with log_stage.
+
+    Args:
+        orchestrator_connection: The connection to OpenOrchestrator.
+        stage: A started stage.
+        timeout (optional): The maximum time in seconds to wait.
+
+    Returns:
+        The result of the stage.
+
+    Raises:
+        StageError: If the stage failed or timed out.
+    """
+    stage.join(timeout)
+    log_stage(orchestrator_connection, stage)
+    if stage.error is not None:
+        raise StageError({stage.name: stage.error}) from stage.error
+    return stage.result
+
+
+def prefetch(orchestrator_connection: 'OrchestratorConnection', stages: Iterable[Stage]) -> Iterator[Any]:
+    """Run stages one at a time on their own threads, one ahead of the caller.
+    The result of each stage is yielded when it is done, and the next stage is started before that,
+    so it runs while the caller works on the result. At most two results exist at a time.
+
+    Args:
+        orchestrator_connection: The connection to OpenOrchestrator.
+        stages: The stages, e.g. a generator, which is only advanced when the next stage is started.
+
+    Yields:
+        The result of each stage, in order.
+
+    Raises:
+        StageError: If a stage failed. The stages after it are not started.
+    """
+    stages = iter(stages)
+    current = next(stages, None)
+    if current is not None:
+        current.start()
+
+    while current is not None:
+        result = wait(orchestrator_connection, current)
+        current = next(stages, None)
+        if current is not None:
+            current.start()
+        yield result
+
+
+@contextmanager
+def timed(name: str, orchestrator_connection: 'OrchestratorConnection', rows_in: int | None = None):
+    """Log the wall-clock time of a block as trace, also when it fails.
+    The block is measured as a stage of the current run, see metrics.stage.
+
+    Yields:
+        The record of the stage, where the block can set rows_in and rows_out.
+    """
+    start = time.perf_counter()
+    try:
+        with metrics.stage(name, rows_in) as record:
+            yield record
+    finally:
+        orchestrator_connection.log_trace(f"Stage '{name}' took {time.perf_counter() - start:.2f} s.")
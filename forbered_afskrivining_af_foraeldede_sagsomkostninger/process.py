@@ -2,75 +2,205 @@
 import os
 import json
 import io
+import datetime
+from functools import partial
+import time
 
 from OpenOrchestrator.orchestrator_connection.connection import OrchestratorConnection
-from itk_dev_shared_components.sap import multi_session
 from itk_dev_shared_components.graph import authentication, mail
-from forbered_afskrivining_af_foraeldede_sagsomkostninger.auxiliary import TemporaryFile, get_fp_and_aftale_from_file
-from forbered_afskrivining_af_foraeldede_sagsomkostninger.excel_process import read_sheets
-from forbered_afskrivining_af_foraeldede_sagsomkostninger import config
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.auxiliary import TemporaryFile, read_fp_and_aftale_file, wait_for_file
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.incremental_index import IncrementalIndex
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.result_cache import ResultCache
+from forbered_afskrivining_af_foraeldede_sagsomkostninger import config, graph_api, metrics, pipeline, queue_insert, reset
 from forbered_afskrivining_af_foraeldede_sagsomkostninger.exceptions import BusinessError
 
 
 def process(orchestrator_connection: OrchestratorConnection) -> None:
     """
     0. Establish Graph access
-    1. GRAPH get emails
+    1. GRAPH get emails, and group the attachments in batches by their file date
     2. Treat excel files according to alteryx rules
-    3. Get rykkerspærre from SAP
-    4. Filter excel output
-    5. Insert results into job queue
-    6. Delete emails
-    """
-    gc = orchestrator_connection.get_credential(config.GRAPH_CREDENTIALS)
-    graph_access = authentication.authorize_by_username_password(username=gc.username, **json.loads(gc.password))
-
-    # Step 1. GRAPH get emails
-    attachment_bytes_list, kmd_emails = get_emails(orchestrator_connection, graph_access)
+    3. Log in to SAP and get rykkerspærre, on its own thread while step 2 runs for the first batch
+    4. Filter excel output, and skip the rows queued by earlier runs
+    5. Insert results into job queue, tagged with the file date of the batch
+    6. Delete emails of the batch
 
-    # Step 2. Treat excel files according to alteryx rules
-    sagsomkostninger = read_sheets(attachment_bytes_list)
+    Steps 2, 4, 5 and 6 run for each batch, oldest first, while the attachments of the next batch are downloaded.
+    The rykkerspærrer from SAP are only exported once, and shared by all batches.
 
-    for att in attachment_bytes_list:
-        att.close()
+    openpyxl and the SAP components are imported, and SAP is opened, by the steps that use them,
+    so a run that stops early, e.g. because there are no emails, doesn't spend time on them.
+    """
+    # The time, memory and rows of each step are logged as JSON when the run ends.
+    with metrics.run(orchestrator_connection, profile=config.PROFILE, profile_path=config.PROFILE_FILE):
+        gc = orchestrator_connection.get_credential(config.GRAPH_CREDENTIALS)
+        graph_access = authentication.authorize_by_username_password(username=gc.username, **json.loads(gc.password))
+
+        with graph_api.GraphClient(graph_access, pool_size=config.ATTACHMENT_DOWNLOAD_WORKERS) as graph_client:
+            # Step 1. GRAPH get emails
+            with pipeline.timed("Get emails", orchestrator_connection) as stage:
+                batches = get_emails(orchestrator_connection, graph_client)
+                stage.rows_out = sum(len(batch.attachments) for batch in batches)
+
+            # Step 3. Get rykkerspærre from SAP as {fp: frozenset of aftaler}, while the first batch is downloaded and read.
+            import pythoncom  # pylint: disable=(import-outside-toplevel)
+            sap_stage = pipeline.Stage("Get rykkerspærre from SAP", partial(get_sap_file_content, orchestrator_connection),
+                                       initializer=pythoncom.CoInitialize, finalizer=pythoncom.CoUninitialize)
+            sap_stage.start()
+            sap_deadline = time.perf_counter() + config.SAP_EXPORT_TIMEOUT
+            fp_aftale = None
+            sap_waited = False
+
+            # The attachments of the next batch are downloaded while this one is processed.
+            downloads = (pipeline.Stage(f"Download {batch.file_date}", partial(download_batch, orchestrator_connection, graph_client, batch))
+                         for batch in batches)
+            try:
+                for batch, attachment_bytes_list in zip(batches, pipeline.prefetch(orchestrator_connection, downloads)):
+                    start = time.perf_counter()
+                    with pipeline.timed(f"Batch {batch.file_date}", orchestrator_connection) as stage:
+                        # Step 2. Treat excel files according to alteryx rules
+                        sagsomkostninger = read_batch(orchestrator_connection, attachment_bytes_list)
+                        stage.rows_in = len(sagsomkostninger)
+
+                        if not sap_waited:
+                            sap_waited = True
+                            fp_aftale = pipeline.wait(orchestrator_connection, sap_stage, max(sap_deadline - time.perf_counter(), 0))
+
+                        # Steps 4-6
+                        stage.rows_out = queue_batch(orchestrator_connection, graph_client, batch, sagsomkostninger, fp_aftale)
+
+                    seconds = time.perf_counter() - start
+                    orchestrator_connection.log_info(
+                        f"Batch {batch.file_date}: {len(batch.attachments)} files ({batch.size / 2**20:.1f} MB) with {len(sagsomkostninger)} "
+                        f"sagsomkostninger processed in {seconds:.1f} s ({batch.size / 2**20 / seconds:.1f} MB/s). "
+                        f"Inserted {stage.rows_out} job queue elements.")
+            finally:
+                # An error before SAP was needed doesn't wait for the whole export. A still running export is stopped by
+                # closing SAP, so it doesn't use SAP at the same time as the next try. Its own error is logged separately
+                # from the error of the batch.
+                if not sap_waited:
+                    if not sap_stage.join(min(config.SAP_STOP_TIMEOUT, max(sap_deadline - time.perf_counter(), 0))):
+                        reset.kill_all()
+                        sap_stage.join(config.SAP_STOP_TIMEOUT)
+                    pipeline.log_stage(orchestrator_connection, sap_stage)
+
+
+def read_batch(orchestrator_connection: OrchestratorConnection, attachment_bytes_list: list[io.BytesIO | str]) -> list[tuple[str, str, str]]:
+    """Step 2 for a batch: read the attachments and apply the Alteryx rules. The attachments kept in memory are closed.
 
-    # Step 3. Get rykkerspærre from SAP
-    file_content = get_sap_file_content()
-    # get rykkerspærre
-    fp_aftale = get_fp_and_aftale_from_file(file_content)
+    Returns:
+        The sagsomkostninger as (Aftale, Bilagsnummer, FP).
+    """
+    from forbered_afskrivining_af_foraeldede_sagsomkostninger.excel_process import read_sheets  # pylint: disable=(import-outside-toplevel)
+    cache = None
+    if config.EXCEL_CACHE_DIR:
+        cache = ResultCache(config.EXCEL_CACHE_DIR, config.EXCEL_CACHE_MAX_BYTES, datetime.timedelta(days=config.EXCEL_CACHE_MAX_AGE_DAYS))
+
+    try:
+        with pipeline.timed("Read Excel files", orchestrator_connection) as stage:
+            sagsomkostninger = read_sheets(attachment_bytes_list, workers=config.EXCEL_WORKERS, backend=config.EXCEL_BACKEND,
+                                           cache=cache, engine=config.EXCEL_ENGINE)
+            stage.rows_out = len(sagsomkostninger)
+            return sagsomkostninger
+    finally:
+        for att in attachment_bytes_list:
+            if isinstance(att, io.BytesIO):
+                att.close()
+
+
+def queue_batch(orchestrator_connection: OrchestratorConnection, graph_client: graph_api.GraphClient, batch: graph_api.Batch,
+                sagsomkostninger: list[tuple[str, str, str]], fp_aftale: dict[str, frozenset[str]]) -> int:
+    """Steps 4-6 for a batch: filter out the rykkerspærrer, queue the new rows tagged with the file date and delete the emails.
 
+    Returns:
+        The number of inserted queue elements.
+    """
     # Step 4. Filter excel output
     # skip rows from sagsomkostninger if FP and Aftale is in rykkerspærre dict.
-    reduced_sagsomkostninger = []
-    for row in sagsomkostninger:
-        restance_aftale = row[0]
-        restance_fp = row[2]
-        if restance_fp in fp_aftale:
-            if restance_aftale not in fp_aftale[restance_fp]:
-                reduced_sagsomkostninger.append(row)  # row not in rykkerspærrer.
+    with pipeline.timed("Filter rykkerspærrer", orchestrator_connection, rows_in=len(sagsomkostninger)) as stage:
+        reduced_sagsomkostninger = []
+        for row in sagsomkostninger:
+            restance_aftale = row[0]
+            restance_fp = row[2]
+            if restance_fp in fp_aftale:
+                if restance_aftale not in fp_aftale[restance_fp]:
+                    reduced_sagsomkostninger.append(row)  # row not in rykkerspærrer.
+        stage.rows_out = len(reduced_sagsomkostninger)
+
+    # Only the rows not queued by earlier runs, or earlier batches, are queued, unless a full run is forced.
+    index, rows_to_queue = skip_queued_rows(orchestrator_connection, reduced_sagsomkostninger)
 
     # Step 5. Insert results into job queue.
-    if len(reduced_sagsomkostninger) != 0:
-        reference_list = [None]*len(reduced_sagsomkostninger)
-        reduced_sagsomkostninger = [json.dumps(dict(zip(['aftale', 'bilagsnummer', 'fp'], row))) for row in reduced_sagsomkostninger]
-        orchestrator_connection.bulk_create_queue_elements(queue_name=config.QUEUE_NAME, data=reduced_sagsomkostninger, references=reference_list)
-        orchestrator_connection.log_info(f"Inserted {len(reduced_sagsomkostninger)} job queue elements.")
-    else:
-        orchestrator_connection.log_info("No relevant cases found. No new queue elements created.")
+    with pipeline.timed("Insert queue elements", orchestrator_connection, rows_in=len(rows_to_queue)) as stage:
+        since = datetime.datetime.now() - datetime.timedelta(hours=config.QUEUE_DUPLICATE_WINDOW_HOURS)
+        inserted = queue_insert.insert_queue_elements(orchestrator_connection, config.QUEUE_NAME, rows_to_queue, since,
+                                                      chunk_size=config.QUEUE_CHUNK_SIZE, checkpoint_path=config.QUEUE_CHECKPOINT_FILE,
+                                                      tags={config.FILE_DATE_TAG: batch.file_date})
+        stage.rows_out = inserted
+        if inserted == 0:
+            orchestrator_connection.log_info(f"No relevant cases found with date {batch.file_date}. No new queue elements created.")
+
+    # The index is only updated when the rows are queued, so the rows of a failed run are queued by the next one.
+    if index is not None:
+        forgotten = index.update(reduced_sagsomkostninger, rows_to_queue, datetime.datetime.now())
+        orchestrator_connection.log_trace(f"Forgot {forgotten} rows not seen for {config.INCREMENTAL_INDEX_RETENTION_DAYS} days.")
 
     # Step 6. Delete emails.
-    for email in kmd_emails:
-        mail.delete_email(email, graph_access, permanent=False)
+    emails = batch.emails
+    with pipeline.timed("Delete emails", orchestrator_connection, rows_in=len(emails)):
+        graph_client.delete_messages(emails, permanent=False)
+    for email in emails:
         orchestrator_connection.log_trace(f"Deleted email '{email.subject}' (received {email.received_time}).")
 
+    return inserted
 
-def get_sap_file_content() -> str:
-    """Download rykkerspærre from SAP as a file and return content as a string.
-    The file is automatically deleted.
+
+def skip_queued_rows(orchestrator_connection: OrchestratorConnection, rows: list[tuple]) -> tuple[IncrementalIndex | None, list[tuple]]:
+    """Compare the rows with the ones seen by earlier runs, log the number of new, requeued, unchanged and disappeared rows,
+    and skip the rows queued within the retention period, unless it is a full run.
 
     Returns:
-            Rykkerspærre as a string.
+        The index, to be updated when the rows are queued, or None if config.INCREMENTAL_INDEX_FILE is None. And the rows to queue.
+    """
+    if not config.INCREMENTAL_INDEX_FILE:
+        return None, rows
+
+    with pipeline.timed("Compare with earlier runs", orchestrator_connection, rows_in=len(rows)) as stage:
+        index = IncrementalIndex(config.INCREMENTAL_INDEX_FILE, datetime.timedelta(days=config.INCREMENTAL_INDEX_RETENTION_DAYS))
+        delta = index.compare(rows, datetime.datetime.now())
+        orchestrator_connection.log_info(delta.report())
+        if force_full_run(orchestrator_connection):
+            orchestrator_connection.log_info(f"Full run. Queuing all {len(rows)} rows.")
+        else:
+            rows = delta.new_rows
+        stage.rows_out = len(rows)
+
+    return index, rows
+
+
+def force_full_run(orchestrator_connection: OrchestratorConnection) -> bool:
+    """Whether every row is queued, also the ones queued by earlier runs.
+    A full run is forced by config.FORCE_FULL_RUN, or by the process argument config.FULL_RUN_ARGUMENT.
     """
+    arguments = (orchestrator_connection.process_arguments or "").strip().lower()
+    return config.FORCE_FULL_RUN or arguments == config.FULL_RUN_ARGUMENT
+
+
+def get_sap_file_content(orchestrator_connection: OrchestratorConnection) -> dict[str, frozenset[str]]:
+    """Download rykkerspærre from SAP as a file and return its content as a dictionary.
+    SAP is opened first, unless a healthy session from an earlier try is open.
+    The file is read in chunks when SAP is done writing it, and is automatically deleted.
+    All SAP calls are made on the calling thread, which must have initialized COM.
+
+    Returns:
+            Rykkerspærre as a dictionary of ForretnPartner and aftaler.
+
+    Raises:
+        TimeoutError: If SAP isn't done writing the file within config.SAP_FILE_TIMEOUT.
+    """
+    from itk_dev_shared_components.sap import multi_session  # pylint: disable=(import-outside-toplevel)
+
+    reset.open_all(orchestrator_connection)
     session = multi_session.get_all_sap_sessions()[0]
 
     session.startTransaction("fplka")
@@ -99,45 +229,66 @@ def get_sap_file_content() -> str:
     # save data to file
     session.findById('/app/con[0]/ses[0]/wnd[1]/tbar[0]/btn[11]').press()
 
-    with open(str(tempfile), encoding='cp1252') as file:  # blocking until SAP is done writing
-        data = file.read()
-    return data
+    wait_for_file(str(tempfile), config.SAP_FILE_TIMEOUT, stable_seconds=config.SAP_FILE_STABLE_SECONDS)
+    return read_fp_and_aftale_file(str(tempfile))
 
 
-def get_emails(orchestrator_connection: OrchestratorConnection, graph_access: authentication.GraphAccess) -> tuple[list[io.BytesIO],list[mail.Email]]:
-    """Search for emails from KMD and download attachments.
-    Filter the emails to the ones with Excel restancelister attached.
+def get_emails(orchestrator_connection: OrchestratorConnection, graph_client: graph_api.GraphClient) -> list[graph_api.Batch]:
+    """Search for emails from KMD and group their attachments in batches by file date.
+    Filter the emails to the ones with Excel restancelister attached. The filter is applied by Graph.
+    Every complete batch is returned, so a restanceliste isn't lost when more than one arrives before the robot runs.
+    An older batch with missing attachments is logged as an error and skipped, and its emails are left in the folder,
+    so it doesn't stop the newer lists from being processed.
     The expected file name format is '20231024RPA03_23_23.XLSX'->(date, name, file count, .XLSX).
 
     Returns:
-        A tuple; lists of downloaded attachments and emails.
+        The complete batches, oldest first.
 
     Raises:
         BusinessError: When no emails were found.
-        ValueError: When attachments are missing.
+        ValueError: When attachments are missing from the newest batch.
     """
     user = 'itk-rpa@mkb.aarhus.dk'
     folder_path = "Indbakke/Afskrivning af forældede sagsomkostninger"
-    mails = mail.get_emails_from_folder(user, folder_path, graph_access)
+    sender = 'kan-ikke-besvares@kmd.dk'
+    subject_prefix = 'Liste til forældede sagsomkostninger'
+
+    folder_id = mail.get_folder_id_from_path(user, folder_path, graph_client.graph_access)
+    mails = graph_client.list_messages(user, folder_id, sender, subject_prefix)
 
     kmd_mails = [email for email in mails if
-                 email.has_attachments and email.subject.startswith('Liste til forældede sagsomkostninger') and email.sender == 'kan-ikke-besvares@kmd.dk']
+                 email.has_attachments and email.subject.startswith(subject_prefix) and email.sender == sender]
 
     if not kmd_mails:
         raise BusinessError("No matching emails were found.")
 
-    attachments = [mail.list_email_attachments(message, graph_access)[0] for message in kmd_mails]
+    attachments = [message_attachments[0] for message_attachments in graph_client.list_attachments(kmd_mails)]
+    batches = graph_api.group_attachments(attachments)
 
-    latest_file_date = sorted([att.name for att in attachments])[-1][:8]
-    latest_attachments = [att.name for att in attachments if att.name.startswith(latest_file_date)]
+    # The newest batch must be complete, like when only the latest list was processed.
+    batches[-1].check_count()
+    complete_batches = []
+    for batch in batches:
+        try:
+            batch.check_count()
+        except ValueError as error:
+            orchestrator_connection.log_error(f"Skipping the restanceliste with date {batch.file_date}. Its emails are left in '{folder_path}'. {error}")
+            continue
+        complete_batches.append(batch)
 
-    embedded_file_count = int(latest_attachments[0][-7:-5])
-    if len(latest_attachments) != embedded_file_count:
-        raise ValueError(f"The number of attachments did not correspond with the number that is embedded in the filename. Embedded: {embedded_file_count}, attachment count: {len(latest_attachments)}. List of attached files: {latest_attachments}")
+    orchestrator_connection.log_info(f"Found {len(kmd_mails)} in '{folder_path}' to {user}, with the dates {[batch.file_date for batch in complete_batches]}.")
 
-    orchestrator_connection.log_trace(f"Downloading {len(latest_attachments)} excel attachments with date {latest_file_date}.")
-    attachment_bytes_list = [mail.get_attachment_data(attachment, graph_access) for attachment in attachments]
+    return complete_batches
 
-    orchestrator_connection.log_info(f"Found {len(kmd_mails)} in '{folder_path}' to {user}.")
 
-    return attachment_bytes_list, kmd_mails
+def download_batch(orchestrator_connection: OrchestratorConnection, graph_client: graph_api.GraphClient,
+                   batch: graph_api.Batch) -> list[io.BytesIO | str]:
+    """Download the attachments of a batch.
+
+    Returns:
+        The attachments as BytesIO or paths to temporary files, sorted by name.
+    """
+    orchestrator_connection.log_trace(f"Downloading {len(batch.attachments)} excel attachments with date {batch.file_date}.")
+    return graph_api.download_attachments(batch.attachments, graph_client, orchestrator_connection,
+                                          workers=config.ATTACHMENT_DOWNLOAD_WORKERS,
+                                          spool_to_disk=config.ATTACHMENT_SPOOL_TO_DISK)
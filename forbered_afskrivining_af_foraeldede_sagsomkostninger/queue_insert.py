@@ -0,0 +1,117 @@
+"""Insert the sagsomkostninger in the job queue in chunks, so a retry after a failure doesn't create duplicates.
+Each element gets a reference made from its aftale, bilagsnummer and ForretnPartner. References already in the queue,
+or written to the local checkpoint file by an earlier attempt, are skipped.
+"""
+import datetime
+import hashlib
+import json
+import os
+from typing import TYPE_CHECKING, Iterable
+
+if TYPE_CHECKING:
+    from OpenOrchestrator.orchestrator_connection.connection import OrchestratorConnection
+
+FIELDS = ('aftale', 'bilagsnummer', 'fp')
+
+
+def reference(row: tuple) -> str:
+    """Create the reference of a queue element from (aftale, bilagsnummer, fp).
+    The same row always gets the same reference.
+    """
+    return hashlib.sha256("|".join(str(value) for value in row).encode()).hexdigest()
+
+
+def existing_references(orchestrator_connection: 'OrchestratorConnection', queue_name: str, since: datetime.datetime,
+                        page_size: int = 1000) -> set[str]:
+    """Get the references of the queue elements created since a point in time.
+
+    Args:
+        orchestrator_connection: The connection to OpenOrchestrator.
+        queue_name: The name of the queue.
+        since: Elements created before this are ignored.
+        page_size (optional): The number of elements fetched per call.
+
+    Returns:
+        The references.
+    """
+    references = set()
+    offset = 0
+    while True:
+        elements = orchestrator_connection.get_queue_elements(queue_name, offset=offset, limit=page_size, from_date=since)
+        references.update(element.reference for element in elements)
+        if len(elements) < page_size:
+            return references
+        offset += page_size
+
+
+def _read_checkpoint(path: str, since: datetime.datetime) -> set[str]:
+    """Read the references of a checkpoint file. A checkpoint last written before 'since' is deleted and ignored."""
+    try:
+        if datetime.datetime.fromtimestamp(os.path.getmtime(path)) < since:
+            os.remove(path)
+            return set()
+        with open(path, encoding='utf-8') as file:
+            return {line.strip() for line in file if line.strip()}
+    except FileNotFoundError:
+        return set()
+
+
+def insert_queue_elements(orchestrator_connection: 'OrchestratorConnection', queue_name: str, rows: Iterable[tuple],
+                          since: datetime.datetime, *, chunk_size: int = 1000, checkpoint_path: str | None = None,
+                          tags: dict | None = None) -> int:
+    """Insert rows as queue elements in chunks, skipping the ones already inserted since a point in time.
+    The data of each element is a JSON object with the keys of FIELDS, and the tags.
+
+    Args:
+        orchestrator_connection: The connection to OpenOrchestrator.
+        queue_name: The name of the queue.
+        rows: The rows as (aftale, bilagsnummer, fp).
+        since: Elements in the queue created before this are not considered duplicates.
+        chunk_size (optional): The number of elements per insert.
+        checkpoint_path (optional): A file where the references of each inserted chunk are written.
+            It is deleted when all rows are inserted. None disables the checkpoint.
+        tags (optional): Added to the data of every element, e.g. the file date of the restanceliste.
+            The tags are not part of the reference, so a row is only inserted once, whatever its tags.
+
+    Returns:
+        The number of inserted elements.
+    """
+    done = existing_references(orchestrator_connection, queue_name, since)
+    if checkpoint_path:
+        done |= _read_checkpoint(checkpoint_path, since)
+
+    inserted = 0
+    skipped = 0
+    references = []
+    data = []
+
+    def insert_chunk():
+        orchestrator_connection.bulk_create_queue_elements(queue_name=queue_name, references=tuple(references), data=tuple(data))
+        if checkpoint_path:
+            with open(checkpoint_path, 'a', encoding='utf-8') as file:
+                file.writelines(ref + "\n" for ref in references)
+        references.clear()
+        data.clear()
+
+    for row in rows:
+        ref = reference(row)
+        if ref in done:
+            skipped += 1
+            continue
+        done.add(ref)
+        references.append(ref)
+        data.append(json.dumps(dict(zip(FIELDS, row), **(tags or {}))))
+        if len(references) == chunk_size:
+            inserted += len(references)
+            insert_chunk()
+
+    if references:
+        inserted += len(references)
+        insert_chunk()
+
+    if skipped:
+        orchestrator_connection.log_info(f"Skipped {skipped} job queue elements that were already inserted.")
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    return inserted
@@ -1,20 +1,91 @@
 """These functions handle the setup, cleanup, and maintenance of an automation process.
 They initiate required applications and resources before execution, ensuring a clean environment.
+
+SAP is only opened when the process reaches the step that uses it, so a run without emails never logs in.
+A healthy SAP session is kept between the tries of a run, instead of being killed and logged in again.
+SAP is only checked or closed after this run has opened it, so until then the SAP components aren't imported.
 """
-from OpenOrchestrator.orchestrator_connection.connection import OrchestratorConnection
-from itk_dev_shared_components.sap import sap_login
-from forbered_afskrivining_af_foraeldede_sagsomkostninger.config import SAP_CREDENTIALS
+import statistics
+import threading
+import time
+from typing import TYPE_CHECKING
+
+from forbered_afskrivining_af_foraeldede_sagsomkostninger import config, metrics
+
+if TYPE_CHECKING:
+    from OpenOrchestrator.orchestrator_connection.connection import OrchestratorConnection
+
+# The duration of each SAP login in this run.
+_login_seconds: list[float] = []
+
+# Set by open_all when this run has opened SAP, and cleared when it is closed.
+# An event, since SAP is opened on the thread of its stage and closed on the main thread.
+_sap_opened = threading.Event()
+
+
+def reset(orchestrator_connection: 'OrchestratorConnection') -> None:
+    """Clean up before a try of the process. A healthy SAP session from an earlier try is kept, anything else is closed.
+    SAP is opened by the process when it is needed, see open_all. Until then there is nothing to clean up.
+    """
+    if not _sap_opened.is_set():
+        return
+
+    if sap_is_healthy():
+        orchestrator_connection.log_trace("Keeping the SAP session of the last try.")
+    else:
+        kill_all()
 
-def reset(orchestrator_connection:OrchestratorConnection) -> None:
-    """Clean up, close/kill all programs and start them again. """
-    kill_all()
-    open_all(orchestrator_connection)
 
 def kill_all() -> None:
-    """Forcefully close all applications used by the robot."""
+    """Forcefully close all applications opened by the robot in this run."""
+    if not _sap_opened.is_set():
+        return
+
+    from itk_dev_shared_components.sap import sap_login  # pylint: disable=(import-outside-toplevel)
     sap_login.kill_sap()
+    _sap_opened.clear()
+
+
+def open_all(orchestrator_connection: 'OrchestratorConnection') -> None:
+    """Open all programs used by the robot, unless this run has already opened them and they are healthy.
+    A session that this run didn't open, e.g. one left by another process or user, is never reused.
+    Must be called on the thread that uses SAP, after COM is initialized.
+    """
+    if _sap_opened.is_set() and sap_is_healthy():
+        orchestrator_connection.log_trace("Reusing the open SAP session.")
+        return
+
+    from itk_dev_shared_components.sap import sap_login  # pylint: disable=(import-outside-toplevel)
+
+    start = time.perf_counter()
+    with metrics.stage("SAP login"):
+        # SAP may be left open by another run or user, so it is closed regardless of _sap_opened.
+        sap_login.kill_sap()
+        _sap_opened.set()
+        credentials = orchestrator_connection.get_credential(config.SAP_CREDENTIALS)
+        sap_login.login_using_cli(credentials.username, credentials.password)
+    _login_seconds.append(time.perf_counter() - start)
+    orchestrator_connection.log_trace(f"Logged in to SAP in {_login_seconds[-1]:.1f} s.")
+
+
+def sap_is_healthy() -> bool:
+    """Whether SAP is open with a logged in session, which isn't busy or showing a popup."""
+    from itk_dev_shared_components.sap import multi_session  # pylint: disable=(import-outside-toplevel)
+    try:
+        sessions = multi_session.get_all_sap_sessions()
+        if not sessions:
+            return False
+        session = sessions[0]
+        return bool(session.Info.User) and not session.Busy and session.ActiveWindow.Name == 'wnd[0]'
+    except Exception:  # pylint: disable=(broad-exception-caught)
+        # SAP GUI scripting raises COM errors when SAP isn't running, or is starting or closing.
+        return False
+
 
-def open_all(orchestrator_connection:OrchestratorConnection) -> None:
-    """Open all programs used by the robot."""
-    credentials = orchestrator_connection.get_credential(SAP_CREDENTIALS)
-    sap_login.login_using_cli(credentials.username,credentials.password)
+def log_time_saved(orchestrator_connection: 'OrchestratorConnection', tries: int) -> None:
+    """Log the time saved by only logging in to SAP when it is needed, compared with logging in on every try.
+    A login is assumed to take as long as the logins of this run, or config.SAP_LOGIN_SECONDS if there were none.
+    """
+    login_seconds = statistics.mean(_login_seconds) if _login_seconds else config.SAP_LOGIN_SECONDS
+    saved = (tries - len(_login_seconds)) * login_seconds
+    orchestrator_connection.log_info(f"Logged in to SAP {len(_login_seconds)} times in {tries} tries, saving about {saved:.0f} s.")
@@ -0,0 +1,86 @@
+"""An on-disk cache of the reduced result of each Excel attachment.
+The framework retries the whole process on errors, and reading the attachments again is the slowest part of a retry.
+Entries are keyed by a hash of the attachment and the version of the rules, so a changed file or rule is never served from the cache.
+"""
+import datetime
+import hashlib
+import os
+import pickle
+import tempfile
+import time
+from typing import BinaryIO
+
+_SUFFIX = ".pickle"
+# Files are hashed in chunks of this many bytes, so an attachment is never read into memory as a whole.
+_CHUNK_SIZE = 1024 * 1024
+
+
+class ResultCache:
+    """A directory of pickled results with size- and age-based eviction.
+    An entry's modification time is updated when it is read, so the least recently used entries are evicted first.
+    """
+    def __init__(self, directory: str, max_bytes: int, max_age: datetime.timedelta):
+        """
+        Args:
+            directory: The directory of the cache. It is created if it doesn't exist.
+            max_bytes: The maximum total size of the entries.
+            max_age: Entries not used for this long are deleted.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(file: BinaryIO, version: str) -> str:
+        """Create the key of an entry from the content of the file and the version of the rules.
+        The file is read from its current position to the end.
+        """
+        digest = hashlib.sha256()
+        while chunk := file.read(_CHUNK_SIZE):
+            digest.update(chunk)
+        digest.update(version.encode())
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + _SUFFIX)
+
+    def get(self, key: str):
+        """Get the value of an entry, or None if there is no valid entry for the key."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as file:
+                value = pickle.load(file)
+        except FileNotFoundError:
+            return None
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            # A broken or outdated entry is treated as a miss.
+            os.remove(path)
+            return None
+
+        os.utime(path)
+        return value
+
+    def put(self, key: str, value) -> None:
+        """Store a value and evict old entries. The entry is written to a temporary file first,
+        so a crash never leaves a partial entry behind.
+        """
+        with tempfile.NamedTemporaryFile('wb', dir=self.directory, suffix='.tmp', delete=False) as file:
+            pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(file.name, self._path(key))
+        self.evict()
+
+    def evict(self) -> None:
+        """Delete entries older than max_age, and the least recently used entries until the cache is below max_bytes."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(_SUFFIX):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        oldest_allowed = time.time() - self.max_age.total_seconds()
+        total_size = 0
+        for modified, size, path in sorted(entries, reverse=True):
+            total_size += size
+            if modified < oldest_allowed or total_size > self.max_bytes:
+                os.remove(path)
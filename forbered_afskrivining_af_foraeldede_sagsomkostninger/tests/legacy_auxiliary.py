@@ -0,0 +1,29 @@
+"""The FPLKA parser of auxiliary as it was before streaming.
+Used as the reference in tests and benchmarks.
+"""
+
+
+def legacy_get_fp_and_aftale_from_file(data: str) -> dict[str, list]:
+    """Given a text file from FPLKA in SAP, this method will create a dictionary with ForretnPartner as key,
+    and a list of aftaler as value.
+    The file expected to be exported as "regneark" and saved as a text file.
+
+    Args:
+        data: A string of all the data in the file.
+
+    Returns: Dictionary of ForretnPartner and aftaler.
+    """
+
+    fp = ""
+    fp_aftale = {}
+
+    for line in data.split('\n'):
+
+        if line.startswith("\tForretnPartner:"):
+            # set active fp "key"
+            fp = line.split("\t")[-1]
+            fp_aftale[fp] = []
+        elif len(line) > 0 and line[1].isdigit():
+            fp_aftale[fp].append(line.split("\t")[1].lstrip('0')[:-12])
+
+    return fp_aftale
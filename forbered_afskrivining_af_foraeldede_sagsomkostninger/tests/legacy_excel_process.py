@@ -0,0 +1,117 @@
+"""The filtering steps of excel_process.read_sheets as they were before the rule engine.
+Used as the reference in tests and benchmarks.
+"""
+import datetime
+from io import BytesIO
+
+import openpyxl
+
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.excel_process import REMOVE_INDHOLDSART
+
+
+# pylint: disable-next=(too-many-branches)
+def legacy_filter_rows(header_row: tuple, rows: list[tuple]) -> list[tuple[str, str, str]]:
+    """Apply the Alteryx steps 2-15 the original way, looking up every column by name for every row."""
+    hovedstole = []
+    sagsomkostninger = []
+
+    for row in rows:
+        # Step 2: Delete rows where Medhæfter is not empty
+        if row[header_row.index('Medhæfter')] is not None:
+            continue
+
+        # Step 3: Delete row if RIM Aftale is MO and RIM aftalestatus is 28
+        if row[header_row.index('RIM Aftale')] == 'MO' and row[header_row.index('RIM aftalestatus')] == '28':
+            continue
+
+        # Step 4: delete rows where indholdsart is on the list (e.g. BØVO.)
+        if row[header_row.index('Indholdsart')] in REMOVE_INDHOLDSART:
+            continue
+
+        # Step 5: Delete rows where Aftale type is not empty
+        if row[header_row.index('Aftale type')] is not None:
+            continue
+
+        # Step 6: Skip.
+
+        # Step 7: Move rows with ZGBY or ZREN to sagsomkostninger
+        if row[header_row.index('Hovedtransakt.')] in ('ZGBY', 'ZREN'):
+            sagsomkostninger.append(row)
+            continue
+
+        # Step 8: Move rows with Ratespecifikation LRT to sagsomkostnigner.
+        if row[header_row.index('Ratespecifikation')] == 'LRT':
+            sagsomkostninger.append(row)
+        else:  # Step 9: remaining rows, I.E. all, where Ratespecifikation is not LRT goes to hovedstole.
+            hovedstole.append(row)
+
+        # exit loop
+
+    # Step 10: Delete row from sagsomkostninger if "RykkespærÅrsag" is 'N'.
+    sagsomkostninger = [row for row in sagsomkostninger if row[header_row.index('RykkespærÅrsag')] != 'N']
+
+    # Step 11: Delete row from sagsomkostninger if Forældelse is None or later than today.
+    def _expirey_date_passed(row):
+        date = row[header_row.index('Forældelsesdato')]
+        if date is None:
+            return False
+
+        if date > datetime.datetime.today():
+            return False
+
+        return True
+
+    sagsomkostninger = [row for row in sagsomkostninger if _expirey_date_passed(row)]
+
+    # Step 12: Split rows with "Indholdsart" ['DAGI', 'DAG2', 'SFO2'] to special_content_type_rows and not_special[...]
+    special_content_type_rows = []
+    not_special_content_type_rows = []
+
+    for row in sagsomkostninger:
+        if row[header_row.index('Indholdsart')] in ['DAGI', 'DAG2', 'SFO2']:
+            special_content_type_rows.append(row)
+        else:
+            not_special_content_type_rows.append(row)
+
+
+    # Step 13: select sagsomkostninger and hovedstole. match FP and Aftale
+    # create set of (FP,aftale) from hovedstole
+    # pylint: disable-next=(consider-using-set-comprehension)
+    unique = set((row[header_row.index('ForretnPartner')], row[header_row.index('Aftale')]) for row in hovedstole)
+    # remove rows from sagsomkostninger that do not have matching (FP, aftale) i hovedstole.
+    not_special_content_type_rows = [row for row in not_special_content_type_rows if
+                        (row[header_row.index('ForretnPartner')], row[header_row.index('Aftale')]) not in unique]
+
+    # Step 14: Combine lists
+    combined_list = not_special_content_type_rows + special_content_type_rows
+
+    # Step 15: Delete rows where RIM Aftale == 'IN' and RIM aftalestatus == 21
+    _sagsomkostninger = []
+    for row in combined_list:
+        if row[header_row.index('RIM Aftale')] == 'IN' and row[header_row.index('RIM aftalestatus')] == '21':
+            continue
+        _sagsomkostninger.append(row)
+
+    combined_list = _sagsomkostninger
+
+    # reduce to three columns: Aftale, Bilagsnummer, FP
+    return [(row[header_row.index('Aftale')], row[header_row.index('Bilagsnummer')], row[header_row.index('ForretnPartner')]) for row in
+            combined_list]
+
+
+def legacy_read_sheets(paths: list[str] | list[BytesIO]) -> list[tuple[str, str, str]]:
+    """Read all Excel files into memory, merge them and filter the rows with legacy_filter_rows."""
+    sheets = []
+    for path in paths:
+        wb = openpyxl.load_workbook(path, read_only=True)
+        rows = wb.active.values
+        header_row = next(rows)
+        sheets.append({'rows': list(rows), 'header': header_row})
+
+    header_row = sheets[0]['header']
+    rows = []
+    for sheet in sheets:
+        rows.extend(sheet['rows'])
+    del sheets
+
+    return legacy_filter_rows(header_row, rows)
@@ -0,0 +1,21 @@
+"""A base for the stand-ins that serve requests on localhost."""
+from socketserver import BaseServer
+import threading
+
+
+class LocalServer:
+    """Serve requests with a socketserver on a background thread while used as a context manager."""
+    def __init__(self, server: BaseServer):
+        """
+        Args:
+            server: The server, bound to a free port on localhost.
+        """
+        self._server = server
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,145 @@
+"""Replay a run of the process end to end against local stand-ins for Graph, SAP and OpenOrchestrator.
+The restancelister are served by StubGraphServer, the FPLKA export is written by StubSapSession and
+the queue and logs are kept by StubOrchestratorConnection. Everything else is the real process.
+
+The process module imports pythoncom and the SAP and Graph helpers, so the robot's dependencies must be installed.
+"""
+from contextlib import ExitStack
+from dataclasses import dataclass
+import datetime
+from functools import partial
+import json
+import os
+import tempfile
+import threading
+from typing import Iterable
+from unittest import mock
+
+from forbered_afskrivining_af_foraeldede_sagsomkostninger import config, graph_api, queue_insert
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.tests.stub_graph import StubGraphServer
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.tests.stub_orchestrator import StubCredential, StubOrchestratorConnection
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.tests.stub_sap import StubSapSession
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.tests.synthetic import Fixture
+
+# The mailbox searched by process.get_emails.
+USER = 'itk-rpa@mkb.aarhus.dk'
+FOLDER = "Indbakke/Afskrivning af forældede sagsomkostninger"
+SENDER = 'kan-ikke-besvares@kmd.dk'
+SUBJECT = 'Liste til forældede sagsomkostninger'
+
+
+@dataclass
+class ReplayResult:
+    """The stand-ins after the run, and the run metrics logged by the process."""
+    orchestrator_connection: StubOrchestratorConnection
+    graph_server: StubGraphServer
+    sap_session: StubSapSession
+    metrics: dict
+
+    def queued_rows(self) -> list[tuple[str, str, str]]:
+        """The queue elements as (aftale, bilagsnummer, fp)."""
+        return [tuple(json.loads(element.data)[name] for name in queue_insert.FIELDS) for element in self.orchestrator_connection.queue_elements]
+
+    def file_dates(self) -> dict[tuple[str, str, str], str]:
+        """The file date each queue element is tagged with, by (aftale, bilagsnummer, fp)."""
+        file_dates = {}
+        for element in self.orchestrator_connection.queue_elements:
+            data = json.loads(element.data)
+            file_dates[tuple(data[name] for name in queue_insert.FIELDS)] = data[config.FILE_DATE_TAG]
+        return file_dates
+
+    def stage(self, name: str) -> dict:
+        """The metrics of the first stage with a name."""
+        return next(stage for stage in self.metrics['stages'] if stage['name'] == name)
+
+
+def run_metrics(logs: list[tuple[str, str]]) -> dict:
+    """Collect the run metrics logged by one run of the process into one summary. A summary split over several messages is joined.
+
+    Args:
+        logs: The (level, message) logged during the run.
+    """
+    summary = {'stages': []}
+    for level, message in logs:
+        if level == 'info' and message.startswith("Run metrics"):
+            part = json.loads(message.split(": ", 1)[1])
+            summary['stages'] += part.pop('stages')
+            summary.update(part)
+    return summary
+
+
+def add_mailbox(server: StubGraphServer, fixture: Fixture, file_date: datetime.date, file_count: int = 1,
+                download_delay: float = 0) -> None:
+    """Add the workbooks of a fixture to the mailbox, one email per attachment like KMD sends them."""
+    folder_id = server.add_folder(FOLDER)
+    for name, workbook in fixture.workbooks(file_date, file_count).items():
+        message_id = server.add_message(folder_id, SENDER, f"{SUBJECT} {name}", received_time=f"{file_date:%Y-%m-%d}T06:00:00Z")
+        server.add_attachment(message_id, name, workbook.getvalue(), download_delay)
+
+
+# pylint: disable-next=(too-many-arguments)
+def replay(fixture: Fixture, file_date: datetime.date | None = None, file_count: int = 1, *,
+           earlier_batches: Iterable[tuple[Fixture, datetime.date, int]] = (),
+           orchestrator_connection: StubOrchestratorConnection | None = None, sap_write_seconds: float = 0,
+           download_delay: float = 0, config_overrides: dict | None = None) -> ReplayResult:
+    """Run process.process on a fixture.
+
+    Args:
+        fixture: The restanceliste and FPLKA export.
+        file_date (optional): The date in the attachment names. Defaults to today.
+        file_count (optional): The number of attachments the restanceliste is split into.
+        earlier_batches (optional): Other restancelister in the mailbox as (fixture, file date, file count),
+            e.g. from a week the robot didn't run. Only the FPLKA export of 'fixture' is used.
+        orchestrator_connection (optional): The connection to use, e.g. one with queue elements from an earlier run.
+        sap_write_seconds (optional): How long SAP takes to write the export.
+        download_delay (optional): Seconds before each attachment download starts sending.
+        config_overrides (optional): Values of config to use for the run. By default the Excel cache and the incremental
+            index are off, the queue checkpoint is in a temporary folder and the SAP file only needs to be stable for 0.2 s.
+
+    Returns:
+        The stand-ins after the run and the run metrics.
+    """
+    # Imported here, so the rest of the test helpers work without the robot's dependencies.
+    # pylint: disable-next=(import-outside-toplevel)
+    from itk_dev_shared_components.sap import multi_session, sap_login
+    from forbered_afskrivining_af_foraeldede_sagsomkostninger import process, reset  # pylint: disable=(import-outside-toplevel)
+
+    file_date = file_date or datetime.date.today()
+    orchestrator_connection = orchestrator_connection or StubOrchestratorConnection(process_name="Replay")
+    orchestrator_connection.credentials[config.GRAPH_CREDENTIALS] = StubCredential(
+        config.GRAPH_CREDENTIALS, USER, json.dumps({'client_id': "replay", 'tenant_id': "replay"}))
+    orchestrator_connection.credentials[config.SAP_CREDENTIALS] = StubCredential(config.SAP_CREDENTIALS, "replay", "replay")
+
+    graph_access = mock.MagicMock()
+    graph_access.get_access_token.return_value = "token"
+    sap_session = StubSapSession(fixture.fplka_lines(), write_seconds=sap_write_seconds)
+    server = StubGraphServer()
+    add_mailbox(server, fixture, file_date, file_count, download_delay)
+    for earlier_fixture, earlier_file_date, earlier_file_count in earlier_batches:
+        add_mailbox(server, earlier_fixture, earlier_file_date, earlier_file_count, download_delay)
+
+    with server, tempfile.TemporaryDirectory() as directory, ExitStack() as stack:
+        overrides = {
+            'EXCEL_CACHE_DIR': None,
+            'QUEUE_CHECKPOINT_FILE': os.path.join(directory, "queue_checkpoint.txt"),
+            'INCREMENTAL_INDEX_FILE': None,
+            'SAP_FILE_STABLE_SECONDS': 0.2,
+            'PROFILE_FILE': os.path.join(directory, "replay.prof"),
+        }
+        overrides.update(config_overrides or {})
+        for name, value in overrides.items():
+            stack.enter_context(mock.patch.object(config, name, value))
+
+        stack.enter_context(mock.patch.object(process.authentication, 'authorize_by_username_password', return_value=graph_access))
+        stack.enter_context(mock.patch.object(process.mail, 'get_folder_id_from_path', server.get_folder_id_from_path))
+        stack.enter_context(mock.patch.object(graph_api, 'GraphClient', partial(graph_api.GraphClient, base_url=server.url, backoff=0)))
+        stack.enter_context(mock.patch.object(multi_session, 'get_all_sap_sessions', return_value=[sap_session]))
+        # Every replay logs in to SAP once, like a run of the robot.
+        stack.enter_context(mock.patch.object(reset, '_sap_opened', threading.Event()))
+        stack.enter_context(mock.patch.object(sap_login, 'kill_sap'))
+        stack.enter_context(mock.patch.object(sap_login, 'login_using_cli'))
+
+        first_log = len(orchestrator_connection.logs)
+        process.process(orchestrator_connection)
+
+    return ReplayResult(orchestrator_connection, server, sap_session, run_metrics(orchestrator_connection.logs[first_log:]))
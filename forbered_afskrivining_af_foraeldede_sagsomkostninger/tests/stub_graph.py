@@ -0,0 +1,205 @@
+"""A local stand-in for the parts of the Graph API used by the process."""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import re
+import threading
+import time
+from urllib.parse import parse_qs, urlencode, urlsplit
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.tests.local_server import LocalServer
+
+_FOLDER_MESSAGES = re.compile(r"^/users/[^/]+/mailFolders/(?P<folder>[^/]+)/messages$")
+_ATTACHMENTS = re.compile(r"^/users/[^/]+/messages/(?P<message>[^/]+)/attachments$")
+_ATTACHMENT_VALUE = re.compile(r"^/users/[^/]+/messages/(?P<message>[^/]+)/attachments/(?P<attachment>[^/]+)/\$value$")
+_MOVE = re.compile(r"^/users/[^/]+/messages/(?P<message>[^/]+)/move$")
+_MESSAGE = re.compile(r"^/users/[^/]+/messages/(?P<message>[^/]+)$")
+
+_FILTER_SENDER = re.compile(r"from/emailAddress/address eq '((?:[^']|'')*)'")
+_FILTER_SUBJECT = re.compile(r"startswith\(subject, '((?:[^']|'')*)'\)")
+
+
+class StubGraphServer(LocalServer):  # pylint: disable=(too-many-instance-attributes)
+    """Serve Graph requests on localhost from in-memory data.
+    Use as a context manager and pass 'url' as the base url of the Graph calls.
+    Folders are looked up with get_folder_id_from_path, in place of the shared component, which always calls Graph itself.
+    """
+    def __init__(self, page_size: int = 10):
+        self.folders = {}  # {(parent id or None, display name): folder id}
+        self.messages = {}  # {message id: message}
+        self.attachments = {}  # {(message id, attachment id): (name, content, delay in seconds)}
+        self.requests = []  # (method, url) of every request, including the ones inside batches
+        self.http_requests = []  # (method, url, authorization) of every HTTP request
+        self.page_size = page_size
+        self.throttle = 0  # The number of coming requests to answer with 429
+        self._lock = threading.Lock()
+        super().__init__(ThreadingHTTPServer(('127.0.0.1', 0), self._handler()))
+        self.url = f"http://127.0.0.1:{self._server.server_port}"
+
+    def add_folder(self, path: str) -> str:
+        """Add a folder path like 'Indbakke/Sub' and return the id of the last folder."""
+        parent = None
+        for name in path.split('/'):
+            parent = self.folders.setdefault((parent, name), f"folder{len(self.folders)}")
+        return parent
+
+    def get_folder_id_from_path(self, user: str, folder_path: str, graph_access=None) -> str:  # pylint: disable=(unused-argument)
+        """Get the id of a folder path, like mail.get_folder_id_from_path.
+
+        Raises:
+            ValueError: If a folder in the path can't be found.
+        """
+        folder_id = None
+        for name in folder_path.split('/'):
+            folder_id = self.folders.get((folder_id, name))
+            if folder_id is None:
+                raise ValueError(f"Folder '{name}' of '{folder_path}' was not found for user '{user}'.")
+        return folder_id
+
+    def add_message(self, folder_id: str, sender: str, subject: str, received_time: str = "2023-10-24T06:00:00Z") -> str:
+        """Add an email to a folder and return its id."""
+        message_id = f"message{len(self.messages)}"
+        self.messages[message_id] = {'folder': folder_id, 'sender': sender, 'subject': subject, 'received': received_time, 'attachments': []}
+        return message_id
+
+    def add_attachment(self, message_id: str, name: str, content: bytes, delay: float = 0) -> str:
+        """Add an attachment to an email and return its id."""
+        attachment_id = f"attachment{len(self.attachments)}"
+        self.attachments[(message_id, attachment_id)] = (name, content, delay)
+        if message_id in self.messages:
+            self.messages[message_id]['attachments'].append(attachment_id)
+        return attachment_id
+
+    def _list_messages(self, folder_id: str, query: dict) -> list[dict]:
+        odata_filter = query.get('$filter', [''])[0]
+        sender = _FILTER_SENDER.search(odata_filter)
+        subject = _FILTER_SUBJECT.search(odata_filter)
+
+        messages = []
+        for message_id, message in self.messages.items():
+            if message['folder'] != folder_id:
+                continue
+            if sender and message['sender'] != sender[1].replace("''", "'"):
+                continue
+            if subject and not message['subject'].lower().startswith(subject[1].replace("''", "'").lower()):
+                continue
+            if 'hasAttachments eq true' in odata_filter and not message['attachments']:
+                continue
+            messages.append({'id': message_id, 'receivedDateTime': message['received'], 'subject': message['subject'],
+                             'from': {'emailAddress': {'address': message['sender']}}, 'hasAttachments': bool(message['attachments'])})
+        return messages
+
+    def dispatch(self, method: str, url: str, body: dict | None) -> tuple[int, dict, dict | bytes | None]:
+        """Handle a request and return (status, headers, body). Used for both plain and batched requests."""
+        with self._lock:
+            self.requests.append((method, url))
+            if self.throttle > 0:
+                self.throttle -= 1
+                return 429, {'Retry-After': '0'}, {'error': {'code': 'TooManyRequests'}}
+
+        parts = urlsplit(url)
+        for route_method, pattern, handler in self._routes():
+            if method == route_method and (match := pattern.match(parts.path)):
+                return handler(match, parse_qs(parts.query), body)
+        return 404, {}, None
+
+    def _routes(self) -> tuple:
+        return (('GET', _FOLDER_MESSAGES, self._get_messages),
+                ('GET', _ATTACHMENTS, self._get_attachments),
+                ('GET', _ATTACHMENT_VALUE, self._get_attachment_value),
+                ('POST', _MOVE, self._move),
+                ('DELETE', _MESSAGE, self._delete))
+
+    def _get_messages(self, match: re.Match, query: dict, _body) -> tuple:
+        messages = self._list_messages(match['folder'], query)
+        skip = int(query.get('$skip', ['0'])[0])
+        page = {'value': messages[skip:skip + self.page_size]}
+        if skip + self.page_size < len(messages):
+            next_query = {name: values[0] for name, values in query.items() if name != '$skip'}
+            next_query['$skip'] = skip + self.page_size
+            page['@odata.nextLink'] = f"{self.url}{match.string}?{urlencode(next_query)}"
+        return 200, {}, page
+
+    def _get_attachments(self, match: re.Match, _query, _body) -> tuple:
+        message = self.messages.get(match['message'])
+        if message is None:
+            return 404, {}, None
+        value = []
+        for attachment_id in message['attachments']:
+            name, content, _ = self.attachments[(match['message'], attachment_id)]
+            value.append({'id': attachment_id, 'name': name, 'size': len(content)})
+        return 200, {}, {'value': value}
+
+    def _get_attachment_value(self, match: re.Match, _query, _body) -> tuple:
+        if (match['message'], match['attachment']) not in self.attachments:
+            return 404, {}, None
+        _, content, delay = self.attachments[(match['message'], match['attachment'])]
+        time.sleep(delay)
+        return 200, {'Content-Type': 'application/octet-stream'}, content
+
+    def _move(self, match: re.Match, _query, body: dict) -> tuple:
+        message = self.messages.pop(match['message'], None)
+        if message is None:
+            return 404, {}, None
+        new_id = match['message'] + "-moved"
+        message['folder'] = body['destinationId']
+        self.messages[new_id] = message
+        return 201, {}, {'id': new_id}
+
+    def _delete(self, match: re.Match, _query, _body) -> tuple:
+        if self.messages.pop(match['message'], None) is None:
+            return 404, {}, None
+        return 204, {}, None
+
+    def _batch(self, body: dict) -> dict:
+        responses = []
+        for request in body['requests']:
+            status, headers, response_body = self.dispatch(request['method'], request['url'], request.get('body'))
+            responses.append({'id': request['id'], 'status': status, 'headers': headers, 'body': response_body})
+        # Graph doesn't promise any order of the responses.
+        return {'responses': list(reversed(responses))}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            """Handle a single HTTP request against the stub data."""
+            def _respond(self, status, headers, body):
+                if isinstance(body, dict):
+                    body = json.dumps(body).encode()
+                    headers = dict(headers, **{'Content-Type': 'application/json'})
+                body = body or b""
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _handle(self, method):
+                length = int(self.headers.get('Content-Length', 0))
+                body = json.loads(self.rfile.read(length)) if length else None
+                server.http_requests.append((method, self.path, self.headers.get('Authorization')))
+
+                if method == 'POST' and self.path == '/$batch':
+                    if len(body['requests']) > 20:
+                        self._respond(400, {}, {'error': {'code': 'BadRequest'}})
+                    else:
+                        self._respond(200, {}, server._batch(body))  # pylint: disable=(protected-access)
+                else:
+                    self._respond(*server.dispatch(method, self.path, body))
+
+            def do_GET(self):  # pylint: disable=(invalid-name)
+                """Handle GET"""
+                self._handle('GET')
+
+            def do_POST(self):  # pylint: disable=(invalid-name)
+                """Handle POST"""
+                self._handle('POST')
+
+            def do_DELETE(self):  # pylint: disable=(invalid-name)
+                """Handle DELETE"""
+                self._handle('DELETE')
+
+            def log_message(self, format, *args):  # pylint: disable=(redefined-builtin)
+                pass
+
+        return Handler
@@ -0,0 +1,90 @@
+"""An in-memory stand-in for the parts of OrchestratorConnection used by the process."""
+from dataclasses import dataclass, field
+import datetime
+import time
+import uuid
+
+
+@dataclass
+class StubQueueElement:
+    """A queue element with the fields of OpenOrchestrator's QueueElement used by the process."""
+    queue_name: str
+    reference: str | None
+    data: str | None
+    created_date: datetime.datetime = field(default_factory=datetime.datetime.now)
+    id: uuid.UUID = field(default_factory=uuid.uuid4)
+
+
+@dataclass
+class StubCredential:
+    """A credential with the fields of OpenOrchestrator's Credential used by the process."""
+    name: str
+    username: str
+    password: str
+
+
+class StubOrchestratorConnection:  # pylint: disable=(too-many-instance-attributes)
+    """Keep queue elements and log messages in memory."""
+    def __init__(self, fail_after_inserts: int | None = None, call_latency: float = 0, process_name: str = "Stub process",
+                 process_arguments: str = ""):
+        """
+        Args:
+            fail_after_inserts (optional): Raise a ConnectionError on bulk inserts after this many successful ones.
+            call_latency (optional): Seconds every queue call sleeps, like the round trip to the database.
+            process_name (optional): The name of the process.
+            process_arguments (optional): The arguments of the trigger.
+        """
+        self.queue_elements = []
+        self.logs = []  # (level, message)
+        self.credentials = {}  # {name: StubCredential}
+        self.insert_calls = 0
+        self.fail_after_inserts = fail_after_inserts
+        self.call_latency = call_latency
+        self.process_name = process_name
+        self.process_arguments = process_arguments
+
+    def bulk_create_queue_elements(self, queue_name: str, references: tuple[str | None, ...], data: tuple[str | None, ...],
+                                   created_by: str | None = None) -> None:  # pylint: disable=(unused-argument)
+        """Insert multiple queue elements, validated like OpenOrchestrator does."""
+        time.sleep(self.call_latency)
+        if len(references) == 0 or len(data) == 0 or len(references) != len(data):
+            raise ValueError("The references and data must be non-empty and of equal length.")
+        if self.fail_after_inserts is not None and self.insert_calls >= self.fail_after_inserts:
+            raise ConnectionError("Lost connection to the database.")
+        self.insert_calls += 1
+        self.queue_elements.extend(StubQueueElement(queue_name, ref, dat) for ref, dat in zip(references, data))
+
+    # pylint: disable-next=(unused-argument, too-many-positional-arguments)
+    def get_queue_elements(self, queue_name: str, reference: str | None = None, status=None, offset: int = 0, limit: int = 100,
+                           from_date: datetime.datetime | None = None, to_date: datetime.datetime | None = None) -> tuple[StubQueueElement, ...]:
+        """Get queue elements ordered by created date. Filtering on status is not supported."""
+        time.sleep(self.call_latency)
+        elements = [element for element in self.queue_elements
+                    if element.queue_name == queue_name
+                    and (reference is None or element.reference == reference)
+                    and (from_date is None or element.created_date >= from_date)
+                    and (to_date is None or element.created_date <= to_date)]
+        elements.sort(key=lambda element: element.created_date)
+        return tuple(elements[offset:offset + limit])
+
+    def get_credential(self, credential_name: str) -> StubCredential:
+        """Get a credential added to 'credentials'.
+
+        Raises:
+            ValueError: If no credential with the name exists, like OpenOrchestrator.
+        """
+        if credential_name not in self.credentials:
+            raise ValueError(f"No credential with name '{credential_name}' was found.")
+        return self.credentials[credential_name]
+
+    def log_trace(self, message: str) -> None:
+        """Keep a trace message."""
+        self.logs.append(('trace', message))
+
+    def log_info(self, message: str) -> None:
+        """Keep an info message."""
+        self.logs.append(('info', message))
+
+    def log_error(self, message: str) -> None:
+        """Keep an error message."""
+        self.logs.append(('error', message))
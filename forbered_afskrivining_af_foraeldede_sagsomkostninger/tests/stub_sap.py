@@ -0,0 +1,79 @@
+"""A stand-in for the SAP GUI scripting session used to export rykkerspærrer from FPLKA."""
+import os
+import threading
+import time
+from types import SimpleNamespace
+from typing import Iterable
+
+
+class StubSapElement:
+    """A GUI element. Every action is recorded in the session."""
+    def __init__(self, session: 'StubSapSession', element_id: str):
+        self._session = session
+        self.id = element_id
+        self.text = ""
+
+    def select(self) -> None:
+        """Select a menu or radio button."""
+        self._session.actions.append(('select', self.id))
+
+    def press(self) -> None:
+        """Press a button. The save button of the 'Save list in file' dialog writes the export."""
+        self._session.actions.append(('press', self.id))
+        if self.id.endswith('wnd[1]/tbar[0]/btn[11]'):
+            self._session.save_export()
+
+    def sendVKey(self, key: int) -> None:  # pylint: disable=(invalid-name)
+        """Send a virtual key, e.g. 8 for F8."""
+        self._session.actions.append(('sendVKey', self.id, key))
+
+
+class StubSapSession:  # pylint: disable=(too-many-instance-attributes)
+    """Answer findById with elements, and write an FPLKA export when the list is saved to a file.
+    Like SAP, the export is written on another thread after the save button returns, a chunk at a time.
+    The session is logged in and idle on the main window, so it is healthy once the run has logged in.
+    """
+    def __init__(self, lines: Iterable[str], write_seconds: float = 0, chunks: int = 10):
+        """
+        Args:
+            lines: The lines of the export, see synthetic.format_fplka_lines.
+            write_seconds (optional): How long writing the export takes.
+            chunks (optional): The number of writes the export is split into.
+        """
+        self.lines = list(lines)
+        self.write_seconds = write_seconds
+        self.chunks = chunks
+        self.transactions = []
+        self.actions = []
+        self.writer = None
+        self._elements = {}
+        self.Info = SimpleNamespace(User="REPLAY")  # pylint: disable=(invalid-name)
+        self.Busy = False  # pylint: disable=(invalid-name)
+        self.ActiveWindow = SimpleNamespace(Name='wnd[0]')  # pylint: disable=(invalid-name)
+
+    def startTransaction(self, transaction: str) -> None:  # pylint: disable=(invalid-name)
+        """Start a transaction like 'fplka'."""
+        self.transactions.append(transaction)
+
+    def findById(self, element_id: str) -> StubSapElement:  # pylint: disable=(invalid-name)
+        """Get the element with an id. The same id always gives the same element."""
+        return self._elements.setdefault(element_id.removeprefix('/app/con[0]/ses[0]/'), StubSapElement(self, element_id))
+
+    def export_path(self) -> str:
+        """The path entered in the 'Save list in file' dialog."""
+        return os.path.join(self.findById('wnd[1]/usr/ctxtDY_PATH').text, self.findById('wnd[1]/usr/ctxtDY_FILENAME').text)
+
+    def save_export(self) -> None:
+        """Start writing the export to the entered path."""
+        path = self.export_path()
+        size = -(-len(self.lines) // self.chunks) or 1
+
+        def write():
+            with open(path, 'w', encoding='cp1252', newline='') as file:
+                for start in range(0, len(self.lines), size):
+                    time.sleep(self.write_seconds / self.chunks)
+                    file.writelines(self.lines[start:start + size])
+                    file.flush()
+
+        self.writer = threading.Thread(target=write, daemon=True)
+        self.writer.start()
@@ -0,0 +1,75 @@
+"""A local stand-in for the SMTP server the error reports are sent to."""
+from email import message_from_bytes, policy
+from email.message import EmailMessage
+from socketserver import StreamRequestHandler, ThreadingTCPServer
+import threading
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.tests.local_server import LocalServer
+
+
+class StubSmtpServer(LocalServer):  # pylint: disable=(too-few-public-methods)
+    """Receive emails on localhost and keep them in memory. STARTTLS isn't supported.
+    Use as a context manager and send to 'host' and 'port'.
+    """
+    def __init__(self):
+        self.messages: list[EmailMessage] = []
+        self.connections = 0
+        # Emails are only accepted while this is set, so clearing it makes a slow server.
+        self.accepting = threading.Event()
+        self.accepting.set()
+        # The number of emails still to reject with a temporary error.
+        self.rejecting = 0
+        self._lock = threading.Lock()
+        server = ThreadingTCPServer(('127.0.0.1', 0), self._handler())
+        server.daemon_threads = True
+        super().__init__(server)
+        self.host, self.port = server.server_address
+
+    def _received(self, data: bytes) -> bool:
+        """Keep an email, unless it is rejected. Returns whether it was kept."""
+        self.accepting.wait()
+        with self._lock:
+            if self.rejecting:
+                self.rejecting -= 1
+                return False
+            self.messages.append(message_from_bytes(data, policy=policy.default))
+            return True
+
+    def _handler(self):
+        server = self
+
+        class Handler(StreamRequestHandler):
+            """Handle an SMTP connection against the stub data."""
+            def _reply(self, line: str):
+                self.wfile.write(f"{line}\r\n".encode())
+
+            def _data(self) -> bytes:
+                lines = []
+                while (line := self.rfile.readline()) not in (b".\r\n", b""):
+                    # Undo the dot stuffing of lines starting with a dot.
+                    lines.append(line[1:] if line.startswith(b".") else line)
+                return b"".join(lines)
+
+            def handle(self):
+                with server._lock:  # pylint: disable=(protected-access)
+                    server.connections += 1
+                self._reply("220 localhost stub SMTP")
+                while line := self.rfile.readline():
+                    command = line.decode().strip().split(" ", 1)[0].upper()
+                    if command == "EHLO":
+                        self._reply("250-localhost")
+                        self._reply("250 8BITMIME")
+                    elif command in ("HELO", "MAIL", "RCPT", "RSET", "NOOP"):
+                        self._reply("250 OK")
+                    elif command == "DATA":
+                        self._reply("354 End data with <CR><LF>.<CR><LF>")
+                        if server._received(self._data()):  # pylint: disable=(protected-access)
+                            self._reply("250 OK")
+                        else:
+                            self._reply("451 Try again later")
+                    elif command == "QUIT":
+                        self._reply("221 Bye")
+                        return
+                    else:
+                        self._reply("502 Command not implemented")
+
+        return Handler
@@ -0,0 +1,269 @@
+"""Generate synthetic KMD restancelister and FPLKA exports for tests and benchmarks."""
+from dataclasses import dataclass, field, fields
+import datetime
+import random
+from io import BytesIO
+from typing import Iterable, Iterator
+
+import openpyxl
+
+# The columns used by the Alteryx rules among the other columns of the KMD sheet, about as wide as the real restanceliste.
+HEADER = (
+    'Forretningsområde', 'ForretnPartner', 'Navn', 'C/O navn', 'Adresse', 'Postnr', 'By', 'CPR/CVR', 'Kontonummer', 'Kontotype',
+    'Aftale', 'Aftale type', 'Aftalestatus', 'RIM Aftale', 'RIM aftalestatus', 'Medhæfter', 'Ejendomsnummer', 'Kommunekode',
+    'Bilagsnummer', 'Bilagsart', 'Bilagsdato', 'Bogføringsdato', 'Indholdsart', 'Hovedtransakt.', 'Deltransakt.',
+    'Ratespecifikation', 'Periode fra', 'Periode til', 'Stiftelsesdato', 'Forfaldsdato', 'Forældelsesdato', 'Afbrydelsesdato',
+    'Rykkerniveau', 'Seneste rykkerdato', 'RykkespærÅrsag', 'Rykkerspærre til', 'Inddrivelsesstatus', 'Overdraget dato',
+    'Udligningsstatus', 'Udligningsbilag', 'Udligningsdato', 'Betalingsform', 'Oprindeligt beløb', 'Restbeløb', 'Renter',
+    'Gebyrer', 'Valuta', 'Sagsbehandler', 'Reference', 'Tekst'
+)
+
+INDHOLDSARTER = ('BØVO', 'EJEN', 'DAGI', 'DAG2', 'SFO2', 'PARK', 'RENO', 'VAND', 'KONT', 'SKAT')
+
+
+def generate_rows(count: int, seed: int = 0) -> list[tuple]:
+    """Generate rows in the layout of HEADER.
+    Values are drawn so every branch of the Alteryx rules is hit, and (FP, Aftale) pairs repeat across rows.
+
+    Args:
+        count: The number of rows.
+        seed: Seed for the random generator.
+
+    Returns:
+        A list of row tuples.
+    """
+    rng = random.Random(seed)
+    today = datetime.datetime.today().replace(hour=0, minute=0, second=0, microsecond=0)
+    partner_count = max(count // 4, 1)
+
+    columns = {name: index for index, name in enumerate(HEADER)}
+    rows = []
+    for index in range(count):
+        fp = str(10_000_000 + rng.randrange(partner_count))
+        aftale = str(2_000_000 + int(fp) % 1000 * 3 + rng.randrange(3))
+        row = [None] * len(HEADER)
+        row[columns['ForretnPartner']] = fp
+        row[columns['Navn']] = f"Navn {fp}"
+        row[columns['Aftale']] = aftale
+        row[columns['Aftale type']] = rng.choice((None,) * 19 + ('RATE',))
+        row[columns['RIM Aftale']] = rng.choice(('MO', 'IN', None, None))
+        row[columns['RIM aftalestatus']] = rng.choice(('28', '21', '10', None))
+        row[columns['Medhæfter']] = rng.choice((None,) * 19 + ('20000001',))
+        row[columns['Bilagsnummer']] = str(100_000_000_000 + index)
+        row[columns['Indholdsart']] = rng.choice(INDHOLDSARTER)
+        row[columns['Hovedtransakt.']] = rng.choice(('ZGBY', 'ZREN', 'ZHOV', 'ZHOV', 'ZHOV'))
+        row[columns['Deltransakt.']] = rng.choice(('0010', '0020'))
+        row[columns['Ratespecifikation']] = rng.choice(('LRT', None, None))
+        row[columns['Forfaldsdato']] = today - datetime.timedelta(days=rng.randrange(30, 3000))
+        row[columns['Forældelsesdato']] = rng.choice((None, today - datetime.timedelta(days=rng.randrange(1, 3000)),
+                                                      today + datetime.timedelta(days=rng.randrange(1, 3000))))
+        row[columns['RykkespærÅrsag']] = rng.choice(('N', None, None, 'A'))
+        row[columns['Oprindeligt beløb']] = round(rng.uniform(10, 10_000), 2)
+        row[columns['Restbeløb']] = round(rng.uniform(0, 10_000), 2)
+        row[columns['Valuta']] = 'DKK'
+        rows.append(tuple(row))
+
+    return rows
+
+
+def write_workbook(rows: list[tuple], header: tuple = HEADER) -> BytesIO:
+    """Write a header and rows to an in-memory xlsx file.
+
+    Args:
+        rows: The rows to write below the header.
+        header: The header row.
+
+    Returns:
+        The xlsx file as a BytesIO.
+    """
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(header)
+    for row in rows:
+        ws.append(row)
+
+    buffer = BytesIO()
+    wb.save(buffer)
+    buffer.seek(0)
+    return buffer
+
+
+def format_fplka_lines(partners: Iterable[tuple[str, Iterable[str]]], seed: int = 0) -> Iterator[str]:
+    """Format ForretnPartnere and their aftaler as the lines of an FPLKA rykkerspærre export saved as "regneark".
+    Each ForretnPartner has a header line followed by a column header, one line per aftale and an empty line.
+
+    Args:
+        partners: (ForretnPartner, aftaler) in the order of the export.
+        seed: Seed for the random suffix SAP adds to each aftale.
+
+    Yields:
+        The lines including the line break.
+    """
+    rng = random.Random(seed)
+    yield "Rykkerspærrer\n"
+    yield "\n"
+    for fp, aftaler in partners:
+        yield f"\tForretnPartner:\t\t{fp}\n"
+        yield "\tAftale\tSpærtype\tGyldig fra\tGyldig til\n"
+        for aftale in aftaler:
+            yield f"\t{int(aftale):010d}{rng.randrange(10**12):012d}\t51\t01.01.2023\t31.12.9999\n"
+        yield "\n"
+
+
+def generate_fplka_lines(partner_count: int, aftaler_per_partner: int = 3, seed: int = 0) -> Iterator[str]:
+    """Generate the lines of an FPLKA rykkerspærre export saved as "regneark".
+    Each ForretnPartner has a header line followed by a column header, one line per aftale and an empty line.
+    ForretnPartner and aftaler are drawn from the same ranges as generate_rows.
+
+    Args:
+        partner_count: The number of ForretnPartnere.
+        aftaler_per_partner: The number of aftale lines of each ForretnPartner.
+        seed: Seed for the random generator.
+
+    Yields:
+        The lines including the line break.
+    """
+    rng = random.Random(seed)
+    partners = ((str(fp), [str(2_000_000 + fp % 1000 * 3 + rng.randrange(3)) for _ in range(aftaler_per_partner)])
+                for fp in range(10_000_000, 10_000_000 + partner_count))
+    yield from format_fplka_lines(partners, seed)
+
+
+def write_fplka_export(path: str, partner_count: int, aftaler_per_partner: int = 3, seed: int = 0) -> None:
+    """Write a generated FPLKA export to a file in the encoding used by SAP. See generate_fplka_lines."""
+    with open(path, 'w', encoding='cp1252', newline='') as file:
+        file.writelines(generate_fplka_lines(partner_count, aftaler_per_partner, seed))
+
+
+@dataclass
+class BranchRatios:  # pylint: disable=(too-many-instance-attributes)
+    """The relative number of rows ending in each branch of the filter steps.
+    Rows are deleted by steps 2-5, kept as hovedstole in step 9, or become sagsomkostninger
+    that are deleted by steps 10, 11, 15, 13 or by a rykkerspærre, or are kept.
+    """
+    medhaefter: float = 0.05  # Step 2
+    mo_28: float = 0.02  # Step 3
+    remove_indholdsart: float = 0.15  # Step 4
+    aftale_type: float = 0.05  # Step 5
+    hovedstol: float = 0.45  # Step 9
+    rykkespaer_n: float = 0.04  # Step 10
+    not_expired: float = 0.08  # Step 11
+    in_21: float = 0.02  # Step 15
+    matching_hovedstol: float = 0.04  # Step 13
+    rykkerspaerret: float = 0.02  # Process step 4
+    special: float = 0.03  # Step 12, kept
+    kept: float = 0.05
+
+
+@dataclass
+class Fixture:
+    """A synthetic restanceliste, the FPLKA export that goes with it and the rows the process should queue.
+    The FPLKA export has every ForretnPartner of the sagsomkostninger, since the process only keeps rows of
+    ForretnPartnere found in the export.
+    """
+    rows: list[tuple]
+    fplka: dict[str, set[str]]
+    expected: set[tuple[str, str, str]]
+    branches: dict[str, int] = field(default_factory=dict)
+
+    def fplka_lines(self, seed: int = 0) -> Iterator[str]:
+        """The lines of the FPLKA export. See format_fplka_lines."""
+        return format_fplka_lines(sorted(self.fplka.items()), seed)
+
+    def write_fplka_export(self, path: str, seed: int = 0) -> None:
+        """Write the FPLKA export to a file in the encoding used by SAP."""
+        with open(path, 'w', encoding='cp1252', newline='') as file:
+            file.writelines(self.fplka_lines(seed))
+
+    def workbooks(self, file_date: datetime.date, file_count: int = 1, robot: int = 3) -> dict[str, BytesIO]:
+        """Split the rows evenly over workbooks named like KMD does, see attachment_names."""
+        names = attachment_names(file_date, file_count, robot)
+        size = -(-len(self.rows) // file_count)
+        return {name: write_workbook(self.rows[index * size:(index + 1) * size]) for index, name in enumerate(names)}
+
+
+def attachment_names(file_date: datetime.date, file_count: int, robot: int = 3) -> list[str]:
+    """The names KMD gives the attachments of one restanceliste: 'YYYYMMDDRPAxx_nn_NN.XLSX'."""
+    return [f"{file_date:%Y%m%d}RPA{robot:02d}_{number:02d}_{file_count:02d}.XLSX" for number in range(1, file_count + 1)]
+
+
+# pylint: disable-next=(too-many-branches)
+def generate_fixture(count: int, ratios: BranchRatios | None = None, seed: int = 0) -> Fixture:
+    """Generate a restanceliste where each row is made to end in a branch of the filter steps, drawn by ratios.
+
+    Args:
+        count: The number of rows.
+        ratios (optional): The relative number of rows in each branch.
+        seed: Seed for the random generator.
+
+    Returns:
+        The fixture with the rows in random order.
+    """
+    ratios = ratios or BranchRatios()
+    names = [ratio.name for ratio in fields(BranchRatios)]
+    weights = [getattr(ratios, name) for name in names]
+
+    rng = random.Random(seed)
+    today = datetime.datetime.today().replace(hour=0, minute=0, second=0, microsecond=0)
+    columns = {name: index for index, name in enumerate(HEADER)}
+    fixture = Fixture(rows=[], fplka={}, expected=set(), branches=dict.fromkeys(names, 0))
+    hovedstole_keys = []
+
+    for index, branch in enumerate(rng.choices(names, weights, k=count)):
+        if branch == 'matching_hovedstol' and not hovedstole_keys:
+            branch = 'hovedstol'
+        fixture.branches[branch] += 1
+
+        # Every row has its own (FP, Aftale) unless it is made to match a hovedstol.
+        fp, aftale = str(10_000_000 + index), str(2_000_000 + index)
+        if branch == 'matching_hovedstol':
+            fp, aftale = rng.choice(hovedstole_keys)
+
+        row = [None] * len(HEADER)
+        row[columns['ForretnPartner']] = fp
+        row[columns['Navn']] = f"Navn {fp}"
+        row[columns['Aftale']] = aftale
+        row[columns['Bilagsnummer']] = str(100_000_000_000 + index)
+        row[columns['Indholdsart']] = rng.choice(('VAND', 'RENO', 'KONT', 'SKAT', 'PARK'))
+        row[columns['Hovedtransakt.']] = rng.choice(('ZGBY', 'ZREN'))
+        row[columns['Deltransakt.']] = rng.choice(('0010', '0020'))
+        row[columns['Forfaldsdato']] = today - datetime.timedelta(days=rng.randrange(30, 3000))
+        row[columns['Forældelsesdato']] = today - datetime.timedelta(days=rng.randrange(1, 3000))
+        row[columns['Oprindeligt beløb']] = round(rng.uniform(10, 10_000), 2)
+        row[columns['Restbeløb']] = round(rng.uniform(0, 10_000), 2)
+        row[columns['Valuta']] = 'DKK'
+
+        match branch:
+            case 'medhaefter':
+                row[columns['Medhæfter']] = '20000001'
+            case 'mo_28':
+                row[columns['RIM Aftale']], row[columns['RIM aftalestatus']] = 'MO', '28'
+            case 'remove_indholdsart':
+                row[columns['Indholdsart']] = rng.choice(('BØVO', 'EJEN', 'BYGS', 'PLAL'))
+            case 'aftale_type':
+                row[columns['Aftale type']] = 'RATE'
+            case 'hovedstol':
+                row[columns['Hovedtransakt.']] = 'ZHOV'
+                hovedstole_keys.append((fp, aftale))
+            case 'rykkespaer_n':
+                row[columns['RykkespærÅrsag']] = 'N'
+            case 'not_expired':
+                row[columns['Forældelsesdato']] = rng.choice((None, today + datetime.timedelta(days=rng.randrange(1, 3000))))
+            case 'in_21':
+                row[columns['RIM Aftale']], row[columns['RIM aftalestatus']] = 'IN', '21'
+            case 'special':
+                row[columns['Indholdsart']] = rng.choice(('DAGI', 'DAG2', 'SFO2'))
+            case 'rykkerspaerret':
+                row[columns['Ratespecifikation']] = 'LRT'
+
+        if branch in ('rykkerspaerret', 'special', 'kept'):
+            # A rykkerspærre on the aftale removes the row, one on another aftale of the ForretnPartner doesn't.
+            aftaler = fixture.fplka.setdefault(fp, set())
+            aftaler.add(aftale if branch == 'rykkerspaerret' else str(3_000_000 + index))
+            if branch != 'rykkerspaerret':
+                fixture.expected.add((aftale, row[columns['Bilagsnummer']], fp))
+
+        fixture.rows.append(tuple(row))
+
+    rng.shuffle(fixture.rows)
+    return fixture
@@ -0,0 +1,115 @@
+"""Tests of the FPLKA parser and waiting for SAP to write the export"""
+import os
+import tempfile
+import threading
+import time
+import unittest
+from forbered_afskrivining_af_foraeldede_sagsomkostninger import auxiliary
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.tests.legacy_auxiliary import legacy_get_fp_and_aftale_from_file
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.tests.synthetic import generate_fplka_lines, write_fplka_export
+
+
+class TestFplkaParser(unittest.TestCase):
+    """Tests of the FPLKA parser"""
+    def test_parse(self):
+        """The aftaler of each ForretnPartner are read, with leading zeros and the last 12 digits removed."""
+        lines = [
+            "\tForretnPartner:\t\t12345678\n",
+            "\tAftale\tSpærtype\n",
+            "\t0002000001000000000001\t51\n",
+            "\t0002000002000000000002\t51\n",
+            "\n",
+            "\tForretnPartner:\t\t87654321\n",
+        ]
+
+        fp_aftale = auxiliary.read_fp_and_aftale(lines)
+
+        self.assertEqual(fp_aftale, {'12345678': frozenset({'2000001', '2000002'}), '87654321': frozenset()})
+
+    def test_matches_legacy(self):
+        """The result has the same content as the original parser."""
+        data = "".join(generate_fplka_lines(500, seed=3))
+
+        fp_aftale = auxiliary.get_fp_and_aftale_from_file(data)
+        legacy = legacy_get_fp_and_aftale_from_file(data)
+
+        self.assertEqual(fp_aftale, {fp: frozenset(aftaler) for fp, aftaler in legacy.items()})
+
+    def test_malformed_lines(self):
+        """Short lines, lines without tabs and aftaler before the first ForretnPartner are skipped."""
+        lines = [
+            "\t0002000009000000000009\t51\n",
+            "x",
+            "",
+            "\n",
+            "\tForretnPartner:\t\t12345678\n",
+            "\t",
+            "12345",
+            "\t0002000001000000000001\t51\n",
+        ]
+
+        fp_aftale = auxiliary.read_fp_and_aftale(lines)
+
+        self.assertEqual(fp_aftale, {'12345678': frozenset({'2000001'})})
+
+    def test_read_file(self):
+        """A cp1252 file is read line by line."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "fplka.txt")
+            write_fplka_export(path, 100)
+
+            fp_aftale = auxiliary.read_fp_and_aftale_file(path)
+
+        self.assertEqual(fp_aftale, auxiliary.read_fp_and_aftale(generate_fplka_lines(100)))
+        self.assertEqual(len(fp_aftale), 100)
+
+
+class TestWaitForFile(unittest.TestCase):
+    """Tests of waiting for SAP to write the export"""
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()  # pylint: disable=(consider-using-with)
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "fplka.txt")
+
+    def _slow_writer(self, lines: list[str], pause: float) -> threading.Thread:
+        """Write the lines one at a time with a pause in between, like SAP on a slow day."""
+        def write():
+            with open(self.path, 'w', encoding='cp1252', newline='') as file:
+                for line in lines:
+                    time.sleep(pause)
+                    file.write(line)
+                    file.flush()
+
+        thread = threading.Thread(target=write)
+        thread.start()
+        self.addCleanup(thread.join)
+        return thread
+
+    def test_slow_writer(self):
+        """The file is read when the writer is done, not when it is created."""
+        lines = list(generate_fplka_lines(3))
+        writer = self._slow_writer(lines, pause=0.05)
+
+        auxiliary.wait_for_file(self.path, timeout=10, stable_seconds=0.3, initial_delay=0.01, max_delay=0.05)
+
+        self.assertFalse(writer.is_alive())
+        self.assertEqual(auxiliary.read_fp_and_aftale_file(self.path), auxiliary.read_fp_and_aftale(lines))
+
+    def test_empty_file_times_out(self):
+        """A file that stays empty is never done."""
+        with open(self.path, 'w', encoding='cp1252'):
+            pass
+
+        with self.assertRaises(TimeoutError):
+            auxiliary.wait_for_file(self.path, timeout=0.3, stable_seconds=0.05, initial_delay=0.01)
+
+    def test_still_writing_times_out(self):
+        """A file that keeps growing past the timeout raises a TimeoutError."""
+        self._slow_writer(["line\n"] * 20, pause=0.05)
+
+        with self.assertRaises(TimeoutError):
+            auxiliary.wait_for_file(self.path, timeout=0.3, stable_seconds=0.2, initial_delay=0.01, max_delay=0.02)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+"""Tests of the columnar engine against the row-at-a-time rules"""
+import datetime
+import unittest
+from forbered_afskrivining_af_foraeldede_sagsomkostninger import excel_process
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.tests.synthetic import HEADER, generate_rows, write_workbook
+
+try:
+    from forbered_afskrivining_af_foraeldede_sagsomkostninger import columnar
+except ImportError:
+    columnar = None
+
+
+@unittest.skipIf(columnar is None, "pandas is not installed")
+class TestColumnar(unittest.TestCase):
+    """Compare the columnar engine with the row-at-a-time rules."""
+    def test_combine(self):
+        """Steps 2-15 give exactly the same rows, in the same order."""
+        rows = generate_rows(5000, seed=1)
+        expected = excel_process.filter_rows(HEADER, rows)
+        self.assertTrue(expected)
+        self.assertEqual(columnar.reduce_rows(HEADER, rows).combine(), expected)
+
+    def test_reduce_rows(self):
+        """Steps 2-12 give the same intermediate result."""
+        rows = generate_rows(3000, seed=2)
+        self.assertEqual(columnar.reduce_rows(HEADER, rows), excel_process.reduce_rows(HEADER, rows))
+
+    def test_cell_values(self):
+        """Missing values, numbers, errors and Excel serial dates are treated like the row-at-a-time rules do."""
+        today = datetime.datetime.today()
+
+        def row(fp, aftale, bilagsnummer, values: dict | None = None):
+            """A sagsomkostning with an expired Forældelsesdato, unless other values are given."""
+            cells = dict.fromkeys(HEADER)
+            cells.update({'ForretnPartner': fp, 'Aftale': aftale, 'Bilagsnummer': bilagsnummer, 'Hovedtransakt.': 'ZGBY',
+                          'Indholdsart': 'PARK', 'Forældelsesdato': today - datetime.timedelta(days=10)})
+            cells.update(values or {})
+            return tuple(cells[name] for name in HEADER)
+
+        hovedstol = dict.fromkeys(HEADER)
+        hovedstol.update({'Aftale': 2000002, 'Bilagsnummer': 9, 'Indholdsart': 'PARK'})
+        rows = [
+            row(10000001, 2000001, 1),
+            row(None, 2000002, 2),
+            row('10000003', '2000003', '3', {'Forældelsesdato': 45000}),
+            row('10000004', '2000004', '4', {'Forældelsesdato': '#VALUE!'}),
+            row('10000005', '2000005', '5', {'Forældelsesdato': 10**9}),
+            row('10000006', '2000006', '6', {'Forældelsesdato': None}),
+            row('10000007', '2000007', '7', {'Forældelsesdato': today + datetime.timedelta(days=1)}),
+            row('10000008', '2000008', '8', {'Indholdsart': 'DAGI'}),
+            # A hovedstol matching the row with a missing ForretnPartner
+            tuple(hovedstol[name] for name in HEADER),
+        ]
+
+        expected = excel_process.filter_rows(HEADER, rows)
+        self.assertEqual(expected, [(2000001, 1, 10000001), ('2000003', '3', '10000003'), ('2000008', '8', '10000008')])
+        self.assertEqual(columnar.reduce_rows(HEADER, rows).combine(), expected)
+
+    def test_empty(self):
+        """A sheet with only a header gives no rows."""
+        self.assertEqual(columnar.reduce_rows(HEADER, []).combine(), [])
+
+    def test_read_sheets(self):
+        """read_sheets gives the same result with both engines and both backends."""
+        rows = generate_rows(3000, seed=3)
+        files = [write_workbook(rows[:1500]), write_workbook(rows[1500:])]
+        expected = excel_process.read_sheets(files)
+        for backend in excel_process.BACKENDS:
+            for file in files:
+                file.seek(0)
+            self.assertEqual(excel_process.read_sheets(files, backend=backend, engine='columnar'), expected)
+
+
+class TestEngine(unittest.TestCase):
+    """Tests of choosing the engine."""
+    def test_unknown_engine(self):
+        """An unknown engine is rejected."""
+        with self.assertRaises(ValueError):
+            excel_process.read_sheets([write_workbook([])], engine='spark')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,7 +3,8 @@ import unittest
 import os
 from unittest.mock import MagicMock
 from itk_dev_shared_components.graph import authentication
-from forbered_afskrivining_af_foraeldede_sagsomkostninger.process import get_emails
+from forbered_afskrivining_af_foraeldede_sagsomkostninger import graph_api
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.process import download_batch, get_emails
 
 class IntegrationTestEmails(unittest.TestCase):
     """Integration test of email attachment"""
@@ -25,6 +26,9 @@ class IntegrationTestEmails(unittest.TestCase):
                                                                      client_id=client_id,
                                                                      tenant_id=tenant_id)
 
-        attachment_bytes_list, kmd_emails = get_emails(orchestrator_connection=mock_open_rchestrator, graph_access=graph_access)
-        self.assertIsNotNone(attachment_bytes_list)
-        self.assertIsNotNone(kmd_emails)
+        with graph_api.GraphClient(graph_access) as graph_client:
+            batches = get_emails(orchestrator_connection=mock_open_rchestrator, graph_client=graph_client)
+            for batch in batches:
+                attachment_bytes_list = download_batch(mock_open_rchestrator, graph_client, batch)
+                self.assertEqual(len(attachment_bytes_list), len(batch.attachments))
+                self.assertTrue(batch.emails)
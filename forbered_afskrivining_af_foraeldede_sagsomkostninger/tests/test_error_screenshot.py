@@ -0,0 +1,121 @@
+"""Tests of sending error reports in the background against a local SMTP stand-in"""
+import importlib.util
+import random
+import socket
+import unittest
+from forbered_afskrivining_af_foraeldede_sagsomkostninger import error_screenshot
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.tests.stub_orchestrator import StubOrchestratorConnection
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.tests.stub_smtp import StubSmtpServer
+
+
+def _raise(error: Exception) -> Exception:
+    """Raise and catch the error, so it has a traceback."""
+    try:
+        raise error
+    except Exception:  # pylint: disable=(broad-exception-caught)
+        pass
+    return error
+
+
+def _noise(width: int, height: int):
+    """A screenshot that is hard to compress, like a busy high-DPI screen."""
+    from PIL import Image  # pylint: disable=(import-outside-toplevel)
+    return Image.frombytes('RGB', (width, height), random.Random(0).randbytes(width * height * 3))
+
+
+@unittest.skipIf(importlib.util.find_spec('PIL') is None, "Pillow is not installed")
+class TestErrorReporter(unittest.TestCase):
+    """Tests of sending error reports in the background"""
+    def setUp(self):
+        self.server = self.enterContext(StubSmtpServer())
+        self.orchestrator_connection = StubOrchestratorConnection()
+
+    def reporter(self, **kwargs) -> error_screenshot.ErrorReporter:
+        """A reporter sending to the stand-in, with a small generated screenshot."""
+        kwargs.setdefault('grab', lambda: _noise(320, 200))
+        return error_screenshot.ErrorReporter("errors@example.com", "Test process", self.orchestrator_connection,
+                                              smtp_server=self.server.host, smtp_port=self.server.port, starttls=False, **kwargs)
+
+    def test_report(self):
+        """The report has the error in the text and the screenshot as a JPEG referenced from the HTML."""
+        with self.reporter() as reporter:
+            self.assertTrue(reporter.report(_raise(ValueError("Something <failed>"))))
+
+        self.assertEqual(reporter.sent, 1)
+        (message,) = self.server.messages
+        self.assertEqual(message['subject'], "Error screenshot: Test process")
+        self.assertIn("ValueError: Something <failed>", message.get_body(('plain',)).get_content())
+
+        html = message.get_body(('html',))
+        self.assertIn("Something &lt;failed&gt;", html.get_content())
+        (image,) = [part for part in message.walk() if part.get_content_type() == 'image/jpeg']
+        self.assertIn(f'src="cid:{image["Content-ID"][1:-1]}"', html.get_content())
+
+    def test_non_blocking(self):
+        """Reporting returns before the server has accepted the report."""
+        self.server.accepting.clear()
+        with self.reporter() as reporter:
+            self.assertTrue(reporter.report(_raise(ValueError("Slow"))))
+            self.assertEqual(self.server.messages, [])
+            self.server.accepting.set()
+        self.assertEqual(len(self.server.messages), 1)
+
+    def test_duplicates(self):
+        """The same error is reported once per run, and the reports share one SMTP connection."""
+        with self.reporter() as reporter:
+            for _ in range(3):
+                reporter.report(_raise(ValueError("Same")))
+            reporter.report(_raise(KeyError("Other")))
+
+        self.assertEqual((reporter.sent, reporter.duplicates), (2, 2))
+        self.assertEqual(len(self.server.messages), 2)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_bounded_queue(self):
+        """Reports beyond the size of the queue are dropped while the server doesn't accept them."""
+        self.server.accepting.clear()
+        with self.reporter(queue_size=1) as reporter:
+            results = [reporter.report(_raise(ValueError(i))) for i in range(4)]
+            self.server.accepting.set()
+
+        self.assertEqual(results.count(False), reporter.dropped)
+        self.assertGreaterEqual(reporter.dropped, 2)
+        self.assertEqual(len(self.server.messages), reporter.sent)
+
+    def test_reconnect_after_error(self):
+        """A connection that failed to send a report is closed, and the next report connects again."""
+        self.server.rejecting = 1
+        with self.reporter(grab=None) as reporter:
+            reporter.report(_raise(ValueError("Rejected")))
+            reporter.report(_raise(ValueError("Sent")))
+
+        self.assertEqual(reporter.sent, 1)
+        self.assertEqual(self.server.connections, 2)
+        (message,) = self.server.messages
+        self.assertIn("ValueError: Sent", message.get_body(('plain',)).get_content())
+
+    def test_size_cap(self):
+        """A large screenshot is downscaled and compressed below the size cap."""
+        screenshot = _noise(3840, 2160)
+        jpeg = error_screenshot.compress_screenshot(screenshot, max_width=1920, max_bytes=200 * 1024)
+
+        self.assertLessEqual(len(jpeg), 200 * 1024)
+        self.assertTrue(jpeg.startswith(b'\xff\xd8'))
+
+    def test_send_error(self):
+        """An unreachable server is logged, not raised."""
+        with socket.socket() as unused:
+            unused.bind(('127.0.0.1', 0))
+            port = unused.getsockname()[1]
+        reporter = error_screenshot.ErrorReporter("errors@example.com", "Test process", self.orchestrator_connection, grab=None,
+                                                  smtp_server='127.0.0.1', smtp_port=port, starttls=False)
+        reporter.report(_raise(ValueError("Unsent")))
+        reporter.close()
+
+        self.assertEqual(reporter.sent, 0)
+        self.assertTrue(any(level == 'error' and "Could not send the error report" in message
+                            for level, message in self.orchestrator_connection.logs))
+
+
+if __name__ == '__main__':
+    unittest.main()
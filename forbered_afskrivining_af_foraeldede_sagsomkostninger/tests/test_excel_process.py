@@ -0,0 +1,129 @@
+"""Tests of the Alteryx filtering in excel_process"""
+import datetime
+import subprocess
+import sys
+import tempfile
+import unittest
+from io import BytesIO
+from unittest.mock import patch
+import openpyxl
+from forbered_afskrivining_af_foraeldede_sagsomkostninger import excel_process
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.excel_process import filter_rows, read_sheets
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.result_cache import ResultCache
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.tests.legacy_excel_process import legacy_filter_rows
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.tests.synthetic import HEADER, generate_rows, write_workbook
+
+
+class TestExcelProcess(unittest.TestCase):
+    """Compare the rule engine with the original implementation of the Alteryx steps."""
+    def test_filter_rows_matches_legacy(self):
+        """The compiled rules must produce exactly the same rows, in the same order."""
+        rows = generate_rows(5000, seed=1)
+        expected = legacy_filter_rows(HEADER, rows)
+        self.assertTrue(expected)
+        self.assertEqual(filter_rows(HEADER, rows), expected)
+
+    def test_filter_rows_column_order(self):
+        """Columns are looked up by name, so the position in the sheet does not matter."""
+        rows = generate_rows(2000, seed=2)
+        order = list(reversed(range(len(HEADER))))
+        header = tuple(HEADER[i] for i in order)
+        shuffled = [tuple(row[i] for i in order) for row in rows]
+        self.assertEqual(filter_rows(header, shuffled), legacy_filter_rows(HEADER, rows))
+
+    def test_filter_rows_missing_column(self):
+        """A header without the columns used by the rules is rejected."""
+        header = tuple(name for name in HEADER if name != 'Ratespecifikation')
+        with self.assertRaises(ValueError):
+            filter_rows(header, [])
+
+    def test_rules_version(self):
+        """The version of the rules is the same in every run, so cached results are reused by the next run."""
+        statement = "from forbered_afskrivining_af_foraeldede_sagsomkostninger import excel_process; print(excel_process.rules_version())"
+        result = subprocess.run([sys.executable, '-c', statement], capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip(), excel_process.rules_version())
+
+    def test_reduce_rows_shares_values(self):
+        """Equal FP and Aftale values are kept as one object, even when every cell is read as a new object."""
+        rows = [tuple(''.join(value) if isinstance(value, str) else value for value in row) for row in generate_rows(3000, seed=7)]
+        result = excel_process.reduce_rows(HEADER, rows)
+
+        values = [value for key in result.hovedstole_keys for value in key]
+        for candidates in (result.not_special_content_type_rows, result.special_content_type_rows):
+            values += candidates.aftale + candidates.fp
+        self.assertEqual(len({id(value) for value in values}), len(set(values)))
+        self.assertEqual(result.combine(), legacy_filter_rows(HEADER, rows))
+
+    def test_read_sheets(self):
+        """Multiple workbooks are merged before filtering."""
+        rows = generate_rows(3000, seed=3)
+        files = [write_workbook(rows[:1000]), write_workbook(rows[1000:])]
+        self.assertEqual(read_sheets(files), legacy_filter_rows(HEADER, rows))
+
+    def test_read_sheets_workers(self):
+        """Reading the files in worker processes gives the same result as reading them one at a time."""
+        rows = generate_rows(4000, seed=4)
+        files = [write_workbook(rows[i:i + 1000]) for i in range(0, 4000, 1000)]
+        sequential = read_sheets(files)
+        for file in files:
+            file.seek(0)
+        self.assertEqual(read_sheets(files, workers=3), sequential)
+
+    def test_read_sheets_xml_backend(self):
+        """The XML reader gives the same result as openpyxl."""
+        rows = generate_rows(3000, seed=6)
+        files = [write_workbook(rows[:1500]), write_workbook(rows[1500:])]
+        expected = read_sheets(files)
+        for file in files:
+            file.seek(0)
+        self.assertEqual(read_sheets(files, backend='xml'), expected)
+
+    def test_read_sheets_out_of_range_date(self):
+        """Forældelsesdato outside the limits for dates is treated as empty in step 11, with both backends."""
+        row = dict.fromkeys(HEADER)
+        row.update({'ForretnPartner': '10000001', 'Aftale': '2000001', 'Bilagsnummer': '100000000001',
+                    'Indholdsart': 'DAGI', 'Hovedtransakt.': 'ZGBY', 'Forældelsesdato': datetime.datetime(2020, 1, 1)})
+        out_of_range = {**row, 'Bilagsnummer': '100000000002', 'Forældelsesdato': -693596}
+
+        for backend in ('openpyxl', 'xml'):
+            wb = openpyxl.Workbook()
+            ws = wb.active
+            ws.append(HEADER)
+            ws.append(tuple(row.values()))
+            ws.append(tuple(out_of_range.values()))
+            ws.cell(row=3, column=HEADER.index('Forældelsesdato') + 1).number_format = 'yyyy-mm-dd'
+            file = BytesIO()
+            wb.save(file)
+            file.seek(0)
+
+            self.assertEqual(read_sheets([file], backend=backend), [('2000001', '100000000001', '10000001')])
+
+    def test_read_sheets_cache(self):
+        """Files found in the cache are not read again."""
+        rows = generate_rows(2000, seed=7)
+        files = [write_workbook(rows[:1000]), write_workbook(rows[1000:])]
+        expected = legacy_filter_rows(HEADER, rows)
+
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ResultCache(directory, 2**20, datetime.timedelta(days=1))
+            self.assertEqual(read_sheets(files, cache=cache), expected)
+
+            with patch.object(excel_process, '_reduce_file', side_effect=AssertionError("File was read again")):
+                self.assertEqual(read_sheets(files, cache=cache), expected)
+
+    def test_read_sheets_header_mismatch(self):
+        """Files with a different header than the first file are rejected."""
+        rows = generate_rows(10)
+        header = HEADER[:-1] + ('Anden tekst',)
+        files = [write_workbook(rows), write_workbook(rows, header=header)]
+        with self.assertRaises(ValueError):
+            read_sheets(files)
+
+    def test_read_sheets_no_files(self):
+        """An empty list of files is rejected."""
+        with self.assertRaises(ValueError):
+            read_sheets([])
+
+
+if __name__ == '__main__':
+    unittest.main()
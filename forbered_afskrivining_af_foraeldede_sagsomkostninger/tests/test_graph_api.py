@@ -0,0 +1,176 @@
+"""Tests of the Graph calls against a local stub server"""
+import io
+import os
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+from forbered_afskrivining_af_foraeldede_sagsomkostninger import graph_api
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.tests.stub_graph import StubGraphServer
+
+USER = 'itk-rpa@mkb.aarhus.dk'
+FOLDER = "Indbakke/Afskrivning af forældede sagsomkostninger"
+SENDER = 'kan-ikke-besvares@kmd.dk'
+SUBJECT = 'Liste til forældede sagsomkostninger'
+
+
+def _attachment(name: str, email: object = None, size: int = 0) -> SimpleNamespace:
+    return SimpleNamespace(name=name, email=email, size=size)
+
+
+class TestGraphApi(unittest.TestCase):
+    """Tests of the Graph calls against a local stub server"""
+    def setUp(self):
+        self.server = StubGraphServer(page_size=3)
+        self.enterContext(self.server)
+        self.folder_id = self.server.add_folder(FOLDER)
+
+        graph_access = MagicMock()
+        graph_access.get_access_token.return_value = "token"
+        self.client = graph_api.GraphClient(graph_access, base_url=self.server.url, backoff=0)
+        self.addCleanup(self.client.close)
+        self.orchestrator_connection = MagicMock()
+
+    def _add_kmd_message(self, name: str, content: bytes = b"content", delay: float = 0) -> str:
+        message_id = self.server.add_message(self.folder_id, SENDER, f"{SUBJECT} {name}")
+        self.server.add_attachment(message_id, name, content, delay)
+        return message_id
+
+    def test_group_attachments(self):
+        """The attachments are grouped by date, oldest first, and sorted by name."""
+        email_1, email_2 = SimpleNamespace(), SimpleNamespace()
+        attachments = [_attachment(name, email, size) for name, email, size in (
+            ('20231024RPA03_02_02.XLSX', email_2, 20), ('20231017RPA03_01_01.XLSX', email_1, 5), ('20231024RPA03_01_02.XLSX', email_2, 10))]
+
+        batches = graph_api.group_attachments(attachments)
+
+        self.assertEqual([batch.file_date for batch in batches], ['20231017', '20231024'])
+        self.assertEqual([att.name for att in batches[1].attachments], ['20231024RPA03_01_02.XLSX', '20231024RPA03_02_02.XLSX'])
+        self.assertEqual(batches[1].emails, [email_2])
+        self.assertEqual(batches[1].size, 30)
+
+    def test_check_count(self):
+        """The number of attachments of a date must match the number embedded in the file name."""
+        attachments = [_attachment(name) for name in ('20231017RPA03_01_02.XLSX', '20231024RPA03_01_01.XLSX')]
+        older, newer = graph_api.group_attachments(attachments)
+
+        newer.check_count()
+        with self.assertRaisesRegex(ValueError, "20231017"):
+            older.check_count()
+
+    def test_list_messages(self):
+        """Only matching emails are listed, across pages."""
+        expected = [self._add_kmd_message(f"file{i}.XLSX") for i in range(7)]
+        self.server.add_message(self.folder_id, "someone@else.dk", SUBJECT)
+        self.server.add_message(self.folder_id, SENDER, f"{SUBJECT} without attachment")
+        self._add_kmd_message("other.XLSX")
+        self.server.messages[expected[-1]]['subject'] = "Anden liste"
+        expected.pop()
+        self.server.add_message(self.server.add_folder("Indbakke/Andet"), SENDER, SUBJECT)
+
+        messages = self.client.list_messages(USER, self.folder_id, SENDER, SUBJECT)
+
+        self.assertEqual([message.id for message in messages], expected + ['message9'])
+        self.assertTrue(all(message.sender == SENDER and message.user == USER for message in messages))
+
+    def test_stub_folder_path(self):
+        """The stand-in for mail.get_folder_id_from_path finds nested folders, and raises a ValueError for a missing folder."""
+        self.assertEqual(self.server.get_folder_id_from_path(USER, FOLDER), self.folder_id)
+        with self.assertRaises(ValueError):
+            self.server.get_folder_id_from_path(USER, "Indbakke/Findes ikke")
+
+    def test_list_attachments(self):
+        """Attachments of more emails than fit in one batch are listed in the order of the emails."""
+        for i in range(25):
+            self._add_kmd_message(f"file{i}.XLSX")
+        messages = self.client.list_messages(USER, self.folder_id, SENDER, SUBJECT)
+
+        attachments = self.client.list_attachments(messages)
+
+        self.assertEqual([[att.name for att in message_attachments] for message_attachments in attachments],
+                         [[f"file{i}.XLSX"] for i in range(25)])
+        self.assertEqual(sum(1 for method, path, _ in self.server.http_requests if path == '/$batch'), 2)
+
+    def test_delete_messages(self):
+        """Emails are moved to Deleted Items in batches of at most 20."""
+        for i in range(45):
+            self._add_kmd_message(f"file{i}.XLSX")
+        messages = self.client.list_messages(USER, self.folder_id, SENDER, SUBJECT)
+
+        self.client.delete_messages(messages)
+
+        self.assertEqual(self.client.list_messages(USER, self.folder_id, SENDER, SUBJECT), [])
+        self.assertTrue(all(message['folder'] == 'deleteditems' for message in self.server.messages.values()))
+        self.assertTrue(all(message.id.endswith('-moved') for message in messages))
+        self.assertEqual(sum(1 for method, path, _ in self.server.http_requests if path == '/$batch'), 3)
+
+    def test_delete_messages_permanent(self):
+        """Emails can be deleted permanently."""
+        for i in range(3):
+            self._add_kmd_message(f"file{i}.XLSX")
+        messages = self.client.list_messages(USER, self.folder_id, SENDER, SUBJECT)
+
+        self.client.delete_messages(messages, permanent=True)
+
+        self.assertEqual(self.server.messages, {})
+
+    def test_throttling(self):
+        """Throttled requests are retried, both on their own and inside a batch."""
+        for i in range(5):
+            self._add_kmd_message(f"file{i}.XLSX")
+
+        self.server.throttle = 2
+        messages = self.client.list_messages(USER, self.folder_id, SENDER, SUBJECT)
+        self.assertEqual(len(messages), 5)
+
+        self.server.throttle = 3
+        self.client.delete_messages(messages)
+        self.assertTrue(all(message['folder'] == 'deleteditems' for message in self.server.messages.values()))
+
+    def test_throttling_gives_up(self):
+        """A request that is still throttled after max_retries raises an HTTPError."""
+        self.client.max_retries = 2
+        self.server.throttle = 3
+
+        with self.assertRaises(graph_api.requests.HTTPError):
+            self.client.list_messages(USER, self.folder_id, SENDER, SUBJECT)
+
+    def test_download_attachments(self):
+        """Attachments are returned in the given order, even when later ones finish first."""
+        for i in range(4):
+            self._add_kmd_message(f"file{i}.XLSX", f"content {i}".encode(), delay=0.1 * (4 - i))
+        messages = self.client.list_messages(USER, self.folder_id, SENDER, SUBJECT)
+        attachments = [message_attachments[0] for message_attachments in self.client.list_attachments(messages)]
+
+        downloads = graph_api.download_attachments(attachments, self.client, self.orchestrator_connection, workers=4)
+
+        self.assertEqual([data.getvalue() for data in downloads], [f"content {i}".encode() for i in range(4)])
+        self.assertTrue(all(isinstance(data, io.BytesIO) for data in downloads))
+        self.assertTrue(all(auth == "Bearer token" for _, _, auth in self.server.http_requests))
+        # One trace per attachment and one in total
+        self.assertEqual(self.orchestrator_connection.log_trace.call_count, 5)
+
+    def test_download_attachments_spool_to_disk(self):
+        """Attachments can be written to temporary files."""
+        for i in range(2):
+            self._add_kmd_message(f"file{i}.XLSX", bytes([i]) * 100_000)
+        messages = self.client.list_messages(USER, self.folder_id, SENDER, SUBJECT)
+        attachments = [message_attachments[0] for message_attachments in self.client.list_attachments(messages)]
+
+        downloads = graph_api.download_attachments(attachments, self.client, self.orchestrator_connection, spool_to_disk=True)
+
+        for i, path in enumerate(downloads):
+            self.assertTrue(os.path.isfile(path))
+            with open(path, 'rb') as file:
+                self.assertEqual(file.read(), bytes([i]) * 100_000)
+
+    def test_download_attachments_error(self):
+        """HTTP errors are raised."""
+        message = graph_api.Message(USER, "unknown", "", SENDER, SUBJECT, True)
+        attachment = graph_api.Attachment(message, "unknown", "file.XLSX", 1)
+
+        with self.assertRaises(graph_api.requests.HTTPError):
+            graph_api.download_attachments([attachment], self.client, self.orchestrator_connection)
+
+
+if __name__ == '__main__':
+    unittest.main()
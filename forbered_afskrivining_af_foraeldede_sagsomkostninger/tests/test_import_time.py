@@ -0,0 +1,84 @@
+"""Tests of the import time of the robot, so a cold start stays fast.
+Every trigger starts a new interpreter, and a run without emails stops right after step 1,
+so the heavy libraries must only be imported by the steps that use them.
+"""
+import subprocess
+import sys
+import unittest
+
+try:
+    from forbered_afskrivining_af_foraeldede_sagsomkostninger import process
+except ImportError:
+    process = None
+
+PACKAGE = 'forbered_afskrivining_af_foraeldede_sagsomkostninger'
+
+# Modules only imported by the steps that use them.
+DEFERRED = ('openpyxl', 'PIL', 'numpy', 'pandas', 'pythoncom', 'win32com', 'itk_dev_shared_components.sap.multi_session',
+            'itk_dev_shared_components.sap.sap_login')
+
+# The maximum total import time in seconds, of the fastest of ATTEMPTS imports. The budgets are about five times
+# the measured import time, 0.21 s for the modules and 0.26 s for the framework, which includes OpenOrchestrator
+# and the Graph components. Taking the fastest import keeps a busy machine from failing the test.
+FRAMEWORK_BUDGET = 1.5
+MODULES_BUDGET = 1.0
+ATTEMPTS = 3
+
+
+def import_times(statement: str, attempts: int = 1) -> tuple[float, dict[str, float]]:
+    """Run an import statement in a new interpreter with -X importtime.
+
+    Args:
+        statement: The import statement.
+        attempts (optional): The number of times to import. The fastest attempt is kept.
+
+    Returns:
+        The total import time in seconds, and the cumulative import time in seconds of every imported module by name.
+    """
+    fastest = (float('inf'), {})
+    for _ in range(attempts):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement], capture_output=True, text=True, check=True)
+        total = 0
+        times = {}
+        for line in result.stderr.splitlines():
+            # import time: self [us] | cumulative | imported package
+            fields = line.removeprefix("import time:").split("|")
+            if len(fields) != 3 or not fields[0].strip().isdigit():
+                continue
+            total += int(fields[0]) / 1_000_000
+            times[fields[2].strip()] = int(fields[1]) / 1_000_000
+        fastest = min(fastest, (total, times), key=lambda attempt: attempt[0])
+    return fastest
+
+
+class TestImportTime(unittest.TestCase):
+    """Tests of the import time of the robot"""
+    def assert_deferred(self, times: dict[str, float]):
+        """Assert that none of the deferred modules are imported."""
+        self.assertEqual([name for name in DEFERRED if name in times], [])
+
+    def test_modules(self):
+        """The modules imported at the start of every run are fast to import and don't import the heavy libraries."""
+        modules = ('auxiliary', 'config', 'error_screenshot', 'graph_api', 'incremental_index', 'metrics', 'pipeline',
+                   'queue_insert', 'reset', 'result_cache')
+        total, times = import_times(f"from {PACKAGE} import {', '.join(modules)}", ATTEMPTS)
+
+        self.assert_deferred(times)
+        self.assertLess(total, MODULES_BUDGET)
+
+    def test_excel_process(self):
+        """openpyxl is imported with the Excel rules."""
+        _, times = import_times(f"import {PACKAGE}.excel_process")
+        self.assertIn('openpyxl', times)
+
+    @unittest.skipIf(process is None, "The robot's dependencies are not installed")
+    def test_framework(self):
+        """The entry point is imported within budget without the heavy libraries."""
+        total, times = import_times(f"import {PACKAGE}.framework", ATTEMPTS)
+
+        self.assert_deferred(times)
+        self.assertLess(total, FRAMEWORK_BUDGET)
+
+
+if __name__ == '__main__':
+    unittest.main()
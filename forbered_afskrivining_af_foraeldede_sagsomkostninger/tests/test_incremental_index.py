@@ -0,0 +1,88 @@
+"""Tests of the index of rows seen by earlier runs"""
+import datetime
+import os
+import tempfile
+import unittest
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.incremental_index import IncrementalIndex
+
+WEEK = datetime.timedelta(days=7)
+RUN_TIME = datetime.datetime(2023, 10, 24, 6, 0)
+
+
+def _rows(start: int, stop: int) -> list[tuple[str, str, str]]:
+    return [(str(2_000_000 + i), str(100_000_000_000 + i), str(10_000_000 + i % 100)) for i in range(start, stop)]
+
+
+class TestIncrementalIndex(unittest.TestCase):
+    """Tests of the index of rows seen by earlier runs"""
+    def setUp(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())  # pylint: disable=(consider-using-with)
+        self.path = os.path.join(directory, "index.sqlite3")
+        self.index = IncrementalIndex(self.path, retention=datetime.timedelta(days=30))
+
+    def test_first_run(self):
+        """Every row is new when the index is empty, and comparing doesn't change the index."""
+        rows = _rows(0, 100)
+
+        delta = self.index.compare(rows, RUN_TIME)
+
+        self.assertEqual(delta.new_rows, rows)
+        self.assertEqual((delta.unchanged, delta.disappeared), (0, 0))
+        self.assertEqual(len(self.index), 0)
+
+    def test_delta(self):
+        """Only the rows not seen before are new, in their original order, and rows gone since the latest run are counted."""
+        self.index.update(_rows(0, 100), _rows(0, 100), RUN_TIME)
+        rows = _rows(150, 160) + _rows(20, 100) + _rows(100, 110)
+
+        delta = self.index.compare(rows, RUN_TIME + WEEK)
+
+        self.assertEqual(delta.new_rows, _rows(150, 160) + _rows(100, 110))
+        self.assertEqual((delta.unchanged, delta.disappeared), (80, 20))
+        self.assertIn("20 new, 0 queued again after the retention period, 80 unchanged and 20 disappeared rows", delta.report())
+
+    def test_disappeared_latest_run(self):
+        """Only rows of the latest run count as disappeared, not rows gone in earlier runs."""
+        self.index.update(_rows(0, 100), _rows(0, 100), RUN_TIME)
+        self.index.update(_rows(0, 50), [], RUN_TIME + WEEK)
+
+        self.assertEqual(self.index.compare(_rows(0, 40), RUN_TIME + 2 * WEEK).disappeared, 10)
+
+    def test_retention(self):
+        """Rows not seen within the retention period are forgotten and are new again."""
+        self.index.update(_rows(0, 100), _rows(0, 100), RUN_TIME)
+        self.index.update(_rows(0, 50), [], RUN_TIME + 3 * WEEK)
+
+        forgotten = self.index.update(_rows(0, 50), _rows(0, 50), RUN_TIME + 5 * WEEK)
+
+        self.assertEqual(forgotten, 50)
+        self.assertEqual(len(self.index), 50)
+        self.assertEqual(self.index.compare(_rows(0, 100), RUN_TIME + 6 * WEEK).new_rows, _rows(50, 100))
+
+    def test_row_stays_on_list(self):
+        """A row that stays on the list is queued again when it was queued more than the retention period ago,
+        and then not again until the retention period has passed once more."""
+        self.index.update(_rows(0, 10), _rows(0, 10), RUN_TIME)
+        for week in range(1, 5):
+            delta = self.index.compare(_rows(0, 20), RUN_TIME + week * WEEK)
+            self.assertEqual(delta.new_rows, _rows(10, 20) if week == 1 else [])
+            self.index.update(_rows(0, 20), delta.new_rows, RUN_TIME + week * WEEK)
+
+        delta = self.index.compare(_rows(0, 20), RUN_TIME + 5 * WEEK)
+
+        self.assertEqual(delta.new_rows, _rows(0, 10))
+        self.assertEqual((delta.requeued, delta.unchanged), (10, 10))
+        self.index.update(_rows(0, 20), delta.new_rows, RUN_TIME + 5 * WEEK)
+        self.assertEqual(self.index.compare(_rows(0, 20), RUN_TIME + 6 * WEEK).new_rows, _rows(10, 20))
+
+    def test_persistent(self):
+        """The index is kept between runs in the file."""
+        self.index.update(_rows(0, 10), _rows(0, 10), RUN_TIME)
+
+        index = IncrementalIndex(self.path, retention=datetime.timedelta(days=30))
+
+        self.assertEqual(index.compare(_rows(0, 10), RUN_TIME + WEEK).new_rows, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+"""Tests of measuring the stages of a run"""
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from forbered_afskrivining_af_foraeldede_sagsomkostninger import metrics, pipeline
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.tests.stub_orchestrator import StubOrchestratorConnection
+
+
+def _summaries(orchestrator_connection: StubOrchestratorConnection) -> list[dict]:
+    return [json.loads(message.split(": ", 1)[1]) for level, message in orchestrator_connection.logs
+            if level == 'info' and message.startswith("Run metrics")]
+
+
+class TestMetrics(unittest.TestCase):
+    """Tests of measuring the stages of a run"""
+    def setUp(self):
+        self.orchestrator_connection = StubOrchestratorConnection()
+
+    def test_run(self):
+        """Stages within a run are recorded with their rows, and the summary is logged as JSON."""
+        with metrics.run(self.orchestrator_connection):
+            with metrics.stage("first", rows_in=10) as record:
+                record.rows_out = 4
+            with pipeline.timed("second", self.orchestrator_connection):
+                sum(range(1000))
+
+        summaries = _summaries(self.orchestrator_connection)
+        self.assertEqual(len(summaries), 1)
+        stages = summaries[0]['stages']
+        self.assertEqual([stage['name'] for stage in stages], ["first", "second"])
+        self.assertEqual((stages[0]['rows_in'], stages[0]['rows_out']), (10, 4))
+        for stage in stages:
+            self.assertGreaterEqual(stage['wall_seconds'], 0)
+            self.assertGreaterEqual(stage['cpu_seconds'], 0)
+            self.assertGreater(stage['peak_rss_mb'], 0)
+            self.assertIsNone(stage['error'])
+
+    def test_error(self):
+        """A failed stage is recorded with its error, and the summary is logged when the run fails."""
+        with self.assertRaises(ValueError):
+            with metrics.run(self.orchestrator_connection):
+                with metrics.stage("failing"):
+                    raise ValueError("Bad file")
+
+        stages = _summaries(self.orchestrator_connection)[0]['stages']
+        self.assertEqual(stages[0]['error'], "ValueError: Bad file")
+
+    def test_pipeline_stage(self):
+        """A stage run on another thread is recorded in the run, with the length of its result."""
+        with metrics.run(self.orchestrator_connection):
+            stage = pipeline.Stage("background", lambda: {"fp": frozenset()})
+            stage.start()
+            pipeline.wait(self.orchestrator_connection, stage)
+
+        stages = _summaries(self.orchestrator_connection)[0]['stages']
+        self.assertEqual((stages[0]['name'], stages[0]['rows_out']), ("background", 1))
+
+    def test_measure(self):
+        """A decorated function is recorded with the length of its result on each call."""
+        @metrics.measure("listing")
+        def listing(count):
+            return list(range(count))
+
+        with metrics.run(self.orchestrator_connection):
+            self.assertEqual(listing(3), [0, 1, 2])
+            listing(5)
+
+        stages = _summaries(self.orchestrator_connection)[0]['stages']
+        self.assertEqual([stage['rows_out'] for stage in stages], [3, 5])
+
+    def test_outside_run(self):
+        """Stages outside a run are measured but not recorded anywhere."""
+        with metrics.stage("alone") as record:
+            pass
+        self.assertIsNotNone(record.peak_rss_mb)
+
+        with metrics.run(self.orchestrator_connection):
+            pass
+        self.assertEqual(_summaries(self.orchestrator_connection)[0]['stages'], [])
+
+    def test_split_summary(self):
+        """A summary too long for one log message is split into messages that are valid JSON on their own."""
+        with metrics.run(self.orchestrator_connection):
+            for number in range(200):
+                with metrics.stage(f"Download 'attachment number {number:04}.xlsx'"):
+                    pass
+
+        messages = [message for level, message in self.orchestrator_connection.logs if level == 'info']
+        self.assertGreater(len(messages), 1)
+        for message in messages:
+            self.assertLessEqual(len(message), metrics.MAX_LOG_LENGTH)
+
+        summaries = _summaries(self.orchestrator_connection)
+        names = [stage['name'] for summary in summaries for stage in summary['stages']]
+        self.assertEqual(len(names), 200)
+        self.assertEqual(names[0], "Download 'attachment number 0000.xlsx'")
+
+    def test_profile(self):
+        """With profiling the top functions are logged as trace and the profile is saved to a file."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "run.prof")
+            with metrics.run(self.orchestrator_connection, profile=True, profile_path=path):
+                sorted(range(10000), key=lambda value: -value)
+
+            self.assertTrue(os.path.getsize(path) > 0)
+
+        traces = [message for level, message in self.orchestrator_connection.logs if level == 'trace']
+        self.assertTrue(any("cumulative" in message for message in traces))
+        for message in traces:
+            self.assertLessEqual(len(message), metrics.MAX_LOG_LENGTH)
+
+    def test_profile_truncated(self):
+        """A profile longer than a log message is cut at the end, so the header and the top functions are kept."""
+        with mock.patch.object(metrics, 'MAX_LOG_LENGTH', 500):
+            with metrics.run(self.orchestrator_connection, profile=True):
+                sorted(range(10000), key=lambda value: -value)
+
+        (profile,) = [message for level, message in self.orchestrator_connection.logs if level == 'trace' and "function calls" in message]
+        self.assertEqual(len(profile), 500)
+        self.assertIn("Ordered by: cumulative time", profile)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+"""Tests of running stages at the same time"""
+from functools import partial
+import threading
+import unittest
+from unittest.mock import MagicMock
+from forbered_afskrivining_af_foraeldede_sagsomkostninger import pipeline
+
+
+def _raise(error: Exception):
+    def func():
+        raise error
+    return func
+
+
+class TestPipeline(unittest.TestCase):
+    """Tests of running stages at the same time"""
+    def setUp(self):
+        self.orchestrator_connection = MagicMock()
+
+    def test_wait(self):
+        """A background stage runs while the caller works, and its result is returned when it is done."""
+        caller_working = threading.Event()
+
+        def func():
+            # Only done when the caller is working at the same time.
+            return caller_working.wait(5)
+
+        stage = pipeline.Stage("sap", func)
+        stage.start()
+        caller_working.set()
+
+        self.assertTrue(pipeline.wait(self.orchestrator_connection, stage))
+        self.assertIn("Stage 'sap' took", self.orchestrator_connection.log_trace.call_args[0][0])
+
+    def test_background_thread(self):
+        """The initializer, function and finalizer of a background stage run on the same thread, away from the caller."""
+        threads = []
+
+        def record():
+            threads.append(threading.get_ident())
+
+        stage = pipeline.Stage("sap", record, initializer=record, finalizer=record)
+        stage.start()
+        pipeline.wait(self.orchestrator_connection, stage)
+
+        self.assertEqual(len(set(threads)), 1)
+        self.assertEqual(len(threads), 3)
+        self.assertNotEqual(threads[0], threading.get_ident())
+
+    def test_error(self):
+        """The error of a stage is logged and is the cause of the StageError, and the finalizer is still called."""
+        sap_error = RuntimeError("SAP failed")
+        finalizer = MagicMock()
+        stage = pipeline.Stage("sap", _raise(sap_error), finalizer=finalizer)
+        stage.start()
+
+        with self.assertRaises(pipeline.StageError) as context:
+            pipeline.wait(self.orchestrator_connection, stage)
+
+        self.assertEqual(context.exception.failures, {"sap": sap_error})
+        self.assertIs(context.exception.__cause__, sap_error)
+        self.orchestrator_connection.log_error.assert_called_once()
+        finalizer.assert_called_once()
+
+    def test_log_stage(self):
+        """A stage that is joined without wait, e.g. when the caller failed, has its own error logged."""
+        stage = pipeline.Stage("sap", _raise(RuntimeError("SAP failed")))
+        stage.start()
+        stage.join()
+
+        pipeline.log_stage(self.orchestrator_connection, stage)
+
+        self.assertIn("Stage 'sap' failed", self.orchestrator_connection.log_error.call_args[0][0])
+        self.assertIn("RuntimeError: SAP failed", self.orchestrator_connection.log_error.call_args[0][0])
+
+    def test_timeout(self):
+        """A stage that doesn't finish in time fails with a TimeoutError."""
+        release = threading.Event()
+        stage = pipeline.Stage("sap", release.wait)
+        stage.start()
+
+        with self.assertRaises(pipeline.StageError) as context:
+            pipeline.wait(self.orchestrator_connection, stage, timeout=0.1)
+        release.set()
+
+        self.assertIsInstance(context.exception.failures["sap"], TimeoutError)
+
+    def test_prefetch(self):
+        """The next stage runs while the caller works on the result of the previous one, and no further ahead."""
+        started = [threading.Event() for _ in range(3)]
+
+        def download(i):
+            started[i].set()
+            return i
+
+        stages = (pipeline.Stage(f"download {i}", partial(download, i)) for i in range(3))
+
+        results = []
+        for result in pipeline.prefetch(self.orchestrator_connection, stages):
+            if result + 1 < len(started):
+                self.assertTrue(started[result + 1].wait(5))
+            if result + 2 < len(started):
+                self.assertFalse(started[result + 2].is_set())
+            results.append(result)
+
+        self.assertEqual(results, [0, 1, 2])
+
+    def test_prefetch_error(self):
+        """A failed stage is raised in order, and the stages after it are not started."""
+        started = []
+
+        def stages():
+            for i in range(3):
+                started.append(i)
+                yield pipeline.Stage(f"download {i}", _raise(ValueError(i)) if i == 1 else partial(int, i))
+
+        results = []
+        with self.assertRaises(pipeline.StageError):
+            for result in pipeline.prefetch(self.orchestrator_connection, stages()):
+                results.append(result)
+
+        self.assertEqual((results, started), ([0], [0, 1]))
+        self.orchestrator_connection.log_error.assert_called_once()
+
+    def test_timed(self):
+        """The time of a block is logged, also when it fails."""
+        with self.assertRaises(ValueError):
+            with pipeline.timed("Filter", self.orchestrator_connection):
+                raise ValueError()
+
+        self.orchestrator_connection.log_trace.assert_called_once()
+        self.assertIn("Stage 'Filter' took", self.orchestrator_connection.log_trace.call_args[0][0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+"""Tests of inserting queue elements in chunks"""
+import datetime
+import json
+import os
+import tempfile
+import unittest
+from forbered_afskrivining_af_foraeldede_sagsomkostninger import queue_insert
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.tests.stub_orchestrator import StubOrchestratorConnection
+
+QUEUE_NAME = "Test queue"
+
+
+def _rows(count: int) -> list[tuple]:
+    return [(str(2_000_000 + i), str(100_000_000_000 + i), str(10_000_000 + i % 7)) for i in range(count)]
+
+
+class TestQueueInsert(unittest.TestCase):
+    """Tests of inserting queue elements in chunks"""
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()  # pylint: disable=(consider-using-with)
+        self.addCleanup(directory.cleanup)
+        self.checkpoint = os.path.join(directory.name, "checkpoint.txt")
+        self.since = datetime.datetime.now() - datetime.timedelta(hours=1)
+
+    def test_insert_in_chunks(self):
+        """Rows are inserted in chunks with deterministic references and the same data as before."""
+        connection = StubOrchestratorConnection()
+        rows = _rows(25)
+
+        inserted = queue_insert.insert_queue_elements(connection, QUEUE_NAME, rows, self.since, chunk_size=10, checkpoint_path=self.checkpoint)
+
+        self.assertEqual(inserted, 25)
+        self.assertEqual(connection.insert_calls, 3)
+        self.assertEqual([json.loads(element.data) for element in connection.queue_elements],
+                         [{'aftale': aftale, 'bilagsnummer': bilagsnummer, 'fp': fp} for aftale, bilagsnummer, fp in rows])
+        self.assertEqual([element.reference for element in connection.queue_elements], [queue_insert.reference(row) for row in rows])
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_reference(self):
+        """The reference is the same for the same row and fits in the reference column."""
+        row = ('2000001', '100000000001', '10000001')
+        self.assertEqual(queue_insert.reference(row), queue_insert.reference(tuple(row)))
+        self.assertNotEqual(queue_insert.reference(row), queue_insert.reference(('2000001', '100000000002', '10000001')))
+        self.assertLessEqual(len(queue_insert.reference(row)), 100)
+
+    def test_retry_after_failure(self):
+        """A retry after a failure partway through only inserts the missing elements."""
+        rows = _rows(50)
+        connection = StubOrchestratorConnection(fail_after_inserts=2)
+
+        with self.assertRaises(ConnectionError):
+            queue_insert.insert_queue_elements(connection, QUEUE_NAME, rows, self.since, chunk_size=10, checkpoint_path=self.checkpoint)
+        self.assertEqual(len(connection.queue_elements), 20)
+        self.assertTrue(os.path.exists(self.checkpoint))
+
+        connection.fail_after_inserts = None
+        inserted = queue_insert.insert_queue_elements(connection, QUEUE_NAME, rows, self.since, chunk_size=10, checkpoint_path=self.checkpoint)
+
+        self.assertEqual(inserted, 30)
+        self.assertEqual(sorted(element.reference for element in connection.queue_elements), sorted(queue_insert.reference(row) for row in rows))
+
+    def test_checkpoint_without_queue_lookup(self):
+        """References in the checkpoint are skipped, even when they can't be found in the queue."""
+        rows = _rows(5)
+        with open(self.checkpoint, 'w', encoding='utf-8') as file:
+            file.writelines(queue_insert.reference(row) + "\n" for row in rows[:3])
+        connection = StubOrchestratorConnection()
+
+        inserted = queue_insert.insert_queue_elements(connection, QUEUE_NAME, rows, self.since, checkpoint_path=self.checkpoint)
+
+        self.assertEqual(inserted, 2)
+
+    def test_old_elements_are_not_duplicates(self):
+        """Elements created before 'since', and a stale checkpoint, don't stop rows from being inserted again."""
+        rows = _rows(5)
+        connection = StubOrchestratorConnection()
+        queue_insert.insert_queue_elements(connection, QUEUE_NAME, rows, self.since)
+        for element in connection.queue_elements:
+            element.created_date -= datetime.timedelta(days=7)
+        with open(self.checkpoint, 'w', encoding='utf-8') as file:
+            file.writelines(queue_insert.reference(row) + "\n" for row in rows)
+        week_ago = (datetime.datetime.now() - datetime.timedelta(days=7)).timestamp()
+        os.utime(self.checkpoint, (week_ago, week_ago))
+
+        inserted = queue_insert.insert_queue_elements(connection, QUEUE_NAME, rows, self.since, checkpoint_path=self.checkpoint)
+
+        self.assertEqual(inserted, 5)
+
+    def test_existing_references_paged(self):
+        """References are read across pages."""
+        connection = StubOrchestratorConnection()
+        queue_insert.insert_queue_elements(connection, QUEUE_NAME, _rows(25), self.since)
+
+        references = queue_insert.existing_references(connection, QUEUE_NAME, self.since, page_size=10)
+
+        self.assertEqual(references, {queue_insert.reference(row) for row in _rows(25)})
+
+    def test_duplicate_rows(self):
+        """Identical rows become a single queue element."""
+        connection = StubOrchestratorConnection()
+
+        inserted = queue_insert.insert_queue_elements(connection, QUEUE_NAME, _rows(3) + _rows(3), self.since)
+
+        self.assertEqual(inserted, 3)
+
+    def test_tags(self):
+        """Tags are added to the data, but not to the reference, so a row is inserted once whatever its tags."""
+        connection = StubOrchestratorConnection()
+
+        queue_insert.insert_queue_elements(connection, QUEUE_NAME, _rows(3), self.since, tags={'file_date': '20231017'})
+        inserted = queue_insert.insert_queue_elements(connection, QUEUE_NAME, _rows(5), self.since, tags={'file_date': '20231024'})
+
+        self.assertEqual(inserted, 2)
+        self.assertEqual([json.loads(element.data)['file_date'] for element in connection.queue_elements], ['20231017'] * 3 + ['20231024'] * 2)
+        self.assertEqual([element.reference for element in connection.queue_elements], [queue_insert.reference(row) for row in _rows(5)])
+
+
+if __name__ == '__main__':
+    unittest.main()
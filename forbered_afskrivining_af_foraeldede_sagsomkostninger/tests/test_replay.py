@@ -0,0 +1,198 @@
+"""Tests of the synthetic fixtures, and of the whole process replayed against local stand-ins"""
+import datetime
+import os
+import tempfile
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+from forbered_afskrivining_af_foraeldede_sagsomkostninger import excel_process, graph_api
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.auxiliary import read_fp_and_aftale
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.tests import replay
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.tests.stub_graph import StubGraphServer
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.tests.stub_orchestrator import StubOrchestratorConnection
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.tests.synthetic import HEADER, BranchRatios, attachment_names, generate_fixture
+
+try:
+    from forbered_afskrivining_af_foraeldede_sagsomkostninger import process
+except ImportError:
+    process = None
+
+
+class TestFixture(unittest.TestCase):
+    """Tests of the synthetic fixtures"""
+    def test_expected(self):
+        """The expected rows are the result of the Alteryx rules and the rykkerspærrer in the FPLKA export."""
+        fixture = generate_fixture(5000, seed=1)
+        fp_aftale = read_fp_and_aftale(fixture.fplka_lines())
+
+        rows = excel_process.filter_rows(HEADER, fixture.rows)
+        result = {row for row in rows if row[2] in fp_aftale and row[0] not in fp_aftale[row[2]]}
+
+        self.assertTrue(result)
+        self.assertEqual(result, fixture.expected)
+        self.assertEqual(len(result), fixture.branches['kept'] + fixture.branches['special'])
+
+    def test_ratios(self):
+        """Rows only end in the branches with a ratio."""
+        ratios = BranchRatios(**dict.fromkeys(BranchRatios.__dataclass_fields__, 0))
+        ratios.hovedstol = 1
+        ratios.matching_hovedstol = 1
+
+        fixture = generate_fixture(1000, ratios)
+
+        self.assertEqual(sum(fixture.branches.values()), 1000)
+        self.assertEqual({branch for branch, count in fixture.branches.items() if count}, {'hovedstol', 'matching_hovedstol'})
+        self.assertEqual(fixture.expected, set())
+        self.assertEqual(excel_process.filter_rows(HEADER, fixture.rows), [])
+
+    def test_attachment_names(self):
+        """The names follow KMD's format, so the process selects all of them."""
+        names = attachment_names(datetime.date(2023, 10, 24), 3)
+        self.assertEqual(names[0], '20231024RPA03_01_03.XLSX')
+
+        attachments = [SimpleNamespace(name=name) for name in names + attachment_names(datetime.date(2023, 10, 17), 2)]
+        batches = graph_api.group_attachments(attachments)
+        self.assertEqual((batches[-1].file_date, [att.name for att in batches[-1].attachments]), ('20231024', names))
+
+
+@unittest.skipIf(process is None, "The robot's dependencies are not installed")
+class TestReplay(unittest.TestCase):
+    """Run the whole process against local stand-ins for Graph, SAP and OpenOrchestrator"""
+    def test_process(self):
+        """The expected rows are queued, the emails are deleted and every stage is measured."""
+        fixture = generate_fixture(3000, seed=2)
+
+        result = replay.replay(fixture, file_count=3, sap_write_seconds=0.5)
+
+        self.assertEqual(sorted(result.queued_rows()), sorted(fixture.expected))
+        self.assertEqual(result.sap_session.transactions, ['fplka'])
+        self.assertTrue(all(message['folder'] == 'deleteditems' for message in result.graph_server.messages.values()))
+        self.assertEqual(result.stage("Alteryx steps 1-12")['rows_in'], 3000)
+        self.assertEqual(result.stage("Insert queue elements")['rows_out'], len(fixture.expected))
+
+    def test_rerun(self):
+        """A second run on the same emails, e.g. a retry, doesn't queue duplicates."""
+        fixture = generate_fixture(1000, seed=3)
+        orchestrator_connection = StubOrchestratorConnection()
+
+        replay.replay(fixture, orchestrator_connection=orchestrator_connection)
+        result = replay.replay(fixture, orchestrator_connection=orchestrator_connection)
+
+        self.assertEqual(len(result.queued_rows()), len(fixture.expected))
+        self.assertEqual(result.stage("Insert queue elements")['rows_out'], 0)
+
+    def test_incremental(self):
+        """A later run only queues the rows that are new since the earlier run, unless a full run is forced."""
+        week_1 = generate_fixture(1000, seed=4)
+        week_2 = generate_fixture(1200, seed=4)
+        self.assertTrue(week_1.expected < week_2.expected)
+
+        with tempfile.TemporaryDirectory() as directory:
+            overrides = {'INCREMENTAL_INDEX_FILE': os.path.join(directory, "index.sqlite3")}
+            replay.replay(week_1, config_overrides=overrides)
+            result = replay.replay(week_2, config_overrides=overrides)
+            self.assertEqual(set(result.queued_rows()), week_2.expected - week_1.expected)
+
+            full = replay.replay(week_2, orchestrator_connection=StubOrchestratorConnection(process_arguments="full"),
+                                 config_overrides=overrides)
+            self.assertEqual(set(full.queued_rows()), week_2.expected)
+
+    def test_batches(self):
+        """Every restanceliste in the mailbox is processed, oldest first, with one FPLKA export.
+        Each row is queued once, tagged with the date of the first list it was on.
+        """
+        week_1 = generate_fixture(1000, seed=5)
+        week_2 = generate_fixture(1500, seed=5)
+
+        with tempfile.TemporaryDirectory() as directory:
+            overrides = {'INCREMENTAL_INDEX_FILE': os.path.join(directory, "index.sqlite3")}
+            result = replay.replay(week_2, datetime.date(2023, 10, 24), file_count=3,
+                                   earlier_batches=[(week_1, datetime.date(2023, 10, 17), 2)], config_overrides=overrides)
+
+        file_dates = result.file_dates()
+        self.assertEqual(len(result.queued_rows()), len(week_2.expected))
+        self.assertEqual({row for row, file_date in file_dates.items() if file_date == '20231017'}, week_1.expected)
+        self.assertEqual({row for row, file_date in file_dates.items() if file_date == '20231024'}, week_2.expected - week_1.expected)
+
+        self.assertEqual(result.sap_session.transactions, ['fplka'])
+        self.assertTrue(all(message['folder'] == 'deleteditems' for message in result.graph_server.messages.values()))
+        batch_logs = [message for level, message in result.orchestrator_connection.logs if level == 'info' and message.startswith("Batch ")]
+        self.assertEqual([message[:14] for message in batch_logs], ["Batch 20231017", "Batch 20231024"])
+        self.assertEqual(result.stage("Batch 20231017")['rows_out'], len(week_1.expected))
+
+    def test_errors_reported_per_branch(self):
+        """When reading the Excel files and SAP both fail, each error is logged, and SAP is done before the error is raised."""
+        fixture = generate_fixture(500, seed=8)
+        orchestrator_connection = StubOrchestratorConnection()
+
+        with mock.patch.object(process, 'read_batch', side_effect=ValueError("Bad header")), \
+                mock.patch.object(process, 'get_sap_file_content', side_effect=RuntimeError("SAP failed")):
+            with self.assertRaises(ValueError):
+                replay.replay(fixture, orchestrator_connection=orchestrator_connection)
+
+        errors = [message for level, message in orchestrator_connection.logs if level == 'error']
+        self.assertTrue(any("Get rykkerspærre from SAP" in message and "SAP failed" in message for message in errors))
+
+    def test_error_stops_sap(self):
+        """An error before SAP is needed doesn't wait for the whole export, but closes SAP to stop it."""
+        fixture = generate_fixture(500, seed=9)
+        orchestrator_connection = StubOrchestratorConnection()
+        closed = threading.Event()
+
+        def export(_orchestrator_connection):
+            if not closed.wait(60):
+                raise AssertionError("SAP wasn't closed")
+            raise RuntimeError("SAP was closed")
+
+        with mock.patch.object(process, 'read_batch', side_effect=ValueError("Bad header")), \
+                mock.patch.object(process, 'get_sap_file_content', export), \
+                mock.patch.object(process.reset, 'kill_all', side_effect=closed.set) as kill_all:
+            with self.assertRaises(ValueError):
+                replay.replay(fixture, orchestrator_connection=orchestrator_connection, config_overrides={'SAP_STOP_TIMEOUT': 0.2})
+
+        kill_all.assert_called_once_with()
+        errors = [message for level, message in orchestrator_connection.logs if level == 'error']
+        self.assertTrue(any("Get rykkerspærre from SAP" in message and "SAP was closed" in message for message in errors))
+
+    def _replay_with_incomplete_list(self, fixture, file_date: datetime.date, incomplete_date: datetime.date) -> tuple:
+        """Replay a fixture with a list in the mailbox that has only the first of two attachments.
+
+        Returns:
+            The connection, the stub Graph server and the result, or None if the run failed with the error.
+        """
+        orchestrator_connection = StubOrchestratorConnection()
+        server = StubGraphServer()
+        name = attachment_names(incomplete_date, 2)[0]
+        message_id = server.add_message(server.add_folder(replay.FOLDER), replay.SENDER, f"{replay.SUBJECT} {name}")
+        server.add_attachment(message_id, name, b"content")
+
+        with mock.patch.object(replay, 'StubGraphServer', return_value=server):
+            try:
+                return orchestrator_connection, server, replay.replay(fixture, file_date, orchestrator_connection=orchestrator_connection)
+            except ValueError as error:
+                return orchestrator_connection, server, error
+
+    def test_incomplete_older_batch(self):
+        """An older list missing attachments is logged and left in the mailbox, and the newer list is processed."""
+        fixture = generate_fixture(500, seed=6)
+        orchestrator_connection, server, result = self._replay_with_incomplete_list(fixture, datetime.date(2023, 10, 24), datetime.date(2023, 10, 17))
+
+        self.assertEqual(set(result.queued_rows()), fixture.expected)
+        self.assertTrue(any(level == 'error' and "20231017" in message for level, message in orchestrator_connection.logs))
+        folders = {message['subject'][-24:]: message['folder'] for message in server.messages.values()}
+        self.assertNotEqual(folders.pop('20231017RPA03_01_02.XLSX'), 'deleteditems')
+        self.assertEqual(set(folders.values()), {'deleteditems'})
+
+    def test_incomplete_newest_batch(self):
+        """The newest list missing attachments stops the run before anything is queued or deleted."""
+        fixture = generate_fixture(500, seed=6)
+        orchestrator_connection, server, result = self._replay_with_incomplete_list(fixture, datetime.date(2023, 10, 17), datetime.date(2023, 10, 24))
+
+        self.assertIsInstance(result, ValueError)
+        self.assertIn("20231024", str(result))
+        self.assertEqual(orchestrator_connection.queue_elements, [])
+        self.assertFalse(any(message['folder'] == 'deleteditems' for message in server.messages.values()))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+"""Tests of opening SAP only when it is needed, and keeping a healthy session between tries"""
+import importlib.util
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+from forbered_afskrivining_af_foraeldede_sagsomkostninger import config, reset
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.tests.stub_orchestrator import StubCredential, StubOrchestratorConnection
+
+
+def _session(user: str = "AZ12345", busy: bool = False, window: str = 'wnd[0]') -> SimpleNamespace:
+    return SimpleNamespace(Info=SimpleNamespace(User=user), Busy=busy, ActiveWindow=SimpleNamespace(Name=window))
+
+
+@unittest.skipIf(importlib.util.find_spec('itk_dev_shared_components') is None, "itk_dev_shared_components is not installed")
+class TestReset(unittest.TestCase):
+    """Tests of opening SAP only when it is needed"""
+    def setUp(self):
+        # pylint: disable-next=(import-outside-toplevel)
+        from itk_dev_shared_components.sap import multi_session, sap_login
+
+        self.sessions = []
+        self.get_sessions = self.enterContext(mock.patch.object(multi_session, 'get_all_sap_sessions', side_effect=lambda: tuple(self.sessions)))
+        self.kill_sap = self.enterContext(mock.patch.object(sap_login, 'kill_sap'))
+        self.login = self.enterContext(mock.patch.object(sap_login, 'login_using_cli',
+                                                         side_effect=lambda username, password: self.sessions.append(_session(username))))
+        self.enterContext(mock.patch.object(reset, '_login_seconds', []))
+        self.enterContext(mock.patch.object(reset, '_sap_opened', threading.Event()))
+
+        self.orchestrator_connection = StubOrchestratorConnection()
+        self.orchestrator_connection.credentials[config.SAP_CREDENTIALS] = StubCredential(config.SAP_CREDENTIALS, "AZ12345", "password")
+
+    def test_reset_without_sap(self):
+        """Before this run has opened SAP, resetting and closing leave SAP alone, even if it was left open by another run."""
+        self.sessions.append(_session(window='wnd[1]'))
+
+        reset.reset(self.orchestrator_connection)
+        reset.kill_all()
+
+        self.get_sessions.assert_not_called()
+        self.kill_sap.assert_not_called()
+        self.login.assert_not_called()
+
+    def test_kill_all(self):
+        """SAP opened by this run is closed once at the end, and later resets don't check it."""
+        reset.open_all(self.orchestrator_connection)
+        self.kill_sap.reset_mock()
+        self.kill_sap.side_effect = self.sessions.clear
+
+        reset.kill_all()
+        self.kill_sap.assert_called_once()
+
+        self.get_sessions.reset_mock()
+        reset.reset(self.orchestrator_connection)
+        reset.kill_all()
+        self.get_sessions.assert_not_called()
+        self.kill_sap.assert_called_once()
+
+    def test_open_all(self):
+        """SAP is logged in when it is needed, and the session is kept by the reset of the next try."""
+        reset.open_all(self.orchestrator_connection)
+        self.login.assert_called_once_with("AZ12345", "password")
+
+        self.kill_sap.reset_mock()
+        reset.reset(self.orchestrator_connection)
+        reset.open_all(self.orchestrator_connection)
+
+        self.kill_sap.assert_not_called()
+        self.login.assert_called_once()
+
+    def test_foreign_session(self):
+        """A healthy session that this run didn't open is closed, and the robot logs in with its own credentials."""
+        self.sessions.append(_session("OTHER"))
+        self.kill_sap.side_effect = self.sessions.clear
+
+        reset.open_all(self.orchestrator_connection)
+
+        self.kill_sap.assert_called_once()
+        self.login.assert_called_once_with("AZ12345", "password")
+        self.assertEqual(self.sessions[0].Info.User, "AZ12345")
+
+    def test_unhealthy_session(self):
+        """A busy session, or one showing a popup or the login screen, is closed and logged in again."""
+        for session in (_session(busy=True), _session(window='wnd[1]'), _session(user="")):
+            self.sessions[:] = [session]
+            self.assertFalse(reset.sap_is_healthy())
+
+        self.sessions[:] = [_session(window='wnd[1]')]
+        self.kill_sap.side_effect = self.sessions.clear
+        reset.open_all(self.orchestrator_connection)
+
+        self.kill_sap.assert_called_once()
+        self.login.assert_called_once()
+
+    def test_sap_not_running(self):
+        """SAP GUI scripting errors mean SAP isn't healthy."""
+        self.sessions = None
+        self.assertFalse(reset.sap_is_healthy())
+
+    def test_log_time_saved(self):
+        """The time saved is the number of tries without a login times the duration of a login."""
+        reset.log_time_saved(self.orchestrator_connection, tries=1)
+        self.assertIn(('info', f"Logged in to SAP 0 times in 1 tries, saving about {config.SAP_LOGIN_SECONDS} s."), self.orchestrator_connection.logs)
+
+        reset.open_all(self.orchestrator_connection)
+        reset.log_time_saved(self.orchestrator_connection, tries=3)
+        self.assertIn("Logged in to SAP 1 times in 3 tries", self.orchestrator_connection.logs[-1][1])
+
+
+if __name__ == '__main__':
+    unittest.main()
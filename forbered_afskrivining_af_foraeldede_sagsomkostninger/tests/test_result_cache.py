@@ -0,0 +1,91 @@
+"""Tests of the cache of reduced Excel attachments"""
+import datetime
+from io import BytesIO
+import os
+import tempfile
+import time
+import unittest
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.result_cache import ResultCache
+
+
+class TestResultCache(unittest.TestCase):
+    """Tests of the cache of reduced Excel attachments"""
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()  # pylint: disable=(consider-using-with)
+        self.addCleanup(self.directory.cleanup)
+
+    def _cache(self, max_bytes=2**20, max_age=datetime.timedelta(days=1)):
+        return ResultCache(self.directory.name, max_bytes, max_age)
+
+    def _set_age(self, key, seconds):
+        path = os.path.join(self.directory.name, key + ".pickle")
+        modified = time.time() - seconds
+        os.utime(path, (modified, modified))
+
+    def test_get_put(self):
+        """A stored value is returned for the same content and version only."""
+        cache = self._cache()
+        key = cache.key(BytesIO(b"content"), "v1")
+        self.assertIsNone(cache.get(key))
+
+        cache.put(key, ("header", [1, 2, 3]))
+
+        self.assertEqual(cache.get(key), ("header", [1, 2, 3]))
+        self.assertIsNone(cache.get(cache.key(BytesIO(b"content"), "v2")))
+        self.assertIsNone(cache.get(cache.key(BytesIO(b"other content"), "v1")))
+
+    def test_key_in_chunks(self):
+        """The key of a file larger than a chunk depends on all of its content."""
+        cache = self._cache()
+        content = os.urandom(3 * 1024 * 1024 + 1)
+
+        key = cache.key(BytesIO(content), "v1")
+
+        self.assertNotEqual(key, cache.key(BytesIO(content[:-1] + bytes([content[-1] ^ 1])), "v1"))
+        with tempfile.NamedTemporaryFile() as file:
+            file.write(content)
+            file.seek(0)
+            self.assertEqual(cache.key(file, "v1"), key)
+
+    def test_broken_entry(self):
+        """A broken entry is a miss and is deleted."""
+        cache = self._cache()
+        key = cache.key(BytesIO(b"content"), "v1")
+        with open(os.path.join(self.directory.name, key + ".pickle"), 'wb') as file:
+            file.write(b"not a pickle")
+
+        self.assertIsNone(cache.get(key))
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+    def test_evict_by_age(self):
+        """Entries older than max_age are deleted."""
+        cache = self._cache(max_age=datetime.timedelta(hours=1))
+        old, new = cache.key(BytesIO(b"old"), "v1"), cache.key(BytesIO(b"new"), "v1")
+        cache.put(old, "old")
+        self._set_age(old, 7200)
+
+        cache.put(new, "new")
+
+        self.assertIsNone(cache.get(old))
+        self.assertEqual(cache.get(new), "new")
+
+    def test_evict_by_size(self):
+        """The least recently used entries are deleted when the cache is too large."""
+        cache = self._cache()
+        keys = [cache.key(BytesIO(bytes([i])), "v1") for i in range(3)]
+        for age, key in zip((300, 200, 100), keys):
+            cache.put(key, b"x" * 1000)
+            self._set_age(key, age)
+
+        # Reading the oldest entry makes it the most recently used.
+        self.assertIsNotNone(cache.get(keys[0]))
+        cache.max_bytes = 2500
+        cache.evict()
+
+        self.assertIsNotNone(cache.get(keys[0]))
+        self.assertIsNone(cache.get(keys[1]))
+        self.assertIsNotNone(cache.get(keys[2]))
+
+
+if __name__ == '__main__':
+    unittest.main()
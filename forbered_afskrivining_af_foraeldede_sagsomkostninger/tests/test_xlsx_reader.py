@@ -0,0 +1,93 @@
+"""Cross-check the XML reader against openpyxl"""
+import datetime
+import unittest
+from io import BytesIO
+import openpyxl
+from openpyxl.utils.datetime import from_excel
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.xlsx_reader import read_columns
+from forbered_afskrivining_af_foraeldede_sagsomkostninger.tests.synthetic import HEADER, generate_rows, write_workbook
+
+
+def _openpyxl_columns(file: BytesIO, columns: tuple[str, ...]) -> tuple[tuple, list[tuple]]:
+    """Read the file with openpyxl and keep the named columns."""
+    wb = openpyxl.load_workbook(file, read_only=True)
+    rows = wb.active.values
+    header_row = next(rows)
+    indices = [header_row.index(name) if name in header_row else None for name in columns]
+    projected = [tuple(None if index is None else row[index] for index in indices) for row in rows]
+    wb.close()
+    return header_row, projected
+
+
+class TestXlsxReader(unittest.TestCase):
+    """Cross-check the XML reader against openpyxl"""
+    def test_read_columns_matches_openpyxl(self):
+        """All value types in the synthetic restanceliste are read like openpyxl reads them, except dates."""
+        file = write_workbook(generate_rows(2000, seed=5))
+        columns = ('Aftale', 'Oprindeligt beløb', 'Forældelsesdato', 'Ikke i arket', 'Medhæfter', 'ForretnPartner', 'Valuta')
+        expected_header, expected = _openpyxl_columns(file, columns)
+
+        file.seek(0)
+        header_row, rows = read_columns(file, columns)
+        rows = list(rows)
+
+        self.assertEqual(header_row, expected_header)
+        self.assertEqual(len(rows), len(expected))
+        date_index = columns.index('Forældelsesdato')
+        for row, expected_row in zip(rows, expected):
+            row = list(row)
+            # Dates are read as serial values
+            if row[date_index] is not None:
+                row[date_index] = from_excel(row[date_index])
+            self.assertEqual(tuple(row), expected_row)
+
+    def test_missing_rows_and_cells(self):
+        """Missing rows are returned as empty rows and missing cells as None, like openpyxl."""
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.append(('A', 'B', 'C'))
+        ws['A2'] = 'x'
+        ws['C5'] = 3
+        ws['B6'] = True
+        ws['A7'] = 2.5
+        file = BytesIO()
+        wb.save(file)
+
+        file.seek(0)
+        expected_header, expected = _openpyxl_columns(file, ('C', 'A', 'B'))
+        file.seek(0)
+        header_row, rows = read_columns(file, ('C', 'A', 'B'))
+
+        self.assertEqual(header_row, expected_header)
+        self.assertEqual(list(rows), expected)
+
+    def test_empty_sheet(self):
+        """An empty sheet has no header and no rows."""
+        file = BytesIO()
+        openpyxl.Workbook().save(file)
+        file.seek(0)
+
+        header_row, rows = read_columns(file, HEADER)
+
+        self.assertEqual(header_row, ())
+        self.assertEqual(list(rows), [])
+
+    def test_out_of_range_date(self):
+        """Serial values outside the limits for dates are read as the number itself."""
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.append(('Forældelsesdato',))
+        ws.append((datetime.datetime(2020, 1, 1),))
+        ws.append((-693596,))
+        ws['A3'].number_format = 'yyyy-mm-dd'
+        file = BytesIO()
+        wb.save(file)
+
+        file.seek(0)
+        _, rows = read_columns(file, ('Forældelsesdato',))
+
+        self.assertEqual(list(rows), [(43831,), (-693596,)])
+
+
+if __name__ == '__main__':
+    unittest.main()
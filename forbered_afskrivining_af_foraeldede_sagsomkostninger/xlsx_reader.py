@@ -0,0 +1,217 @@
+"""Read cell values of selected columns directly from the XML of an xlsx file.
+This skips the cell objects, styles and date conversion of openpyxl, which is where most of the time is spent
+when reading the KMD restancelister. Values are cast the same way openpyxl does, except that numbers are never
+converted to dates. Dates are left as Excel serial numbers for the caller to convert when needed.
+"""
+from io import BytesIO
+from functools import lru_cache
+import posixpath
+from typing import Iterable, Iterator
+from xml.etree.ElementTree import iterparse
+import zipfile
+
+from openpyxl.utils.datetime import from_ISO8601
+
+_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_RELATIONSHIP_ID = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+_PACKAGE_RELATIONSHIP = "{http://schemas.openxmlformats.org/package/2006/relationships}Relationship"
+_SHARED_STRINGS_TYPE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings"
+
+_ROW = _MAIN + "row"
+_CELL = _MAIN + "c"
+_VALUE = _MAIN + "v"
+_TEXT = _MAIN + "t"
+_RICH_TEXT_RUN = _MAIN + "r"
+_INLINE_STRING = _MAIN + "is"
+_STRING_ITEM = _MAIN + "si"
+_SHEET_DATA = _MAIN + "sheetData"
+
+
+@lru_cache(maxsize=None)
+def _letters_index(letters: str) -> int:
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - 64
+    return index - 1
+
+
+def _column_index(coordinate: str) -> int:
+    """Convert a cell coordinate like 'AB12' to a zero based column index."""
+    return _letters_index(coordinate.rstrip("0123456789"))
+
+
+def _text_content(element) -> str:
+    """Get the text of a string item, the same way openpyxl does: plain text followed by rich text runs."""
+    snippets = []
+    text = element.find(_TEXT)
+    if text is not None and text.text is not None:
+        snippets.append(text.text)
+    for run in element.iterfind(_RICH_TEXT_RUN):
+        text = run.find(_TEXT)
+        if text is not None and text.text is not None:
+            snippets.append(text.text)
+    return "".join(snippets)
+
+
+def _cast_number(value: str) -> int | float:
+    if "." in value or "E" in value or "e" in value:
+        return float(value)
+    return int(value)
+
+
+# How the value of a cell is converted, by its data type.
+_CONVERTERS = {'n': _cast_number, 'b': lambda value: bool(int(value)), 'd': from_ISO8601}
+
+
+def _cell_value(cell, shared_strings: list[str]):
+    """Get the value of a <c> element. Formulas are read as their cached value."""
+    data_type = cell.get('t', 'n')
+
+    if data_type == 'inlineStr':
+        inline_string = cell.find(_INLINE_STRING)
+        return None if inline_string is None else _text_content(inline_string)
+
+    value = cell.findtext(_VALUE) or None
+    if value is None:
+        return None
+
+    if data_type == 's':
+        return shared_strings[int(value)]
+
+    # 'str' and 'e' are kept as text
+    return _CONVERTERS.get(data_type, str)(value)
+
+
+def _read_relationships(archive: zipfile.ZipFile, part: str) -> dict[str, tuple[str, str]]:
+    """Read the relationships of a part as {id: (type, absolute target)}."""
+    directory, name = posixpath.split(part)
+    relationships = {}
+    with archive.open(posixpath.join(directory, "_rels", name + ".rels")) as source:
+        for _, element in iterparse(source):
+            if element.tag == _PACKAGE_RELATIONSHIP:
+                target = element.get('Target')
+                if target.startswith('/'):
+                    target = target[1:]
+                else:
+                    target = posixpath.normpath(posixpath.join(directory, target))
+                relationships[element.get('Id')] = (element.get('Type'), target)
+    return relationships
+
+
+def _find_parts(archive: zipfile.ZipFile) -> tuple[str, str | None]:
+    """Find the active worksheet and the shared strings table of the workbook.
+
+    Returns:
+        The paths of the active worksheet and the shared strings in the archive.
+    """
+    workbook = "xl/workbook.xml"
+    active_tab = 0
+    sheet_ids = []
+    with archive.open(workbook) as source:
+        for _, element in iterparse(source):
+            if element.tag == _MAIN + "workbookView":
+                active_tab = int(element.get('activeTab', 0))
+            elif element.tag == _MAIN + "sheet":
+                sheet_ids.append(element.get(_RELATIONSHIP_ID))
+            elif element.tag == _MAIN + "workbookPr" and element.get('date1904') in ('1', 'true'):
+                raise ValueError("Workbooks using the 1904 date system are not supported.")
+
+    relationships = _read_relationships(archive, workbook)
+    sheet = relationships[sheet_ids[active_tab]][1]
+    shared_strings = next((target for rel_type, target in relationships.values() if rel_type == _SHARED_STRINGS_TYPE), None)
+    return sheet, shared_strings
+
+
+def _read_shared_strings(archive: zipfile.ZipFile, part: str | None) -> list[str]:
+    if part is None:
+        return []
+
+    strings = []
+    with archive.open(part) as source:
+        for _, element in iterparse(source):
+            if element.tag == _STRING_ITEM:
+                strings.append(_text_content(element).replace('x005F_', ''))
+                element.clear()
+    return strings
+
+
+def _iter_row_elements(archive: zipfile.ZipFile, part: str) -> Iterator[tuple[int, object]]:
+    """Yield (row number, <row> element) of a worksheet. Each element is cleared after it has been used."""
+    with archive.open(part) as source:
+        sheet_data = None
+        row_number = 0
+        for event, element in iterparse(source, events=('start', 'end')):
+            if event == 'start':
+                if element.tag == _SHEET_DATA:
+                    sheet_data = element
+                continue
+
+            if element.tag == _ROW:
+                row_number = int(element.get('r', row_number + 1))
+                yield row_number, element
+                sheet_data.clear()
+
+
+def read_columns(path: str | BytesIO, columns: Iterable[str]) -> tuple[tuple, Iterator[tuple]]:
+    """Read the active sheet of an xlsx file, keeping only the named columns.
+    The first row is the header. Missing rows are returned as empty rows, like openpyxl does.
+
+    Args:
+        path: Path to the file or the file itself.
+        columns: The names of the columns to keep.
+
+    Returns:
+        The complete header row, and an iterator of the remaining rows with the values of the
+        named columns in the order given. Columns missing from the header are always None.
+    """
+    columns = tuple(columns)
+    archive = zipfile.ZipFile(path)  # pylint: disable=(consider-using-with)
+    try:
+        sheet, shared_strings_part = _find_parts(archive)
+        shared_strings = _read_shared_strings(archive, shared_strings_part)
+        row_elements = _iter_row_elements(archive, sheet)
+
+        first_row = next(row_elements, None)
+        if first_row is None:
+            archive.close()
+            return (), iter(())
+
+        header_row = []
+        for cell in first_row[1].iterfind(_CELL):
+            index = _column_index(cell.get('r')) if cell.get('r') else len(header_row)
+            header_row.extend([None] * (index - len(header_row)))
+            header_row.append(_cell_value(cell, shared_strings))
+        header_row = tuple(header_row)
+    except BaseException:
+        archive.close()
+        raise
+
+    # The position in the output row of each wanted column, by column index in the sheet.
+    positions = {}
+    for position, name in enumerate(columns):
+        if name in header_row:
+            positions.setdefault(header_row.index(name), position)
+
+    return header_row, _iter_projected_rows(archive, row_elements, first_row[0], positions, width=len(columns), shared_strings=shared_strings)
+
+
+def _iter_projected_rows(archive, row_elements, header_row_number, positions, *, width, shared_strings) -> Iterator[tuple]:
+    empty_row = (None,) * width
+    previous_row_number = header_row_number
+    try:
+        for row_number, element in row_elements:
+            for _ in range(previous_row_number + 1, row_number):
+                yield empty_row
+            previous_row_number = row_number
+
+            values = [None] * width
+            column = -1
+            for cell in element.iterfind(_CELL):
+                coordinate = cell.get('r')
+                column = _column_index(coordinate) if coordinate else column + 1
+                position = positions.get(column)
+                if position is not None:
+                    values[position] = _cell_value(cell, shared_strings)
+            yield tuple(values)
+    finally:
+        archive.close()
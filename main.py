@@ -1,14 +1,58 @@
 """The main file of the robot which will install all requirements in
 a virtual environment and then start the actual process.
+uv is only upgraded when the requirements or the Python version have changed, or the last upgrade is
+older than UV_MAX_AGE_SECONDS, since upgrading it on every trigger adds seconds to every run.
 """
 
-import subprocess
+import hashlib
 import os
+import shutil
+import subprocess
 import sys
+import time
+
+# The requirements of the last uv upgrade, and how often uv is upgraded when they don't change.
+UV_STAMP_FILE = ".uv_upgraded"
+UV_MAX_AGE_SECONDS = 7 * 24 * 60 * 60
+
+
+def requirements_hash() -> str:
+    """Hash the Python version and the files uv installs the requirements from."""
+    digest = hashlib.sha256(sys.version.encode())
+    for path in ("pyproject.toml", "uv.lock"):
+        if os.path.exists(path):
+            with open(path, 'rb') as file:
+                digest.update(file.read())
+    return digest.hexdigest()
+
+
+def uv_is_current(stamp: str) -> bool:
+    """Whether uv is installed and was upgraded recently for the same requirements."""
+    if shutil.which("uv") is None:
+        return False
+    try:
+        if time.time() - os.path.getmtime(UV_STAMP_FILE) > UV_MAX_AGE_SECONDS:
+            return False
+        with open(UV_STAMP_FILE, encoding='utf-8') as file:
+            return file.read() == stamp
+    except FileNotFoundError:
+        return False
+
+
+def upgrade_uv() -> None:
+    """Upgrade uv unless it is current, see uv_is_current."""
+    stamp = requirements_hash()
+    if uv_is_current(stamp):
+        return
+    subprocess.run("pip install --upgrade uv", check=True)
+    with open(UV_STAMP_FILE, 'w', encoding='utf-8') as file:
+        file.write(stamp)
+
 
 script_directory = os.path.dirname(os.path.realpath(__file__))
 os.chdir(script_directory)
 
-subprocess.run("pip install --upgrade uv", check=True)
+upgrade_uv()
+
 command_args = ["uv", "run", "python", "-m", "forbered_afskrivining_af_foraeldede_sagsomkostninger"] + sys.argv[1:]
 subprocess.run(command_args, check=True)